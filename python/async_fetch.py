@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Concurrent HTTP fetching for the speech scraper
+One pooled aiohttp session, a concurrency limit and token bucket per host,
+and retries with exponential backoff
+"""
+
+import asyncio
+import random
+import time
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import metrics
+
+# Statuses worth retrying; everything else is returned to the caller
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class FetchResult(NamedTuple):
+    url: str
+    status: int
+    body: bytes
+    headers: Dict[str, str]
+
+class TokenBucket:
+    """Allow `rate` requests per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncFetcher:
+    """Shared connection pool with per-host limits, rate limiting and retries
+
+    Use as an async context manager:
+
+        async with AsyncFetcher() as fetcher:
+            result = await fetcher.fetch(url)
+    """
+
+    def __init__(self, max_connections: int = 20, per_host: int = 4, rate: float = 2.0,
+                 burst: float = 4, retries: int = 3, backoff: float = 1.0, timeout: float = 10):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for async scraping: pip install aiohttp")
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.host_buckets: Dict[str, TokenBucket] = {}
+        self.bytes_received = 0
+        self.retry_count = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def _host_state(self, url: str):
+        host = urlsplit(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.per_host)
+            self.host_buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.host_limits[host], self.host_buckets[host]
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Exponential backoff with jitter so retries don't arrive in lockstep
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """GET a URL, retrying connection errors and 429/5xx responses
+
+        Raises the last error once all retries are used up.
+        """
+        limit, bucket = self._host_state(url)
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                async with limit:
+                    async with self.session.get(url, headers=headers) as response:
+                        body = await response.read()
+                        self.bytes_received += len(body)
+                        metrics.count('http_requests')
+                        metrics.count('http_bytes', len(body))
+                        if response.status in RETRY_STATUSES and attempt < self.retries:
+                            delay = self._retry_delay(attempt, response.headers.get('Retry-After'))
+                        else:
+                            response.raise_for_status()
+                            return FetchResult(url, response.status, body, dict(response.headers))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    raise
+                delay = self._retry_delay(attempt)
+
+            attempt += 1
+            self.retry_count += 1
+            metrics.count('http_retries')
+            await asyncio.sleep(delay)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the data pipeline
+Generates a synthetic corpus shaped like the real one: a letters PDF with
+dates, salutations, running headers and OCR noise, and speech pages laid
+out like mkgandhi.org. Scale 1 matches the current corpus (146 PDF pages,
+9 speeches), and larger scales are multiples of it. Every pipeline step is
+then timed on it, from PDF text extraction to validate_jsonl. The corpus
+is seeded, so every commit is measured on identical input.
+
+    python bench.py run                      # scales 1,10,100; results in .cache/bench/results
+    python bench.py run --scales 1,10 --repeat 5
+    python bench.py compare BASE NEW         # result files or commit labels; exits 1 on a regression
+    python bench.py generate --scale 10      # just write the corpus
+
+Results are keyed by "<step>@<scale>x" with the min and median of
+--repeat runs and the items per second.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BENCH_DIR = os.path.join(".cache", "bench")
+DEFAULT_SCALES = (1, 10, 100)
+CORPUS_VERSION = 1
+
+# Size of the current corpus, i.e. scale 1
+BASE_PAGES = 146
+BASE_SPEECHES = 9
+LINES_PER_PAGE = 20
+SPEECH_PARAGRAPHS = 40
+
+SUBJECTS = ["Truth", "Non-violence", "Love", "The spirit of service", "Ahimsa", "Faith in God",
+            "The soul", "Self-restraint", "Swaraj", "Prayer", "The freedom of India", "Satyagraha"]
+VERBS = ["is", "demands", "requires", "cannot be separated from", "grows out of", "leads to", "teaches"]
+OBJECTS = ["the courage of the heart", "infinite patience", "the sacrifice of the self", "service of the poor",
+           "a clear conscience", "justice for every man", "the law of our being", "perfect humility",
+           "the discipline of the body", "peace within and without"]
+PROSE = ["the Government", "the Congress", "the people of the province", "your letter of the 12th",
+         "the resolution of the Committee", "the Viceroy", "the Ashram", "the prisoners in jail",
+         "the salt tax", "the villagers", "my friend", "the authorities"]
+PROSE_VERBS = ["have considered", "cannot accept", "wrote to", "have received", "spoke with", "are aware of",
+               "must examine", "have seen"]
+NAMES = ["Jawaharlal", "Mira Bai", "Mr. Jinnah", "Lord Irwin", "Sir Samuel Hoare", "Rajaji", "Dr. Ansari",
+         "Mahadev Desai"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September",
+          "October", "November", "December"]
+OCR_SWAPS = {'i': '1', 'l': '1', 'e': '~', 'r': '1·', 'o': '0'}
+
+# ---------------------------------------------------------------- corpus
+
+def _sentence(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.35:
+        sentence = f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}"
+    elif kind < 0.85:
+        sentence = (f"I {rng.choice(PROSE_VERBS)} {rng.choice(PROSE)} and {rng.choice(PROSE_VERBS)} "
+                    f"{rng.choice(PROSE)}")
+    else:
+        sentence = f"{rng.choice(NAMES)} told me that {rng.choice(SUBJECTS).lower()} {rng.choice(VERBS)} " \
+                   f"{rng.choice(OBJECTS)}"
+    if rng.random() < 0.1:
+        # OCR damage: a swapped character or a hyphen left from a line break
+        position = rng.randrange(len(sentence))
+        if sentence[position] in OCR_SWAPS:
+            sentence = sentence[:position] + OCR_SWAPS[sentence[position]] + sentence[position + 1:]
+        else:
+            sentence = sentence[:position] + "- " + sentence[position:]
+    return sentence + rng.choice([".", ".", ".", "!", "?"])
+
+def _letter(rng: random.Random) -> List[str]:
+    year = rng.randint(1915, 1947)
+    lines = [f"{rng.randint(1, 28)}/{rng.randint(1, 12)}/{year}",
+             f"Dear {rng.choice(['Friend', 'Sir', 'Jawaharlal', 'Mira'])},"]
+    lines.extend(_sentence(rng) for _ in range(rng.randint(6, 24)))
+    lines.append("Yours sincerely, M. K. Gandhi")
+    return lines
+
+def letter_lines(scale: int, seed: int = 0) -> List[List[str]]:
+    """Text lines of every page of the synthetic letters PDF"""
+    rng = random.Random(f"{seed}:letters:{scale}")
+    pages = []
+    current: List[str] = []
+    while len(pages) < BASE_PAGES * scale:
+        for line in _letter(rng):
+            # Wrap long sentences the way the scanned book does
+            while line:
+                current.append(line[:70])
+                line = line[70:]
+                if len(current) == LINES_PER_PAGE:
+                    # Running header with the page number
+                    pages.append([f"{len(pages) + 1} Famous Letters of Mahatma Gandhi"] + current)
+                    current = []
+    return pages[:BASE_PAGES * scale]
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(' + escaped.encode('latin-1', 'replace') + b')'
+
+def write_pdf(pages: List[List[str]], path: str):
+    """Minimal PDF with one Helvetica text stream per page; enough for PyPDF2"""
+    objects: List[bytes] = [b'', b'', b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for lines in pages:
+        content = b'BT /F1 10 Tf 12 TL 50 750 Td ' + b' '.join(_pdf_string(line) + b' Tj T*' for line in lines) + b' ET'
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects))
+        kids.append(len(objects))
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % k for k in kids), len(kids))
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        f.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+def speech_html(rng: random.Random, number: int) -> bytes:
+    """A speech page laid out like mkgandhi.org: navigation, one content table, links"""
+    day, month, year = rng.randint(1, 28), rng.choice(MONTHS), rng.randint(1915, 1948)
+    paragraphs = ''.join(f"<p>{' '.join(_sentence(rng) for _ in range(rng.randint(2, 6)))}</p>\n"
+                         for _ in range(SPEECH_PARAGRAPHS))
+    html = f"""<!DOCTYPE html>
+<html><head><title>Speech {number} - Mahatma Gandhi</title></head>
+<body>
+<div class="nav">Home About Us Gandhian Institutions Famous Speeches Menu Submit</div>
+<table><tr><td>
+<h1>Speech {number} (Speech at the Prayer Meeting on {day} {month} {year})</h1>
+{paragraphs}</td></tr></table>
+<div class="footer">Back Next <a href="speech{number + 1}.php">next</a> mkgandhi.org</div>
+</body></html>
+"""
+    return html.encode('utf-8')
+
+def generate_corpus(scale: int, bench_dir: str = DEFAULT_BENCH_DIR, seed: int = 0) -> str:
+    """Write (once) and return the corpus directory for a scale"""
+    corpus_dir = os.path.join(bench_dir, f"corpus-v{CORPUS_VERSION}-s{seed}-x{scale}")
+    done_marker = os.path.join(corpus_dir, "done")
+    if os.path.exists(done_marker):
+        return corpus_dir
+    shutil.rmtree(corpus_dir, ignore_errors=True)
+    os.makedirs(os.path.join(corpus_dir, "speeches"))
+    write_pdf(letter_lines(scale, seed), os.path.join(corpus_dir, "letters.pdf"))
+    rng = random.Random(f"{seed}:speeches:{scale}")
+    for number in range(BASE_SPEECHES * scale):
+        with open(os.path.join(corpus_dir, "speeches", f"speech{number:05d}.html"), 'wb') as f:
+            f.write(speech_html(rng, number))
+    with open(done_marker, 'w') as f:
+        f.write("ok\n")
+    return corpus_dir
+
+# ---------------------------------------------------------------- timing
+
+def _time(fn: Callable[[], object], repeat: int) -> Tuple[List[float], object]:
+    times = []
+    result = None
+    for _ in range(repeat):
+        # The pipeline functions print progress; keep it out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+    return times, result
+
+def bench_scale(corpus_dir: str, repeat: int = 3, only: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Time every pipeline step on one corpus; returns {step: timing}"""
+    from corpus import build_corpus, prompt_templates, write_jsonl
+    from extract import (clean_text, create_training_data_csv, create_training_data_jsonl,
+                         extract_quotes, extract_text_from_pdf, split_into_letters)
+    from html_parsers import load_fixture_pages
+    from scrape import create_training_files, extract_quotes_from_speech, parse_speech, remove_duplicates
+    from sampling import balanced_sample
+    from validate import validate_jsonl
+
+    results: Dict[str, Dict] = {}
+    out_dir = tempfile.mkdtemp(prefix="bench-")
+    state: Dict[str, object] = {}
+
+    def step(name: str, fn: Callable[[], object], items: Callable[[object], int]):
+        times, result = _time(fn, repeat if only is None or name in only else 1)
+        state[name] = result
+        if only is not None and name not in only:
+            return
+        count = items(result)
+        results[name] = {
+            'min': round(min(times), 6),
+            'median': round(statistics.median(times), 6),
+            'repeat': len(times),
+            'items': count,
+            'items_per_second': round(count / min(times), 1) if min(times) > 0 else None,
+        }
+
+    pdf_path = os.path.join(corpus_dir, "letters.pdf")
+    pages = load_fixture_pages(os.path.join(corpus_dir, "speeches"))
+    try:
+        step('extract_text_from_pdf', lambda: extract_text_from_pdf(pdf_path), len)
+        step('clean_text', lambda: clean_text(state['extract_text_from_pdf']), len)
+        step('split_into_letters', lambda: split_into_letters(state['clean_text']), len)
+        step('extract_quotes', lambda: extract_quotes(state['split_into_letters']), len)
+        step('parse_speeches', lambda: [parse_speech(path, body) for path, body in pages.items()], len)
+        step('extract_quotes_from_speech',
+             lambda: [q for speech in state['parse_speeches'] for q in extract_quotes_from_speech(speech)], len)
+        # Speech quotes repeat across pages, like the real merged corpus
+        all_quotes = state['extract_quotes'] + state['extract_quotes_from_speech']
+        step('remove_duplicates', lambda: remove_duplicates(all_quotes + all_quotes[::3]), len)
+        quotes = state['remove_duplicates']
+        jsonl_path = os.path.join(out_dir, "gandhi_training.jsonl")
+        step('create_training_data_jsonl', lambda: create_training_data_jsonl(quotes, jsonl_path),
+             lambda _: len(quotes))
+        step('create_training_data_csv',
+             lambda: create_training_data_csv(quotes, os.path.join(out_dir, "gandhi_training.csv")),
+             lambda _: len(quotes))
+        step('create_training_files', lambda: create_training_files(quotes, os.path.join(out_dir, "combined")),
+             lambda _: len(quotes))
+        step('balanced_sample', lambda: balanced_sample(quotes, len(quotes) // 4).indices,
+             lambda _: len(quotes))
+        step('build_corpus',
+             lambda: build_corpus(quotes, os.path.join(out_dir, "bench.corpus"), prompt_templates('scrape')),
+             len)
+        step('corpus_write_jsonl',
+             lambda: write_jsonl(state['build_corpus'], os.path.join(out_dir, "corpus.jsonl")), lambda n: n)
+        with open(jsonl_path, 'rb') as f:
+            examples = sum(1 for _ in f)
+        step('validate_jsonl', lambda: validate_jsonl(jsonl_path), lambda _: examples)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+def git_label() -> str:
+    """Short commit hash, with -dirty when the tree has changes; 'unknown' outside git"""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True, cwd=repo).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True, cwd=repo).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_benchmarks(scales: List[int], repeat: int = 3, only: Optional[List[str]] = None,
+                   bench_dir: str = DEFAULT_BENCH_DIR, seed: int = 0) -> Dict:
+    report = {
+        'label': git_label(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus_version': CORPUS_VERSION,
+        'seed': seed,
+        'results': {},
+    }
+    for scale in scales:
+        start = time.perf_counter()
+        corpus_dir = generate_corpus(scale, bench_dir, seed)
+        print(f"\nScale {scale}x ({time.perf_counter() - start:.1f}s to prepare {corpus_dir})")
+        for name, timing in bench_scale(corpus_dir, repeat, only).items():
+            report['results'][f"{name}@{scale}x"] = timing
+            print(f"  {name:<28} {timing['min'] * 1000:>10.1f} ms  {timing['items']:>9} items")
+    return report
+
+# ---------------------------------------------------------------- compare
+
+def _load_results(name: str, bench_dir: str) -> Dict:
+    path = name if os.path.exists(name) else os.path.join(bench_dir, "results", f"{name}.json")
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def compare(base: Dict, new: Dict, threshold: float = 0.15, min_delta: float = 0.002) -> List[Dict]:
+    """Steps present in both reports; a step regressed if its best time grew by more
+    than threshold and by at least min_delta seconds"""
+    rows = []
+    for key in base['results']:
+        if key not in new['results']:
+            continue
+        old_time, new_time = base['results'][key]['min'], new['results'][key]['min']
+        ratio = new_time / old_time if old_time > 0 else float('inf')
+        rows.append({
+            'step': key,
+            'base': old_time,
+            'new': new_time,
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold and new_time - old_time >= min_delta,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data pipeline on a synthetic corpus")
+    parser.add_argument("command", choices=['run', 'compare', 'generate'])
+    parser.add_argument("reports", nargs="*", help="for compare: BASE NEW (result files or labels)")
+    parser.add_argument("--scales", default=','.join(map(str, DEFAULT_SCALES)),
+                        help="comma-separated corpus multiples")
+    parser.add_argument("--scale", type=int, default=1, help="corpus multiple for generate")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", action="append", default=None, metavar="STEP",
+                        help="time only this step (repeatable); earlier steps still run once for input")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bench-dir", default=DEFAULT_BENCH_DIR)
+    parser.add_argument("--output", default=None, help="results file (default: results/<commit>.json)")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="compare: slowdown ratio above which a step counts as a regression")
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        print(f"✓ Corpus in {generate_corpus(args.scale, args.bench_dir, args.seed)}")
+        return
+
+    if args.command == 'compare':
+        if len(args.reports) != 2:
+            parser.error("compare needs BASE and NEW")
+        base, new = (_load_results(name, args.bench_dir) for name in args.reports)
+        rows = compare(base, new, args.threshold)
+        print(f"{base['label']} -> {new['label']}\n")
+        print(f"{'step':<40} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+        for row in rows:
+            flag = "  REGRESSION" if row['regression'] else ""
+            print(f"{row['step']:<40} {row['base'] * 1000:>10.1f} {row['new'] * 1000:>10.1f} "
+                  f"{row['ratio']:>6.2f}x{flag}")
+        regressions = [row for row in rows if row['regression']]
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) over {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\n✓ No regressions over {args.threshold:.0%}")
+        return
+
+    scales = [int(scale) for scale in args.scales.split(',') if scale]
+    report = run_benchmarks(scales, args.repeat, args.only, args.bench_dir, args.seed)
+    output = args.output or os.path.join(args.bench_dir, "results", f"{report['label']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Results written to {output}")
+
+if __name__ == "__main__":
+    main()
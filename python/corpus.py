@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Columnar on-disk corpus of quotes
+The .txt, .csv and .jsonl training files repeat the same few system and
+user prompts for every example. This format stores each quote once, in a
+single UTF-8 blob, together with small NumPy columns. The training files
+are exported from it as streams whenever they are needed:
+
+    <name>.corpus/
+        meta.json          counts, prompt templates, source labels, seed
+        text.bin           every quote's UTF-8 bytes, back to back
+        offsets.npy        int64, quote i is text.bin[offsets[i]:offsets[i + 1]]
+        source.npy         index into meta.json's sources (uint16, uint32 if needed)
+        score.npy          float32 quality score, NaN when not scored
+        system_prompt.npy  uint8 (n, 2), system template of each quote's 2 examples
+        user_prompt.npy    uint8 (n, 2), user template of each example
+        csv_prompt.npy     uint8, CSV prompt template
+
+Opening a corpus maps the blob and the columns with mmap, so nothing is
+parsed. Prompt IDs come from the same per-quote seeded RNG that shards.py
+uses, so exported JSONL lines match the shards byte for byte for the same
+seed.
+
+    python corpus.py build combined_gandhi.corpus                 # from the quote store
+    python corpus.py build letters.corpus --quotes-file gandhi_quotes.txt --templates extract
+    python corpus.py export combined_gandhi.corpus --jsonl train.jsonl --csv train.csv --min-score 0.4
+    python corpus.py info combined_gandhi.corpus
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import os
+import random
+import re
+import shutil
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from quote_store import DEFAULT_QUOTE_STORE_PATH, quote_hash
+from shards import DEFAULT_SEED
+
+FORMAT_NAME = "gandhi-corpus"
+FORMAT_VERSION = 1
+EXAMPLES_PER_QUOTE = 2
+DEFAULT_CORPUS_PATH = "combined_gandhi.corpus"
+
+class PromptTemplates(NamedTuple):
+    name: str
+    system: List[str]
+    user: List[str]
+    csv: List[str]
+
+def prompt_templates(name: str) -> PromptTemplates:
+    """The prompt lists of scrape.py ('scrape') or extract.py ('extract')"""
+    if name == 'scrape':
+        from scrape import CSV_PROMPTS, SYSTEM_PROMPTS, USER_PROMPTS
+
+        return PromptTemplates(name, SYSTEM_PROMPTS, USER_PROMPTS, CSV_PROMPTS)
+    if name == 'extract':
+        from extract import CSV_PROMPT_TEMPLATES, PROMPT_VARIATIONS, SYSTEM_PROMPTS
+
+        return PromptTemplates(name, SYSTEM_PROMPTS, PROMPT_VARIATIONS, CSV_PROMPT_TEMPLATES)
+    raise ValueError(f"unknown prompt templates {name!r}, expected 'scrape' or 'extract'")
+
+def _index_dtype(size: int):
+    return np.uint16 if size <= np.iinfo(np.uint16).max + 1 else np.uint32
+
+class CorpusWriter:
+    """Appends quotes to a new corpus directory; close() writes the columns
+
+    The corpus is built in a temporary directory next to the target and
+    moved into place at the end, so readers never see half a corpus.
+    """
+
+    def __init__(self, path: str, templates: PromptTemplates, seed: int = DEFAULT_SEED):
+        self.path = path
+        self.templates = templates
+        self.seed = seed
+        self.tmp_path = path.rstrip('/') + ".tmp"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.text = open(os.path.join(self.tmp_path, "text.bin"), 'wb')
+        self.offsets = array('q', [0])
+        self.sources: Dict[str, int] = {}
+        self.source_ids = array('I')
+        self.scores = array('f')
+        self.system_ids = array('B')
+        self.user_ids = array('B')
+
+    def add(self, quote: str, source: str = '', score: Optional[float] = None):
+        data = quote.encode('utf-8')
+        self.text.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+        self.source_ids.append(self.sources.setdefault(source, len(self.sources)))
+        self.scores.append(float('nan') if score is None else score)
+        # Same draws as rng.choice in make_training_examples, seeded like shards.py
+        rng = random.Random(f"{self.seed}:{quote_hash(quote)}")
+        for _ in range(EXAMPLES_PER_QUOTE):
+            self.system_ids.append(rng.randrange(len(self.templates.system)))
+            self.user_ids.append(rng.randrange(len(self.templates.user)))
+
+    def close(self) -> "Corpus":
+        self.text.close()
+        count = len(self.offsets) - 1
+
+        def save(name: str, values: np.ndarray):
+            np.save(os.path.join(self.tmp_path, f"{name}.npy"), values)
+
+        save('offsets', np.frombuffer(self.offsets, dtype=np.int64))
+        save('source', np.frombuffer(self.source_ids, dtype=np.uint32).astype(_index_dtype(len(self.sources))))
+        save('score', np.frombuffer(self.scores, dtype=np.float32))
+        save('system_prompt', np.frombuffer(self.system_ids, dtype=np.uint8).reshape(count, EXAMPLES_PER_QUOTE))
+        save('user_prompt', np.frombuffer(self.user_ids, dtype=np.uint8).reshape(count, EXAMPLES_PER_QUOTE))
+        save('csv_prompt', (np.arange(count) % len(self.templates.csv)).astype(np.uint8))
+
+        meta = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'count': count,
+            'text_bytes': self.offsets[-1],
+            'seed': self.seed,
+            'templates': self.templates._asdict(),
+            'sources': sorted(self.sources, key=self.sources.get),
+        }
+        with open(os.path.join(self.tmp_path, "meta.json"), 'w', encoding='utf-8') as f:
+            f.write(json.dumps(meta, indent=2, ensure_ascii=False) + '\n')
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.rename(self.tmp_path, self.path)
+        return Corpus(self.path)
+
+def build_corpus(quotes: Iterable[str], path: str, templates: PromptTemplates,
+                 sources: Optional[Iterable[str]] = None, scores: Optional[Iterable[float]] = None,
+                 seed: int = DEFAULT_SEED) -> "Corpus":
+    writer = CorpusWriter(path, templates, seed)
+    sources = iter(sources) if sources is not None else None
+    scores = iter(scores) if scores is not None else None
+    for quote in quotes:
+        writer.add(quote, next(sources) if sources is not None else '',
+                   float(next(scores)) if scores is not None else None)
+    return writer.close()
+
+class Corpus:
+    """Read-only view of a corpus directory; columns are memory-mapped NumPy arrays"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != FORMAT_NAME or self.meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} {FORMAT_NAME}")
+        self.templates = PromptTemplates(**self.meta['templates'])
+        self.sources: List[str] = self.meta['sources']
+        self.offsets = self._column('offsets')
+        self.source = self._column('source')
+        self.score = self._column('score')
+        self.system_prompt = self._column('system_prompt')
+        self.user_prompt = self._column('user_prompt')
+        self.csv_prompt = self._column('csv_prompt')
+        with open(os.path.join(path, "text.bin"), 'rb') as f:
+            # mmap can't map an empty file
+            self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.meta['text_bytes'] else b''
+
+    def _column(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return self.meta['count']
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def texts(self, indices: Optional[Sequence[int]] = None) -> Iterator[str]:
+        offsets = self.offsets.tolist()
+        for i in range(len(self)) if indices is None else indices:
+            yield self.blob[offsets[i]:offsets[i + 1]].decode('utf-8')
+
+    def select(self, min_score: Optional[float] = None, source_prefix: Optional[str] = None) -> np.ndarray:
+        """Indices of the quotes scoring at least min_score and from matching sources
+
+        Unscored quotes (NaN) never pass a min_score.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if min_score is not None:
+            keep &= self.score >= min_score
+        if source_prefix is not None:
+            matching = [i for i, source in enumerate(self.sources) if source.startswith(source_prefix)]
+            keep &= np.isin(self.source, matching)
+        return np.flatnonzero(keep)
+
+    def close(self):
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+
+def _jsonl_prefixes(templates: PromptTemplates) -> List[List[str]]:
+    """JSON of an example up to the assistant content, per (system, user) template pair
+
+    Cut from json.dumps of a whole example, so the exported lines are the
+    same bytes create_training_data_jsonl and write_shards produce.
+    """
+    closing = '""}]}'
+    prefixes = []
+    for system in templates.system:
+        row = []
+        for user in templates.user:
+            example = {"messages": [{"role": "system", "content": system},
+                                    {"role": "user", "content": user},
+                                    {"role": "assistant", "content": ""}]}
+            row.append(json.dumps(example, ensure_ascii=False)[:-len(closing)])
+        prefixes.append(row)
+    return prefixes
+
+def iter_jsonl(corpus: Corpus, indices: Optional[Sequence[int]] = None) -> Iterator[str]:
+    """OpenAI chat JSONL lines, 2 per quote"""
+    prefixes = _jsonl_prefixes(corpus.templates)
+    indices = np.arange(len(corpus)) if indices is None else np.asarray(indices)
+    system_ids = corpus.system_prompt[indices].tolist()
+    user_ids = corpus.user_prompt[indices].tolist()
+    for quote, systems, users in zip(corpus.texts(indices.tolist()), system_ids, user_ids):
+        content = json.dumps(quote, ensure_ascii=False)
+        for system, user in zip(systems, users):
+            yield prefixes[system][user] + content + '}]}\n'
+
+def write_jsonl(corpus: Corpus, output_path: str, indices: Optional[Sequence[int]] = None) -> int:
+    """Stream the JSONL training file; returns the number of examples"""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    examples = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for line in iter_jsonl(corpus, indices):
+            f.write(line)
+            examples += 1
+    return examples
+
+def write_csv(corpus: Corpus, output_path: str, indices: Optional[Sequence[int]] = None) -> int:
+    """Stream the prompt/completion CSV; returns the number of rows"""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    indices = np.arange(len(corpus)) if indices is None else np.asarray(indices)
+    prompts = corpus.templates.csv
+    rows = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['prompt', 'completion'])
+        for quote, prompt in zip(corpus.texts(indices.tolist()), corpus.csv_prompt[indices].tolist()):
+            writer.writerow([prompts[prompt], quote])
+            rows += 1
+    return rows
+
+def print_info(corpus: Corpus):
+    print(f"{corpus.path}: {len(corpus)} quotes, {corpus.meta['text_bytes']} text bytes, "
+          f"{len(corpus.sources)} sources, '{corpus.templates.name}' prompts, seed {corpus.meta['seed']}")
+    on_disk = sum(os.path.getsize(os.path.join(corpus.path, name)) for name in os.listdir(corpus.path))
+    print(f"  {on_disk} bytes on disk")
+    scored = corpus.score[~np.isnan(corpus.score)]
+    if len(scored):
+        print(f"  scores: {len(scored)} scored, min {scored.min():.2f}, "
+              f"median {np.median(scored):.2f}, max {scored.max():.2f}")
+    counts = np.bincount(corpus.source, minlength=len(corpus.sources))
+    for i in np.argsort(-counts, kind='stable')[:5]:
+        print(f"  {counts[i]:>6}  {corpus.sources[i] or '(no source)'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, inspect and export the columnar quote corpus")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="write a corpus from the quote store or a quotes file")
+    build.add_argument("path", nargs="?", default=DEFAULT_CORPUS_PATH)
+    build.add_argument("--store", default=DEFAULT_QUOTE_STORE_PATH)
+    build.add_argument("--quotes-file", default=None, help="numbered quotes file instead of the store")
+    build.add_argument("--templates", choices=['scrape', 'extract'], default='scrape')
+    build.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    build.add_argument("--no-scoring", action="store_true", help="leave the score column empty")
+
+    export = subparsers.add_parser("export", help="stream training files out of a corpus")
+    export.add_argument("path", nargs="?", default=DEFAULT_CORPUS_PATH)
+    export.add_argument("--jsonl", default=None)
+    export.add_argument("--csv", default=None)
+    export.add_argument("--min-score", type=float, default=None)
+    export.add_argument("--source", default=None, help="only quotes whose source starts with this")
+
+    info = subparsers.add_parser("info", help="summarize a corpus")
+    info.add_argument("path", nargs="?", default=DEFAULT_CORPUS_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if args.quotes_file:
+            with open(args.quotes_file, 'r', encoding='utf-8') as f:
+                blocks = f.read().split('\n\n')
+            quotes = [re.sub(r'^\d+\.\s*', '', block.strip()) for block in blocks if block.strip()]
+            sources = [f"file:{os.path.basename(args.quotes_file)}"] * len(quotes)
+        else:
+            from quote_store import QuoteStore
+
+            store = QuoteStore(args.store)
+            records = store.records()
+            store.close()
+            quotes = [text for text, _, _, _ in records]
+            sources = [source for _, _, source, _ in records]
+        scores = None
+        if not args.no_scoring:
+            from scoring import score_quotes
+
+            scores = score_quotes(quotes, min_score=None).scores
+        corpus = build_corpus(quotes, args.path, prompt_templates(args.templates), sources, scores, args.seed)
+        print_info(corpus)
+        print(f"✓ Created: {args.path}")
+        return
+
+    corpus = Corpus(args.path)
+    if args.command == 'info':
+        print_info(corpus)
+        return
+
+    if not args.jsonl and not args.csv:
+        parser.error("export needs --jsonl and/or --csv")
+    indices = corpus.select(args.min_score, args.source)
+    print(f"Exporting {len(indices)} of {len(corpus)} quotes")
+    if args.jsonl:
+        print(f"✓ Created: {args.jsonl} ({write_jsonl(corpus, args.jsonl, indices)} examples)")
+    if args.csv:
+        print(f"✓ Created: {args.csv} ({write_csv(corpus, args.csv, indices)} rows)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Speech discovery crawler for mkgandhi.org
+Starts from an index page, follows same-site speech links and feeds every
+page through scrape.py's parsing and quote extraction. The visited set and
+pending frontier are saved to a file so a crawl can stop and resume.
+Pages that fail are retried a few times, and the ones that still fail are
+kept in the frontier so the next run tries them again.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+from async_fetch import AsyncFetcher
+from html_parsers import parse_page
+from http_cache import HttpCache
+from quote_store import QuoteStore
+from scrape import fetch_speech_async, extract_quotes_from_speech
+
+DEFAULT_FRONTIER_PATH = os.path.join(".cache", "crawl_frontier.json")
+
+# Pages under /speeches/ are the ones worth following
+SPEECH_LINK_PATTERN = re.compile(r'/speeches/[^/?#]+\.(?:php|html?)$', re.IGNORECASE)
+
+# Save the frontier after this many pages so an interrupted crawl loses little
+SAVE_EVERY = 10
+
+# Tries per page in one run before it is left for the next run
+MAX_PAGE_ATTEMPTS = 3
+
+def extract_links(base_url: str, hrefs: List[str]) -> List[str]:
+    """Return same-site speech links, resolved and without fragments"""
+    host = urlsplit(base_url).netloc
+    links = []
+    for href in hrefs:
+        url, _ = urldefrag(urljoin(base_url, href))
+        parts = urlsplit(url)
+        if parts.scheme in ('http', 'https') and parts.netloc == host and SPEECH_LINK_PATTERN.search(parts.path):
+            links.append(url)
+    return links
+
+class Crawler:
+    """Resumable breadth-first crawl with a bounded worker queue"""
+
+    def __init__(self, index_url: str, frontier_path: str = DEFAULT_FRONTIER_PATH,
+                 cache: Optional[HttpCache] = None, workers: int = 4, max_pages: Optional[int] = None,
+                 store: Optional[QuoteStore] = None, rate: float = 2.0, retries: int = 3):
+        self.index_url = index_url
+        self.frontier_path = frontier_path
+        self.quotes_path = os.path.splitext(frontier_path)[0] + "_quotes.jsonl"
+        self.cache = cache
+        self.store = store
+        self.workers = workers
+        self.max_pages = max_pages
+        self.rate = rate
+        self.retries = retries
+        self.visited: Set[str] = set()
+        self.pending: Deque[str] = deque([index_url])
+        self.in_progress: Set[str] = set()
+        self.seen: Set[str] = {index_url}
+        # Attempts per page that failed and wasn't retried successfully yet
+        self.failed: Dict[str, int] = {}
+        # Pages already in the quotes file
+        self.recorded: Set[str] = set()
+        self.visits_since_save = 0
+
+    def load(self):
+        """Resume from the frontier file if it belongs to the same index page"""
+        state = None
+        if os.path.exists(self.frontier_path):
+            with open(self.frontier_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('index_url') != self.index_url:
+                print(f"Frontier {self.frontier_path} is for {state.get('index_url')}, starting fresh")
+                state = None
+
+        if state is None:
+            # Quotes from an earlier, unrelated crawl would be duplicated
+            if os.path.exists(self.quotes_path):
+                os.remove(self.quotes_path)
+            return
+        self.visited = set(state['visited'])
+        # Pages that gave up last run get a fresh set of attempts
+        retry = [url for url in state.get('failed', {}) if url not in state['pending']]
+        self.pending = deque(state['pending'] + retry)
+        self.seen = self.visited | set(self.pending)
+        self.recorded = {record['url'] for record in self._read_records()}
+        print(f"Resuming crawl: {len(self.visited)} visited, {len(self.pending)} pending"
+              + (f" ({len(retry)} failed last time)" if retry else ""))
+
+    def save(self):
+        """Write the frontier atomically; pages in flight go back to pending"""
+        os.makedirs(os.path.dirname(self.frontier_path) or '.', exist_ok=True)
+        state = {
+            'index_url': self.index_url,
+            'visited': sorted(self.visited),
+            'pending': sorted(self.in_progress) + list(self.pending),
+            'failed': {url: attempts for url, attempts in self.failed.items()
+                       if url not in self.in_progress and url not in self.pending},
+        }
+        tmp_path = self.frontier_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_path, self.frontier_path)
+        self.visits_since_save = 0
+
+    def _read_records(self) -> List[Dict]:
+        records = []
+        if os.path.exists(self.quotes_path):
+            with open(self.quotes_path, 'r', encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+        return records
+
+    def load_quotes(self) -> List[str]:
+        """All quotes collected so far, in crawl order, one record per page"""
+        quotes = []
+        urls = set()
+        for record in self._read_records():
+            if record['url'] not in urls:
+                urls.add(record['url'])
+                quotes.extend(record['quotes'])
+        return quotes
+
+    def _limit_reached(self) -> bool:
+        started = len(self.visited) + len(self.in_progress)
+        return self.max_pages is not None and started >= self.max_pages
+
+    async def _visit(self, fetcher: AsyncFetcher, url: str):
+        try:
+            _, speech_data = await fetch_speech_async(fetcher, url, self.cache)
+            hrefs = speech_data.get('links')
+            if hrefs is None:
+                # Parsed before links were recorded; reparse the cached body
+                hrefs = parse_page(self.cache.get(url).body).links
+        except Exception as e:
+            self.in_progress.discard(url)
+            attempts = self.failed.get(url, 0) + 1
+            self.failed[url] = attempts
+            if attempts < MAX_PAGE_ATTEMPTS:
+                print(f"Error crawling {url} (attempt {attempts}): {e}, retrying later")
+                self.pending.append(url)
+            else:
+                print(f"Error crawling {url}: {e}, giving up until the next run")
+            return
+
+        for link in extract_links(url, hrefs):
+            if link not in self.seen:
+                self.seen.add(link)
+                self.pending.append(link)
+
+        quotes = extract_quotes_from_speech(speech_data) if url != self.index_url else []
+        # A page crawled after the last save is crawled again on resume; record it once
+        if url not in self.recorded:
+            with open(self.quotes_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'url': url, 'title': speech_data['title'], 'quotes': quotes},
+                                   ensure_ascii=False) + '\n')
+            self.recorded.add(url)
+        if self.store is not None:
+            added_at = time.time()
+            self.store.add_many((quote, url) for quote in quotes)
+            self.store.prune(url, added_at)
+        print(f"Crawled: {url} → {len(quotes)} quotes, {len(self.pending)} pending")
+
+        self.in_progress.discard(url)
+        self.failed.pop(url, None)
+        self.visited.add(url)
+        self.visits_since_save += 1
+        if self.visits_since_save >= SAVE_EVERY:
+            self.save()
+
+    async def run(self) -> List[str]:
+        """Crawl until the frontier is empty or max_pages is reached"""
+        self.load()
+        async with AsyncFetcher(per_host=self.workers, rate=self.rate, burst=self.workers,
+                                retries=self.retries) as fetcher:
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers)
+            changed = asyncio.Event()
+            outstanding = 0
+
+            async def worker():
+                nonlocal outstanding
+                while True:
+                    url = await queue.get()
+                    try:
+                        await self._visit(fetcher, url)
+                    finally:
+                        outstanding -= 1
+                        queue.task_done()
+                        changed.set()
+
+            tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+            try:
+                while True:
+                    if self.pending and not self._limit_reached():
+                        url = self.pending.popleft()
+                        self.in_progress.add(url)
+                        outstanding += 1
+                        # Blocks while every worker is busy and the queue is full
+                        await queue.put(url)
+                    elif outstanding == 0:
+                        break
+                    else:
+                        changed.clear()
+                        await changed.wait()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                self.save()
+
+        return self.load_quotes()
+
+def crawl_speeches(index_url: str, frontier_path: str = DEFAULT_FRONTIER_PATH,
+                   cache: Optional[HttpCache] = None, workers: int = 4,
+                   max_pages: Optional[int] = None, store: Optional[QuoteStore] = None,
+                   **fetch_options) -> List[str]:
+    """Crawl speech pages reachable from index_url and return their quotes"""
+    crawler = Crawler(index_url, frontier_path, cache, workers, max_pages, store, **fetch_options)
+    return asyncio.run(crawler.run())
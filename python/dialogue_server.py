@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Local chat completions server for the GandhiDialogue component
+An OpenAI-compatible POST /v1/chat/completions that the browser talks to
+instead of api.openai.com. Every request is sent to the fine-tuned model
+in gandhi_model_id.txt, whatever model the client asked for, and:
+
+- identical requests are answered from an in-memory LRU cache until
+  their TTL runs out
+- identical requests that arrive while the first is still in flight
+  wait for that one upstream call instead of making their own
+- upstream calls share one pooled connection set and a token bucket,
+  so a burst of players can't run through the rate limit
+
+Upstreams are pluggable like the evaluate backends: 'openai' forwards to
+the real API (or any OpenAI-compatible --base-url), 'stub' answers
+offline with a canned dialogue turn so the component can be tried
+without a key.
+
+    python dialogue_server.py                  # http://127.0.0.1:8787
+    python dialogue_server.py --upstream stub
+
+Then set VITE_DIALOGUE_SERVER_URL=http://127.0.0.1:8787/v1 for the site.
+Browsers may only call it from the Vite dev server's origin unless more
+are allowed with --allow-origin.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from aiohttp import web
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from async_fetch import TokenBucket
+
+DEFAULT_MODEL_ID_PATH = "gandhi_model_id.txt"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8787
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+# Where `npm run dev` serves the site
+DEFAULT_ALLOW_ORIGIN = "http://localhost:5173"
+
+# Fields that change the reply; anything else (user, stream...) is not part of the key
+CACHE_KEY_FIELDS = ('messages', 'temperature', 'top_p', 'max_tokens', 'max_completion_tokens',
+                    'response_format', 'presence_penalty', 'frequency_penalty', 'stop', 'seed')
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Methods': 'POST, GET, OPTIONS',
+    'Access-Control-Allow-Headers': '*',
+    'Vary': 'Origin',
+}
+
+class UpstreamResponse(NamedTuple):
+    status: int
+    body: bytes
+
+def request_key(model: str, payload: Dict) -> str:
+    fields = {name: payload[name] for name in CACHE_KEY_FIELDS if name in payload}
+    fields['model'] = model
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class TTLCache:
+    """LRU of response bodies that also drops entries older than ttl seconds"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, body = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return body
+
+    def put(self, key: str, body: bytes):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (time.monotonic(), body)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class OpenAIUpstream:
+    """Forwards to an OpenAI-compatible /chat/completions over pooled connections"""
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, api_key: Optional[str] = None,
+                 max_connections: int = 16, timeout: float = 60.0):
+        self.url = base_url.rstrip('/') + "/chat/completions"
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY") or "local"
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.session: Optional["aiohttp.ClientSession"] = None
+
+    async def start(self):
+        # One session for the server's lifetime, so connections are kept alive and reused
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'Authorization': f"Bearer {self.api_key}"},
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def complete(self, payload: Dict) -> UpstreamResponse:
+        async with self.session.post(self.url, json=payload) as response:
+            return UpstreamResponse(response.status, await response.read())
+
+class StubUpstream:
+    """Offline stand-in that answers with a fixed dialogue turn after a delay"""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.calls = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def complete(self, payload: Dict) -> UpstreamResponse:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        turn = {
+            'gandhiText': "Truth and non-violence are as old as the hills. Tell me, what brings you here today?",
+            'choices': [
+                {'text': "I came to learn the way of peace from you.", 'isGood': True},
+                {'text': "Honestly, I just wanted to see the famous man.", 'isGood': False},
+                {'text': "Can't every problem be solved with a little force?", 'isGood': False},
+            ],
+        }
+        content = json.dumps(turn)
+        body = {
+            'id': f"chatcmpl-stub{self.calls}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': payload['model'],
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': len(content) // 4,
+                      'total_tokens': len(content) // 4},
+        }
+        return UpstreamResponse(200, json.dumps(body).encode('utf-8'))
+
+UPSTREAMS: Dict[str, Callable[..., object]] = {
+    'openai': OpenAIUpstream,
+    'stub': StubUpstream,
+}
+
+class DialogueServer:
+    """Caching, coalescing proxy in front of one upstream"""
+
+    def __init__(self, upstream, model: str, cache: Optional[TTLCache] = None,
+                 rate: float = 5.0, burst: int = 10,
+                 allow_origins: Sequence[str] = (DEFAULT_ALLOW_ORIGIN,)):
+        self.upstream = upstream
+        self.model = model
+        self.allow_origins = set(allow_origins)
+        self.cache = cache if cache is not None else TTLCache()
+        self.bucket = TokenBucket(rate, burst)
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.stats = {'requests': 0, 'hits': 0, 'coalesced': 0, 'upstream': 0, 'errors': 0}
+
+    async def _call_upstream(self, key: str, payload: Dict) -> UpstreamResponse:
+        await self.bucket.acquire()
+        self.stats['upstream'] += 1
+        response = await self.upstream.complete(payload)
+        # Only successful replies are cached; errors are retried by the next request
+        if response.status == 200:
+            self.cache.put(key, response.body)
+        else:
+            self.stats['errors'] += 1
+        return response
+
+    async def complete(self, payload: Dict) -> Tuple[UpstreamResponse, str]:
+        """Reply to one chat completions request; returns (response, cache status)"""
+        self.stats['requests'] += 1
+        payload = dict(payload, model=self.model)
+        payload.pop('stream', None)
+        key = request_key(self.model, payload)
+
+        body = self.cache.get(key)
+        if body is not None:
+            self.stats['hits'] += 1
+            return UpstreamResponse(200, body), 'HIT'
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            # shield: one impatient client disconnecting must not cancel the shared call
+            return await asyncio.shield(pending), 'COALESCED'
+
+        task = asyncio.ensure_future(self._call_upstream(key, payload))
+        self.in_flight[key] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task), 'MISS'
+
+    def cors_headers(self, request: "web.Request") -> Dict[str, str]:
+        """CORS headers that let the request's origin read the reply, if it is allowed"""
+        headers = dict(CORS_HEADERS)
+        origin = request.headers.get('Origin')
+        if origin and (origin in self.allow_origins or '*' in self.allow_origins):
+            headers['Access-Control-Allow-Origin'] = origin
+        return headers
+
+    async def handle_completion(self, request: "web.Request") -> "web.Response":
+        cors_headers = self.cors_headers(request)
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({'error': {'message': "request body is not JSON"}},
+                                     status=400, headers=cors_headers)
+        if not isinstance(payload, dict) or not isinstance(payload.get('messages'), list):
+            return web.json_response({'error': {'message': "messages is required"}},
+                                     status=400, headers=cors_headers)
+
+        try:
+            response, cache_status = await self.complete(payload)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats['errors'] += 1
+            return web.json_response({'error': {'message': f"upstream unavailable: {e}"}},
+                                     status=502, headers=cors_headers)
+        return web.Response(body=response.body, status=response.status, content_type='application/json',
+                            headers=dict(cors_headers, **{'X-Cache': cache_status}))
+
+    async def handle_stats(self, request: "web.Request") -> "web.Response":
+        return web.json_response(dict(self.stats, model=self.model, cached=len(self.cache),
+                                      in_flight=len(self.in_flight)), headers=self.cors_headers(request))
+
+    async def handle_options(self, request: "web.Request") -> "web.Response":
+        return web.Response(status=204, headers=self.cors_headers(request))
+
+    def app(self) -> "web.Application":
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle_completion)
+        app.router.add_route("OPTIONS", "/v1/chat/completions", self.handle_options)
+        app.router.add_get("/stats", self.handle_stats)
+
+        async def on_startup(_):
+            await self.upstream.start()
+
+        async def on_cleanup(_):
+            await self.upstream.close()
+
+        app.on_startup.append(on_startup)
+        app.on_cleanup.append(on_cleanup)
+        return app
+
+def read_model_id(path: str = DEFAULT_MODEL_ID_PATH) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        model = f.read().strip()
+    if not model:
+        raise ValueError(f"{path} is empty, run finetune.py first")
+    return model
+
+def main():
+    parser = argparse.ArgumentParser(description="Caching chat completions server for GandhiDialogue")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model", default=None, help=f"model ID (default: read from {DEFAULT_MODEL_ID_PATH})")
+    parser.add_argument("--upstream", choices=sorted(UPSTREAMS), default='openai')
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="OpenAI-compatible API for --upstream openai")
+    parser.add_argument("--max-connections", type=int, default=16, help="pooled upstream connections")
+    parser.add_argument("--cache-size", type=int, default=1024, help="cached replies, 0 to disable")
+    parser.add_argument("--ttl", type=float, default=3600.0, help="seconds a cached reply is served")
+    parser.add_argument("--rate", type=float, default=5.0, help="upstream requests per second")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--allow-origin", action="append", default=None, metavar="ORIGIN",
+                        help=f"browser origin allowed to call the server, repeatable; '*' allows any "
+                             f"(default: {DEFAULT_ALLOW_ORIGIN})")
+    args = parser.parse_args()
+
+    if aiohttp is None:
+        print("error: aiohttp is required for the dialogue server: pip install aiohttp")
+        return
+
+    model = args.model or read_model_id()
+    if args.upstream == 'openai':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        upstream = OpenAIUpstream(args.base_url, max_connections=args.max_connections)
+    else:
+        upstream = StubUpstream()
+
+    server = DialogueServer(upstream, model, TTLCache(args.cache_size, args.ttl), args.rate, args.burst,
+                            args.allow_origin or [DEFAULT_ALLOW_ORIGIN])
+    print(f"Serving {model} via {args.upstream} on http://{args.host}:{args.port}/v1")
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of fine-tuned Gandhi models
+Runs a held-out prompt set (the validation shard by default) through a
+chat backend concurrently and reports how close the replies are in style
+to the held-out quotes, p50/p95 latency and tokens per response.
+
+Backends are pluggable like the HTML parsers:
+
+- 'openai': chat completions; --base-url points it at any OpenAI-compatible
+  server, e.g. a local model under llama.cpp or Ollama
+- 'mock': offline stand-in that answers with corpus quotes after a
+  simulated delay, for trying the harness without an API key
+
+Replies are cached in SQLite by (model, prompt, backend settings), so
+re-scoring a model or re-running after a crash only calls the backend for
+new prompts, and a different server, temperature or max_tokens never gets
+replies sampled under other settings. The
+prompt templates repeat across held-out quotes, so the n-th occurrence of
+a prompt is cached as its own sample rather than sharing one reply.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import zlib
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from tokens import Tokenizer
+
+DEFAULT_EVAL_CACHE_PATH = os.path.join(".cache", "eval.sqlite")
+DEFAULT_EVAL_FILE = "combined_gandhi_valid_000.jsonl"
+DEFAULT_MODEL_ID_PATH = "gandhi_model_id.txt"
+
+# Buckets of the hashed character n-gram vectors used for style scores
+STYLE_FEATURES = 1 << 18
+STYLE_NGRAMS = (3, 4, 5)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replies (
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    sample INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    latency REAL NOT NULL,
+    completion_tokens INTEGER,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (model, prompt_hash, sample)
+);
+"""
+
+class EvalCase(NamedTuple):
+    messages: List[Dict]  # the prompt, without the reference reply
+    reference: str
+
+class Reply(NamedTuple):
+    text: str
+    latency: float
+    completion_tokens: Optional[int]
+    cached: bool = False
+
+def prompt_hash(messages: List[Dict]) -> str:
+    return hashlib.sha256(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def request_hash(messages: List[Dict], settings: Optional[Dict] = None) -> str:
+    """Hash of a prompt and the backend settings that shape its reply"""
+    request = {'messages': messages, 'settings': settings or {}}
+    return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class ReplyCache:
+    """SQLite store of backend replies keyed by (model, prompt and settings, sample)"""
+
+    def __init__(self, path: str = DEFAULT_EVAL_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, model: str, messages: List[Dict], sample: int = 0,
+            settings: Optional[Dict] = None) -> Optional[Reply]:
+        row = self.conn.execute(
+            "SELECT text, latency, completion_tokens FROM replies "
+            "WHERE model = ? AND prompt_hash = ? AND sample = ?",
+            (model, request_hash(messages, settings), sample),
+        ).fetchone()
+        return Reply(row[0], row[1], row[2], cached=True) if row else None
+
+    def store(self, model: str, messages: List[Dict], reply: Reply, sample: int = 0,
+              settings: Optional[Dict] = None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO replies VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model, request_hash(messages, settings), sample, reply.text, reply.latency,
+                 reply.completion_tokens, time.time()),
+            )
+
+class OpenAIBackend:
+    """Chat completions through openai.AsyncOpenAI, or an injected client
+    such as fake_openai.FakeAsyncOpenAI"""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 temperature: float = 0.7, max_tokens: int = 200, client=None):
+        if client is None:
+            from openai import AsyncOpenAI
+
+            # Local OpenAI-compatible servers accept any key
+            client = AsyncOpenAI(base_url=base_url, api_key=api_key or os.getenv("OPENAI_API_KEY") or "local")
+        self.client = client
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        # Everything besides model and prompt that changes the replies, for the cache key
+        self.settings = {'backend': 'openai', 'base_url': base_url,
+                         'temperature': temperature, 'max_tokens': max_tokens}
+
+    async def complete(self, model: str, messages: List[Dict]) -> Reply:
+        start = time.perf_counter()
+        response = await self.client.chat.completions.create(
+            model=model, messages=messages, temperature=self.temperature, max_tokens=self.max_tokens)
+        latency = time.perf_counter() - start
+        usage = getattr(response, 'usage', None)
+        return Reply(response.choices[0].message.content or '', latency,
+                     usage.completion_tokens if usage is not None else None)
+
+class MockBackend:
+    """Answers with a corpus quote picked by prompt hash, after a fake delay"""
+
+    def __init__(self, quotes_path: str = "combined_gandhi_quotes.txt", mean_latency: float = 0.05):
+        with open(quotes_path, 'r', encoding='utf-8') as f:
+            blocks = f.read().split('\n\n')
+        self.quotes = [re.sub(r'^\d+\.\s*', '', block.strip()) for block in blocks if block.strip()]
+        self.mean_latency = mean_latency
+        self.settings = {'backend': 'mock', 'quotes_path': os.path.abspath(quotes_path)}
+
+    async def complete(self, model: str, messages: List[Dict]) -> Reply:
+        digest = int(prompt_hash(messages)[:12], 16)
+        # Deterministic, long-tailed delay so p95 differs from p50
+        latency = self.mean_latency * (0.5 + ((digest >> 8) % 1000 / 1000) ** 3 * 3)
+        start = time.perf_counter()
+        await asyncio.sleep(latency)
+        return Reply(self.quotes[digest % len(self.quotes)], time.perf_counter() - start, None)
+
+BACKENDS: Dict[str, Callable[..., object]] = {
+    'openai': OpenAIBackend,
+    'mock': MockBackend,
+}
+
+def load_eval_cases(path: str, limit: Optional[int] = None) -> List[EvalCase]:
+    """Prompt and reference reply for each example of a held-out JSONL file
+
+    Each reference quote appears twice in the training data with different
+    prompts; only the first prompt is kept so quotes are weighted equally.
+    """
+    cases = []
+    seen = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            messages = json.loads(line)['messages']
+            if messages[-1]['role'] != 'assistant' or messages[-1]['content'] in seen:
+                continue
+            seen.add(messages[-1]['content'])
+            cases.append(EvalCase(messages[:-1], messages[-1]['content']))
+            if limit and len(cases) >= limit:
+                break
+    return cases
+
+def style_vector(text: str):
+    """Sparse L2-normalized hashed character n-gram counts: (indices, weights)"""
+    normalized = ' '.join(text.lower().split())
+    grams = [normalized[i:i + n] for n in STYLE_NGRAMS for i in range(len(normalized) - n + 1)]
+    hashed = np.fromiter((zlib.crc32(g.encode('utf-8')) % STYLE_FEATURES for g in grams),
+                         dtype=np.int64, count=len(grams))
+    indices, counts = np.unique(hashed, return_counts=True)
+    weights = counts.astype(np.float64)
+    return indices, weights / max(float(np.linalg.norm(weights)), 1e-12)
+
+def _cosine(a, b) -> float:
+    _, in_a, in_b = np.intersect1d(a[0], b[0], assume_unique=True, return_indices=True)
+    return float(a[1][in_a] @ b[1][in_b])
+
+def style_scores(replies: List[str], references: List[str]) -> Dict[str, np.ndarray]:
+    """Per-reply cosine similarity to its own reference and to the held-out style centroid"""
+    reply_vectors = [style_vector(text) for text in replies]
+    reference_vectors = [style_vector(text) for text in references]
+
+    centroid = np.zeros(STYLE_FEATURES)
+    for indices, weights in reference_vectors:
+        centroid[indices] += weights
+    centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+
+    return {
+        'reference': np.array([_cosine(r, ref) for r, ref in zip(reply_vectors, reference_vectors)]),
+        'style': np.array([float(centroid[indices] @ weights) for indices, weights in reply_vectors]),
+    }
+
+async def run_cases(backend, model: str, cases: List[EvalCase], cache: Optional[ReplyCache],
+                    concurrency: int = 8) -> List[Optional[Reply]]:
+    """Get a reply for every case, at most `concurrency` backend calls at once
+
+    A case whose backend call fails gets None and the error is printed.
+    Cached replies are only reused under the same backend settings.
+    """
+    settings = getattr(backend, 'settings', None)
+    slots = asyncio.Semaphore(concurrency)
+    occurrences: Dict[str, int] = {}
+    samples = []
+    for case in cases:
+        key = prompt_hash(case.messages)
+        samples.append(occurrences.get(key, 0))
+        occurrences[key] = samples[-1] + 1
+
+    async def one(case: EvalCase, sample: int) -> Optional[Reply]:
+        if cache is not None:
+            hit = cache.get(model, case.messages, sample, settings)
+            if hit is not None:
+                return hit
+        try:
+            async with slots:
+                reply = await backend.complete(model, case.messages)
+        except Exception as e:
+            print(f"  error: {e.__class__.__name__}: {e}")
+            return None
+        if cache is not None:
+            cache.store(model, case.messages, reply, sample, settings)
+        return reply
+
+    return await asyncio.gather(*(one(case, sample) for case, sample in zip(cases, samples)))
+
+def summarize(cases: List[EvalCase], replies: List[Optional[Reply]], tokenizer: Tokenizer) -> Dict:
+    kept = [(case, reply) for case, reply in zip(cases, replies) if reply is not None]
+    failed = len(replies) - len(kept)
+    if not kept:
+        return {'cases': 0, 'failed': failed}
+    cases = [case for case, _ in kept]
+    replies = [reply for _, reply in kept]
+    scores = style_scores([r.text for r in replies], [c.reference for c in cases])
+    latencies = np.array([r.latency for r in replies])
+    tokens = np.array([r.completion_tokens if r.completion_tokens is not None else tokenizer.count(r.text)
+                       for r in replies])
+    return {
+        'cases': len(cases),
+        'failed': failed,
+        'cached': sum(r.cached for r in replies),
+        'reference_similarity': float(scores['reference'].mean()),
+        'style_similarity': float(scores['style'].mean()),
+        'latency_p50': float(np.percentile(latencies, 50)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        'tokens_per_response': float(tokens.mean()),
+        'rows': [
+            {'prompt': c.messages[-1]['content'], 'reference': c.reference, 'reply': r.text,
+             'latency': r.latency, 'tokens': int(t), 'reference_similarity': float(ref),
+             'style_similarity': float(sty)}
+            for c, r, t, ref, sty in zip(cases, replies, tokens, scores['reference'], scores['style'])
+        ],
+    }
+
+def print_summary(summary: Dict, model: str):
+    print(f"\n{'='*50}")
+    print(f"EVALUATION: {model}")
+    print(f"{'='*50}")
+    if not summary['cases']:
+        print(f"All {summary['failed']} prompts failed")
+        return
+    print(f"Prompts: {summary['cases']} ({summary['cached']} from cache, {summary['failed']} failed)")
+    print(f"Style similarity to held-out quotes: {summary['style_similarity']:.3f}")
+    print(f"Similarity to the reference quote:   {summary['reference_similarity']:.3f}")
+    print(f"Latency p50 / p95: {summary['latency_p50'] * 1000:.0f} ms / {summary['latency_p95'] * 1000:.0f} ms")
+    print(f"Tokens per response: {summary['tokens_per_response']:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a fine-tuned model on held-out prompts")
+    parser.add_argument("--model", help=f"model ID (default: contents of {DEFAULT_MODEL_ID_PATH})")
+    parser.add_argument("--eval-file", default=DEFAULT_EVAL_FILE,
+                        help="held-out JSONL, e.g. a validation shard from shards.py")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default='openai')
+    parser.add_argument("--base-url", help="OpenAI-compatible server for the openai backend")
+    parser.add_argument("--limit", type=int, default=None, help="evaluate only the first N prompts")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--cache-path", default=DEFAULT_EVAL_CACHE_PATH)
+    parser.add_argument("--output", help="write per-prompt results to this JSON file")
+    args = parser.parse_args()
+
+    model = args.model
+    if not model:
+        if not os.path.exists(DEFAULT_MODEL_ID_PATH):
+            parser.error(f"no --model and no {DEFAULT_MODEL_ID_PATH}; run finetune.py first")
+        with open(DEFAULT_MODEL_ID_PATH, 'r', encoding='utf-8') as f:
+            model = f.read().strip()
+
+    if not os.path.exists(args.eval_file):
+        print(f"error: File '{args.eval_file}' not found!")
+        print(f"Write a validation shard with extract.py/scrape.py --shards, or pass --eval-file")
+        return
+
+    if args.backend == 'openai':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        backend = OpenAIBackend(args.base_url)
+    else:
+        backend = BACKENDS[args.backend]()
+    cache = None if args.no_cache else ReplyCache(args.cache_path)
+    cases = load_eval_cases(args.eval_file, args.limit)
+    print(f"Evaluating {model} on {len(cases)} held-out prompts via {args.backend}...")
+
+    replies = asyncio.run(run_cases(backend, model, cases, cache, args.concurrency))
+    summary = summarize(cases, replies, Tokenizer())
+    print_summary(summary, model)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'model': model, **summary}, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
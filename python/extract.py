@@ -5,19 +5,103 @@ Extracts quotes and structures them for model training
 """
 
 import PyPDF2
+import argparse
+import itertools
 import json
+import random
 import re
 import os
-from typing import List, Dict
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterable, Iterator, Optional, Sequence, Tuple
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract all text from PDF file"""
+from filters import PDF_FILTER
+import metrics
+from page_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, PageCache, file_hash
+from quote_store import DEFAULT_QUOTE_STORE_PATH, QuoteStore, pdf_source
+from scoring import DEFAULT_MIN_SCORE, filter_scored, print_report, score_quotes
+from segment import (BOUNDARY_PATTERN, MIN_LETTER_CHARS, Span, choose_strategy, count_boundaries,
+                     iter_sentences, join_pages, segment_letters, sentence_spans)
+from shards import (DEFAULT_MAX_SHARD_BYTES, DEFAULT_SEED, DEFAULT_VALID_FRACTION, manifest_path,
+                    print_manifest, write_shards)
+
+# Bump the suffix whenever page extraction changes so cached pages are redone
+EXTRACTOR_VERSION = f"PyPDF2-{PyPDF2.__version__}/1"
+
+# A letter with no boundary in sight is cut into chunks of about this size,
+# at a sentence end so its sentences come out the same as uncut
+MAX_LETTER_CHARS = 5000
+
+# Page ranges handed to each worker process, per worker. More than one
+# range per worker keeps the pool busy when some pages are slower to parse.
+RANGES_PER_WORKER = 4
+
+# Page ranges submitted ahead of the one being read, per worker; finished
+# ranges wait in memory only until the caller gets to them
+IN_FLIGHT_PER_WORKER = 2
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Return the number of pages in a PDF"""
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def _extract_page_range(task: Tuple[str, int, int]) -> List[str]:
+    """Worker: extract pages [start, stop) with its own PdfReader"""
+    pdf_path, start, stop = task
     with open(pdf_path, 'rb') as file:
         pdf_reader = PyPDF2.PdfReader(file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-    return text
+        return [pdf_reader.pages[i].extract_text() for i in range(start, stop)]
+
+def iter_pdf_pages(pdf_path: str, workers: int = 1, cache: Optional[PageCache] = None) -> Iterator[str]:
+    """Yield the raw text of each PDF page in order
+
+    With workers > 1 the page range is split across a process pool and the
+    results are reassembled in page order, so the output is identical to
+    the serial path. Only a few ranges per worker are in flight at a time,
+    so a slow consumer doesn't pile up every page in memory. With a cache,
+    pages of a PDF seen before are read back without parsing it at all.
+    """
+    if cache is not None:
+        pdf_hash = file_hash(pdf_path)
+        if cache.has_document(pdf_hash, EXTRACTOR_VERSION):
+            yield from cache.iter_pages(pdf_hash, EXTRACTOR_VERSION)
+        else:
+            pages = iter_pdf_pages(pdf_path, workers)
+            yield from cache.store_pages(pdf_hash, EXTRACTOR_VERSION, pages)
+        return
+
+    if workers <= 1:
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page in pdf_reader.pages:
+                yield page.extract_text()
+        return
+
+    page_count = count_pdf_pages(pdf_path)
+    chunk_size = max(1, -(-page_count // (workers * RANGES_PER_WORKER)))
+    tasks = [(pdf_path, start, min(start + chunk_size, page_count))
+             for start in range(0, page_count, chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = iter(tasks)
+        in_flight = deque(pool.submit(_extract_page_range, task)
+                          for task in itertools.islice(tasks, workers * IN_FLIGHT_PER_WORKER))
+        try:
+            while in_flight:
+                texts = in_flight.popleft().result()
+                for task in itertools.islice(tasks, 1):
+                    in_flight.append(pool.submit(_extract_page_range, task))
+                yield from texts
+        finally:
+            # A caller that stops early shouldn't wait for pages it won't read
+            for future in in_flight:
+                future.cancel()
+
+def extract_text_from_pdf(pdf_path: str, workers: int = 1, cache: Optional[PageCache] = None) -> str:
+    """Extract all text from PDF file"""
+    return "".join(iter_pdf_pages(pdf_path, workers, cache))
 
 def clean_text(text: str) -> str:
     """Clean extracted text"""
@@ -33,108 +117,176 @@ def clean_text(text: str) -> str:
 
 def is_junk_quote(quote: str) -> bool:
     """Filter out junk/headers/footers"""
-    junk_patterns = [
-        r'PUBUSH',
-        r'SJtllVEU',
-        r'Price \d+',
-        r'INTRODUCTION',
-        r'Page \d+',
-        r'^In these pages',
-        r'^During a period',
-        r'^\d+\s*$',  # Just numbers
-        r'^[A-Z\s]{20,}$',  # All caps headers
-        r'KACHBRI ROAD',
-        r'PRINTING WORKS',
-    ]
-    
-    for pattern in junk_patterns:
-        if re.search(pattern, quote, re.IGNORECASE):
-            return True
-    
-    # Filter out very short or very long
-    if len(quote) < 30 or len(quote) > 300:
-        return True
-    
-    # Must contain some letters
-    if not re.search(r'[a-zA-Z]{3,}', quote):
-        return True
-    
-    # Filter salutations and closings
-    salutations = ['dear sir', 'yours sincerely', 'yours truly', 'dear friend',
-                   'my dear', 'yours faithfully', 'with love', 'blessings']
-    if any(quote.lower().startswith(sal) for sal in salutations):
-        return True
-    
-    return False
+    return PDF_FILTER.reject_reason(quote) is not None
 
 def split_into_letters(text: str) -> List[str]:
     """Split text into individual letters/passages"""
-    # Try multiple splitting strategies
-    
-    # Strategy 1: Split by date patterns
-    letters = re.split(r'\n(?=\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', text)
-    
-    # Strategy 2: Split by "Dear" or "My dear"
-    if len(letters) < 10:
-        letters = re.split(r'\n(?=(?:My )?[Dd]ear [A-Z])', text)
-    
-    # Strategy 3: Split by letter numbers
-    if len(letters) < 10:
-        letters = re.split(r'\n(?=Letter \d+|No\. \d+|\d+\.)', text)
-    
-    # Strategy 4: Just split into chunks
-    if len(letters) < 10:
-        chunk_size = len(text) // 50  # Aim for ~50 chunks
-        letters = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-    
-    # Filter out very short segments
-    letters = [l.strip() for l in letters if len(l.strip()) > 200]
-    
-    return letters
+    _, spans = segment_letters(text)
+    return [text[span.start:span.end] for span in spans]
+
+def letter_strategy(pages: Iterable[str]) -> Optional[str]:
+    """The boundary strategy segment_letters would pick for these cleaned pages"""
+    return choose_strategy(count_boundaries(pages))
+
+def _chunk_cut(text: str, limit: int) -> Tuple[int, int]:
+    """(end of this chunk, start of the next) for cutting text near limit
+
+    The cut falls before the last sentence that starts before limit, and the
+    chunk ends where the sentence ahead of it does, without its punctuation,
+    just as that sentence would come out of the uncut letter.
+    """
+    spans = list(sentence_spans(text, 0, limit))
+    if len(spans) < 2:
+        # One sentence longer than the limit has to be cut inside
+        return limit, limit
+    return spans[-2][1], spans[-1][0]
+
+def iter_letters(pages: Iterable[str], strategy: Optional[str] = None,
+                 max_letter_chars: int = MAX_LETTER_CHARS) -> Iterator[Tuple[int, str]]:
+    """Stream (page_index, letter) pairs out of cleaned pages.
+
+    Letters start at segment.BOUNDARY_PATTERN matches of the given strategy
+    (see letter_strategy); with none, letters are only cut for length.
+    Only the current letter is buffered, so a letter that runs over a page
+    edge is carried into the next page and memory stays bounded by
+    max_letter_chars rather than the size of the PDF.
+    """
+    buffer = ""
+    # (offset into buffer, page index) for every page held in the buffer
+    page_starts: List[Tuple[int, int]] = []
+    # Whether the buffer holds the rest of a letter that was cut for length
+    continued = False
+
+    def page_at(offset: int) -> int:
+        page = page_starts[0][1]
+        for start, index in page_starts:
+            if start > offset:
+                break
+            page = index
+        return page
+
+    def emit(end: int) -> Iterator[Tuple[int, str]]:
+        letter = buffer[:end].strip()
+        # Short letters are dropped like in segment_letters, but not the tail of a long one
+        if len(letter) > MIN_LETTER_CHARS or (continued and letter):
+            yield page_at(0), letter
+
+    def consume(end: int):
+        nonlocal buffer, page_starts
+        buffer = buffer[end:]
+        kept = [(start - end, index) for start, index in page_starts if start - end > 0]
+        page_starts = [(0, page_at(end))] + kept
+
+    def next_boundary():
+        position = 1
+        while strategy is not None:
+            match = BOUNDARY_PATTERN.search(buffer, position)
+            if match is None or match.lastgroup == strategy:
+                return match
+            position = match.end()
+        return None
+
+    for page_index, page in enumerate(pages):
+        if buffer:
+            buffer += " "
+        page_starts.append((len(buffer), page_index))
+        buffer += page
+
+        # Boundaries are searched on the joined buffer, so a salutation or
+        # date split across the page edge is still found.
+        while True:
+            match = next_boundary()
+            if match is None:
+                break
+            yield from emit(match.start())
+            consume(match.start() + 1)
+            continued = False
+
+        while len(buffer) > max_letter_chars:
+            end, next_start = _chunk_cut(buffer, max_letter_chars)
+            yield from emit(end)
+            consume(next_start)
+            continued = True
+
+    if buffer:
+        yield from emit(len(buffer))
+
+def _letter_quotes(letter: str) -> Iterator[str]:
+    """Yield candidate quotes from a single letter"""
+    for start, end in sentence_spans(letter):
+        sentence = letter[start:end]
+        # Skip junk and keep philosophical/meaningful sentences
+        if PDF_FILTER.accepts(sentence):
+            yield sentence
+
+def iter_quotes(letters: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+    """Stream unique (page_index, quote) pairs from (page_index, letter) pairs"""
+    seen = set()
+    for page_index, letter in letters:
+        for quote in _letter_quotes(letter):
+            normalized = quote.lower().strip()
+            if normalized not in seen:
+                seen.add(normalized)
+                yield page_index, quote
+
+def iter_quote_spans(text: str, letters: Iterable[Span], page_starts: Sequence[int] = (0,)) -> Iterator[Span]:
+    """Stream the spans of unique, accepted sentences of the letter spans of text"""
+    seen = set()
+    for span in iter_sentences(text, letters, page_starts):
+        sentence = text[span.start:span.end]
+        if PDF_FILTER.accepts(sentence):
+            normalized = sentence.lower()
+            if normalized not in seen:
+                seen.add(normalized)
+                yield span
 
 def extract_quotes(letters: List[str]) -> List[str]:
     """Extract meaningful quotes from letters"""
-    quotes = []
-    
-    for letter in letters:
-        # Split into sentences (improved)
-        # Handle periods in abbreviations
-        sentences = re.split(r'(?<![A-Z])\.(?!\d)\s+|\n+|[!?]+\s+', letter)
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            
-            # Skip if it's junk
-            if is_junk_quote(sentence):
-                continue
-            
-            # Keep philosophical/meaningful sentences
-            # Look for keywords that indicate Gandhi's wisdom
-            wisdom_keywords = [
-                'truth', 'love', 'non-violence', 'god', 'soul', 'spirit',
-                'duty', 'service', 'sacrifice', 'peace', 'justice',
-                'believe', 'faith', 'prayer', 'heart', 'conscience',
-                'freedom', 'liberty', 'righteous', 'moral'
+    return [quote for _, quote in iter_quotes((0, letter) for letter in letters)]
+
+PROMPT_VARIATIONS = [
+    "What do you believe about love and truth?",
+    "Share your wisdom with me.",
+    "What would you say about this?",
+    "Tell me something meaningful.",
+    "Guide me with your thoughts.",
+    "What is your philosophy?",
+    "Speak to me about life and duty.",
+]
+
+SYSTEM_PROMPTS = [
+    "You are Gandhi speaking in a visual novel love story. Respond with wisdom, compassion, and deep philosophical insight about love, duty, and life.",
+    "You are Mahatma Gandhi in a romantic visual novel. Share your thoughts with gentle wisdom.",
+    "You are Gandhi, the spiritual leader. Offer guidance with compassion and truth.",
+]
+
+CSV_PROMPT_TEMPLATES = [
+    "Gandhi, share your wisdom:",
+    "What would Gandhi say about this?",
+    "Gandhi's thoughts:",
+    "Speak to me, Gandhi:",
+    "What is your philosophy, Gandhi?",
+    "Guide me with your wisdom:",
+    "Tell me about truth and love:",
+]
+
+def make_training_examples(quote: str, rng=random) -> List[Dict]:
+    """Create 2 chat examples for a quote with different prompts
+
+    Pass a seeded random.Random as rng for reproducible prompts.
+    """
+    return [
+        {
+            "messages": [
+                {"role": "system", "content": rng.choice(SYSTEM_PROMPTS)},
+                {"role": "user", "content": rng.choice(PROMPT_VARIATIONS)},
+                {"role": "assistant", "content": quote}
             ]
-            
-            # Prioritize sentences with wisdom keywords
-            has_wisdom = any(keyword in sentence.lower() for keyword in wisdom_keywords)
-            
-            if has_wisdom or (30 < len(sentence) < 250):
-                quotes.append(sentence)
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_quotes = []
-    for quote in quotes:
-        normalized = quote.lower().strip()
-        if normalized not in seen:
-            seen.add(normalized)
-            unique_quotes.append(quote)
-    
-    return unique_quotes
+        }
+        for _ in range(2)
+    ]
 
-def create_training_data_jsonl(quotes: List[str], output_path: str):
+def create_training_data_jsonl(quotes: Iterable[str], output_path: str):
     """Create JSONL training data in OpenAI fine-tuning format"""
     
     # Ensure directory exists
@@ -142,36 +294,10 @@ def create_training_data_jsonl(quotes: List[str], output_path: str):
     
     with open(output_path, 'w', encoding='utf-8') as f:
         for quote in quotes:
-            # Create varied training examples
-            prompt_variations = [
-                "What do you believe about love and truth?",
-                "Share your wisdom with me.",
-                "What would you say about this?",
-                "Tell me something meaningful.",
-                "Guide me with your thoughts.",
-                "What is your philosophy?",
-                "Speak to me about life and duty.",
-            ]
-            
-            system_prompts = [
-                "You are Gandhi speaking in a visual novel love story. Respond with wisdom, compassion, and deep philosophical insight about love, duty, and life.",
-                "You are Mahatma Gandhi in a romantic visual novel. Share your thoughts with gentle wisdom.",
-                "You are Gandhi, the spiritual leader. Offer guidance with compassion and truth.",
-            ]
-            
-            # Create 2 examples per quote with different prompts
-            import random
-            for _ in range(2):
-                example = {
-                    "messages": [
-                        {"role": "system", "content": random.choice(system_prompts)},
-                        {"role": "user", "content": random.choice(prompt_variations)},
-                        {"role": "assistant", "content": quote}
-                    ]
-                }
+            for example in make_training_examples(quote):
                 f.write(json.dumps(example, ensure_ascii=False) + '\n')
 
-def create_training_data_csv(quotes: List[str], output_path: str):
+def create_training_data_csv(quotes: Iterable[str], output_path: str):
     """Create CSV format for simpler fine-tuning approaches"""
     import csv
     
@@ -181,20 +307,96 @@ def create_training_data_csv(quotes: List[str], output_path: str):
         writer = csv.writer(f)
         writer.writerow(['prompt', 'completion'])
         
-        prompt_templates = [
-            "Gandhi, share your wisdom:",
-            "What would Gandhi say about this?",
-            "Gandhi's thoughts:",
-            "Speak to me, Gandhi:",
-            "What is your philosophy, Gandhi?",
-            "Guide me with your wisdom:",
-            "Tell me about truth and love:",
-        ]
-        
         for i, quote in enumerate(quotes):
-            prompt = prompt_templates[i % len(prompt_templates)]
+            prompt = CSV_PROMPT_TEMPLATES[i % len(CSV_PROMPT_TEMPLATES)]
             writer.writerow([prompt, quote])
 
+def _spool(pages: Iterable[str]) -> Tuple[Iterator[str], Iterator[str]]:
+    """Two passes over pages that consume them once: the first yields them
+    while writing them to a temporary file, the second reads that file back"""
+    spool = tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def first() -> Iterator[str]:
+        for page in pages:
+            spool.write(json.dumps(page, ensure_ascii=False) + '\n')
+            yield page
+
+    def second() -> Iterator[str]:
+        with spool:
+            spool.seek(0)
+            for line in spool:
+                yield json.loads(line)
+
+    return first(), second()
+
+def run_streaming_pipeline(pdf_path: str, output_dir: str = ".", workers: int = 1,
+                           cache: Optional[PageCache] = None, store: Optional[QuoteStore] = None,
+                           min_score: Optional[float] = DEFAULT_MIN_SCORE) -> int:
+    """Extract quotes page by page and write every output file incrementally.
+
+    Nothing larger than one letter is held in memory; returns the number
+    of quotes written. Quotes are also upserted into the store, tagged
+    with the page their letter starts on. Quotes scoring below min_score
+    are dropped (None keeps everything).
+    """
+    import csv
+
+    os.makedirs(output_dir, exist_ok=True)
+    # A first pass only counts letter boundaries, to pick the strategy the batch path would.
+    # Without a page cache to read pages back from, the cleaned pages are spooled to disk
+    # so the PDF is still parsed once.
+    pages = (clean_text(page) for page in metrics.counted('pdf_pages', iter_pdf_pages(pdf_path, workers, cache)))
+    if cache is None:
+        first_pass, pages = _spool(pages)
+    else:
+        first_pass = (clean_text(page) for page in iter_pdf_pages(pdf_path, workers, cache))
+    strategy = letter_strategy(first_pass)
+    print(f"Letter boundaries: {strategy or 'fixed chunks'}")
+    quotes = iter_quotes(iter_letters(pages, strategy))
+    if min_score is not None:
+        quotes = filter_scored(quotes, min_score)
+
+    count = 0
+    total_length = 0
+    started = time.time()
+    # Store writes are batched so each quote doesn't cost a transaction
+    pending_records = []
+    with open(f"{output_dir}/gandhi_training.jsonl", 'w', encoding='utf-8') as jsonl_file, \
+            open(f"{output_dir}/gandhi_training.csv", 'w', newline='', encoding='utf-8') as csv_file, \
+            open(f"{output_dir}/gandhi_quotes.txt", 'w', encoding='utf-8') as txt_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['prompt', 'completion'])
+
+        for page_index, quote in quotes:
+            if store is not None:
+                pending_records.append((quote, pdf_source(pdf_path, page_index)))
+                if len(pending_records) >= 500:
+                    store.add_many(pending_records)
+                    pending_records = []
+            for example in make_training_examples(quote):
+                jsonl_file.write(json.dumps(example, ensure_ascii=False) + '\n')
+            writer.writerow([CSV_PROMPT_TEMPLATES[count % len(CSV_PROMPT_TEMPLATES)], quote])
+            count += 1
+            total_length += len(quote)
+            txt_file.write(f"{count}. {quote}\n\n")
+
+    if store is not None:
+        if pending_records:
+            store.add_many(pending_records)
+        # Drop quotes an earlier extraction of this PDF produced but this one didn't
+        store.prune(pdf_source(pdf_path), started)
+
+    print(f"Total quotes extracted: {count}")
+    if count:
+        print(f"Average quote length: {total_length / count:.0f} characters")
+    return count
+
+def _count_filter_metrics(quotes_written: int):
+    rule_counts = PDF_FILTER.rule_counts()
+    metrics.count('sentences', sum(rule_counts.values()))
+    metrics.add_counts(rule_counts, 'filter.')
+    metrics.count('quotes_written', quotes_written)
+
 def analyze_data_quality(quotes: List[str]):
     """Print statistics about the extracted data"""
     print(f"\n{'='*50}")
@@ -218,9 +420,39 @@ def analyze_data_quality(quotes: List[str]):
 
 def main():
     """Main data preparation pipeline"""
+    parser = argparse.ArgumentParser(description="Extract Gandhi quotes from a PDF for fine-tuning")
+    parser.add_argument("pdf_path", nargs="?", default="gandhi-letters.pdf")
+    parser.add_argument("--stream", action="store_true",
+                        help="process the PDF page by page with memory bounded by one letter "
+                             "(with --no-cache the cleaned pages are spooled to a temporary file)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to parse PDF pages")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always re-parse the PDF instead of using the page cache")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    parser.add_argument("--store", default=DEFAULT_QUOTE_STORE_PATH,
+                        help="quote store that extracted quotes are upserted into")
+    parser.add_argument("--no-store", action="store_true")
+    parser.add_argument("--shards", action="store_true",
+                        help="also write seeded train/validation shards and a manifest")
+    parser.add_argument("--valid-fraction", type=float, default=DEFAULT_VALID_FRACTION)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--shard-mb", type=float, default=DEFAULT_MAX_SHARD_BYTES / 1024 / 1024)
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE,
+                        help="drop quotes whose quality score is below this")
+    parser.add_argument("--top-n", type=int, default=None, help="keep at most the N best scoring quotes")
+    parser.add_argument("--no-scoring", action="store_true", help="keep every quote the filters accept")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    
+    if args.stream and args.shards:
+        parser.error("--shards needs the quote list, run without --stream")
+    if args.stream and args.top_n:
+        parser.error("--top-n needs the quote list, run without --stream")
     
     # Get the PDF path - UPDATE THIS!
-    pdf_path = "gandhi-letters.pdf"  # Put your PDF in the same folder as this script
+    pdf_path = args.pdf_path  # Put your PDF in the same folder as this script
     
     # Or use full path:
     # pdf_path = r"C:\Users\Gabriel Kuek\Desktop\Side Stuff\chess-game\python\gandhi_letters.pdf"
@@ -230,22 +462,59 @@ def main():
         print(f"Current directory: {os.getcwd()}")
         print(f"\nPlease either:")
         print(f"1. Copy your PDF to: {os.getcwd()}")
-        print(f"2. Or edit line 200 in this script with the full path to your PDF")
+        print(f"2. Or pass the full path to your PDF as the first argument")
+        return
+    
+    cache = None
+    if not args.no_cache:
+        cache = PageCache(args.cache_path, max_bytes=args.cache_max_mb * 1024 * 1024)
+    store = None if args.no_store else QuoteStore(args.store)
+    metrics.start_run("extract", args)
+    # Counts from an earlier run in this process would be reported again
+    PDF_FILTER.reset()
+    
+    if args.stream:
+        print("Streaming quotes from PDF page by page...")
+        with metrics.stage("stream"):
+            count = run_streaming_pipeline(pdf_path, workers=args.workers, cache=cache, store=store,
+                                           min_score=None if args.no_scoring else args.min_score)
+        print("✓ Created: gandhi_training.jsonl, gandhi_training.csv, gandhi_quotes.txt")
+        if count < 50:
+            print("\n⚠️  WARNING: Found fewer than 50 quotes.")
+        _count_filter_metrics(count)
+        metrics.finish()
         return
     
     print("Step 1: Extracting text from PDF...")
-    raw_text = extract_text_from_pdf(pdf_path)
-    print(f"Extracted {len(raw_text)} characters")
+    with metrics.stage("pdf_text"):
+        raw_pages = list(iter_pdf_pages(pdf_path, workers=args.workers, cache=cache))
+    print(f"Extracted {sum(len(page) for page in raw_pages)} characters from {len(raw_pages)} pages")
+    metrics.count('pdf_pages', len(raw_pages))
     
     print("\nStep 2: Cleaning text...")
-    clean = clean_text(raw_text)
+    # Cleaned page by page so every letter and quote can be traced to its page
+    with metrics.stage("clean"):
+        clean, page_starts = join_pages([clean_text(page) for page in raw_pages])
+    metrics.count('characters', len(clean))
     
     print("\nStep 3: Splitting into letters...")
-    letters = split_into_letters(clean)
-    print(f"Found {len(letters)} letters/sections")
+    with metrics.stage("segment"):
+        strategy, letters = segment_letters(clean, page_starts)
+    print(f"Found {len(letters)} letters/sections (split by {strategy or 'fixed-size chunks'})")
+    metrics.count('letters', len(letters))
     
     print("\nStep 4: Extracting quotes...")
-    quotes = extract_quotes(letters)
+    with metrics.stage("quotes"):
+        quote_spans = list(iter_quote_spans(clean, letters, page_starts))
+        quotes = [clean[span.start:span.end] for span in quote_spans]
+    quote_pages = [span.page for span in quote_spans]
+    if not args.no_scoring:
+        with metrics.stage("scoring"):
+            selection = score_quotes(quotes, args.min_score, args.top_n)
+        print_report(selection)
+        quotes = selection.quotes
+        quote_pages = [quote_pages[i] for i in selection.kept]
+    _count_filter_metrics(len(quotes))
     
     # Analyze quality
     analyze_data_quality(quotes)
@@ -260,19 +529,34 @@ def main():
     # Use current directory instead of /home/claude
     output_dir = "."
     
-    # Create JSONL for OpenAI fine-tuning
-    create_training_data_jsonl(quotes, f"{output_dir}/gandhi_training.jsonl")
-    print("✓ Created: gandhi_training.jsonl (OpenAI format)")
-    
-    # Create CSV for other approaches
-    create_training_data_csv(quotes, f"{output_dir}/gandhi_training.csv")
-    print("✓ Created: gandhi_training.csv (CSV format)")
-    
-    # Save raw quotes for manual review
-    with open(f"{output_dir}/gandhi_quotes.txt", 'w', encoding='utf-8') as f:
-        for i, quote in enumerate(quotes, 1):
-            f.write(f"{i}. {quote}\n\n")
-    print("✓ Created: gandhi_quotes.txt (for manual review)")
+    with metrics.stage("write_files"):
+        # Create JSONL for OpenAI fine-tuning
+        create_training_data_jsonl(quotes, f"{output_dir}/gandhi_training.jsonl")
+        print("✓ Created: gandhi_training.jsonl (OpenAI format)")
+        
+        # Create CSV for other approaches
+        create_training_data_csv(quotes, f"{output_dir}/gandhi_training.csv")
+        print("✓ Created: gandhi_training.csv (CSV format)")
+        
+        # Save raw quotes for manual review
+        with open(f"{output_dir}/gandhi_quotes.txt", 'w', encoding='utf-8') as f:
+            for i, quote in enumerate(quotes, 1):
+                f.write(f"{i}. {quote}\n\n")
+        print("✓ Created: gandhi_quotes.txt (for manual review)")
+    
+    if args.shards:
+        with metrics.stage("shards"):
+            manifest = write_shards(quotes, make_training_examples, output_dir, "gandhi",
+                                    args.valid_fraction, args.seed, int(args.shard_mb * 1024 * 1024))
+        print_manifest(manifest)
+        print(f"✓ Created: {manifest_path(output_dir, 'gandhi')}")
+    
+    if store is not None:
+        with metrics.stage("store"):
+            started = time.time()
+            added = store.add_many((quote, pdf_source(pdf_path, page)) for quote, page in zip(quotes, quote_pages))
+            pruned = store.prune(pdf_source(pdf_path), started)
+        print(f"✓ Stored {added} new quotes in {store.path}, pruned {pruned} stale ones")
     
     print(f"\n{'='*50}")
     print("Data preparation complete!")
@@ -288,6 +572,8 @@ def main():
     else:
         print("\n⚠️  You may want to manually add more quotes.")
         print("Goal: 200-500 high-quality Gandhi quotes")
+    
+    metrics.finish()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the OpenAI files, fine-tuning and chat endpoints
+Implements the subset of openai.AsyncOpenAI the orchestrator and the
+evaluation harness use. Time
+is counted in polls rather than seconds: every jobs.retrieve moves a job
+one step along validating_files -> queued -> running -> succeeded and
+emits a metrics event with a made-up but deterministic loss curve, so
+dry runs and sweeps finish instantly and give repeatable numbers. Chat
+replies echo the request's model and sampling settings, so a test can
+tell which request a reply answered.
+"""
+
+import json
+import math
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+# Loss the fake converges to per base model; bigger models fit better
+MODEL_LOSS_FLOOR = {
+    "gpt-4o-2024-08-06": 0.9,
+    "gpt-4o-mini-2024-07-18": 1.1,
+    "gpt-3.5-turbo": 1.4,
+}
+
+class _Files:
+    def __init__(self, api: 'FakeAsyncOpenAI'):
+        self.api = api
+        self.files: Dict[str, Dict] = {}
+
+    async def create(self, file, purpose: str):
+        data = file.read()
+        examples = 0
+        status = 'processed'
+        for line in data.splitlines():
+            try:
+                json.loads(line)['messages']
+                examples += 1
+            except (ValueError, KeyError, TypeError):
+                status = 'error'
+        file_id = f"file-fake{len(self.files) + 1}"
+        self.files[file_id] = {
+            'id': file_id,
+            'examples': examples,
+            'final_status': status,
+            'polls_left': self.api.processing_polls,
+        }
+        return SimpleNamespace(id=file_id, status='uploaded')
+
+    async def retrieve(self, file_id: str):
+        record = self.files[file_id]
+        if record['polls_left'] > 0:
+            record['polls_left'] -= 1
+            return SimpleNamespace(id=file_id, status='uploaded')
+        return SimpleNamespace(id=file_id, status=record['final_status'])
+
+class _Jobs:
+    def __init__(self, api: 'FakeAsyncOpenAI'):
+        self.api = api
+        self.jobs: Dict[str, Dict] = {}
+
+    async def create(self, training_file: str, model: str, suffix: Optional[str] = None,
+                     hyperparameters: Optional[Dict] = None, validation_file: Optional[str] = None):
+        files = self.api.files.files
+        if training_file not in files or files[training_file]['final_status'] != 'processed':
+            raise ValueError(f"invalid training_file: {training_file}")
+        hyperparameters = dict(hyperparameters or {})
+        epochs = hyperparameters.get('n_epochs', 3)
+        job_id = f"ftjob-fake{len(self.jobs) + 1}"
+        self.jobs[job_id] = {
+            'id': job_id,
+            'model': model,
+            'suffix': suffix,
+            'epochs': epochs,
+            'lr': hyperparameters.get('learning_rate_multiplier', 1.0),
+            'examples': files[training_file]['examples'],
+            'has_validation': validation_file is not None,
+            'status': 'validating_files',
+            'step': 0,
+            'total_steps': epochs * self.api.steps_per_epoch,
+            'events': [],
+        }
+        self._event(self.jobs[job_id], 'message', "Validating training file")
+        return self._view(self.jobs[job_id])
+
+    async def retrieve(self, job_id: str):
+        job = self.jobs[job_id]
+        self._advance(job)
+        return self._view(job)
+
+    async def list_events(self, job_id: str, limit: int = 20):
+        events = self.jobs[job_id]['events']
+        return SimpleNamespace(data=list(reversed(events))[:limit])
+
+    def _event(self, job: Dict, kind: str, message: str, data: Optional[Dict] = None):
+        job['events'].append(SimpleNamespace(
+            id=f"ftevent-{job['id']}-{len(job['events']) + 1}",
+            created_at=len(job['events']),
+            level='info',
+            message=message,
+            object='fine_tuning.job.event',
+            data=data,
+            type=kind,
+        ))
+
+    def _loss(self, job: Dict, progress: float) -> Dict:
+        floor = MODEL_LOSS_FLOOR.get(job['model'], 1.2)
+        # Higher learning rates converge faster but settle a little higher
+        speed = 3.0 * job['lr']
+        train = floor + 0.05 * (job['lr'] - 1) ** 2 + 1.5 * math.exp(-speed * progress * job['epochs'] / 3)
+        # Validation loss creeps back up once training runs past ~3 epochs
+        overfit = 0.04 * max(0.0, progress * job['epochs'] - 3) ** 2
+        return {'train_loss': round(train, 4), 'valid_loss': round(train + 0.05 + overfit, 4)}
+
+    def _advance(self, job: Dict):
+        if job['status'] == 'validating_files':
+            job['status'] = 'queued'
+            self._event(job, 'message', "Files validated, moving job to queued state")
+        elif job['status'] == 'queued':
+            job['status'] = 'running'
+            self._event(job, 'message', "Fine-tuning job started")
+        elif job['status'] == 'running':
+            job['step'] += 1
+            if job['model'] in self.api.fail_models:
+                job['status'] = 'failed'
+                job['error'] = SimpleNamespace(message=f"Model {job['model']} is not available for fine-tuning")
+                self._event(job, 'message', "Fine-tuning job failed")
+                return
+            losses = self._loss(job, job['step'] / job['total_steps'])
+            data = {'step': job['step'], 'train_loss': losses['train_loss']}
+            if job['has_validation']:
+                data['valid_loss'] = losses['valid_loss']
+            self._event(job, 'metrics', f"Step {job['step']}/{job['total_steps']}", data)
+            if job['step'] >= job['total_steps']:
+                job['status'] = 'succeeded'
+                self._event(job, 'message', "The job has successfully completed")
+
+    def _view(self, job: Dict):
+        succeeded = job['status'] == 'succeeded'
+        return SimpleNamespace(
+            id=job['id'],
+            status=job['status'],
+            model=job['model'],
+            fine_tuned_model=f"ft:{job['model']}:personal:{job['suffix']}:{job['id']}" if succeeded else None,
+            trained_tokens=job['examples'] * 80 * job['epochs'] if succeeded else None,
+            error=job.get('error'),
+        )
+
+class _Completions:
+    def __init__(self):
+        self.calls: List[Dict] = []
+
+    async def create(self, model: str, messages: List[Dict], temperature: float = 1.0,
+                     max_tokens: Optional[int] = None):
+        self.calls.append({'model': model, 'messages': messages,
+                           'temperature': temperature, 'max_tokens': max_tokens})
+        words = f"Truth is God, said {model} at temperature {temperature}.".split()[:max_tokens]
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(role='assistant', content=' '.join(words)))],
+            usage=SimpleNamespace(completion_tokens=len(words)),
+        )
+
+class FakeAsyncOpenAI:
+    """Drop-in for openai.AsyncOpenAI(...) in orchestrator and sweep runs"""
+
+    def __init__(self, steps_per_epoch: int = 4, processing_polls: int = 1,
+                 fail_models: Iterable[str] = ()):
+        self.steps_per_epoch = steps_per_epoch
+        self.processing_polls = processing_polls
+        self.fail_models: List[str] = list(fail_models)
+        self.files = _Files(self)
+        self.fine_tuning = SimpleNamespace(jobs=_Jobs(self))
+        self.chat = SimpleNamespace(completions=_Completions())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Shared quote filtering for extract.py and scrape.py
+Every junk pattern and wisdom keyword is compiled once into a single
+alternation, so each sentence is classified in one pass
+"""
+
+import argparse
+import re
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+_WORD_REGEX = re.compile(r'[a-zA-Z]{3,}')
+_TOKEN_REGEX = re.compile(r'\b\w+\b')
+
+class Verdict(NamedTuple):
+    """Outcome of classifying one sentence"""
+    accepted: bool
+    rule: Optional[str]  # name of the rule that rejected it, if any
+    wisdom: Tuple[str, ...]  # wisdom keywords found in it
+
+class QuoteFilter:
+    """Single-pass junk/wisdom classifier with per-rule hit counts"""
+
+    def __init__(self, junk_patterns: Dict[str, str], wisdom_keywords: Sequence[str],
+                 min_length: int = 30, max_length: int = 300, keep_below: int = 250,
+                 salutations: Sequence[str] = (), min_words: int = 0,
+                 require_letters: bool = True):
+        self.min_length = min_length
+        self.max_length = max_length
+        self.keep_below = keep_below
+        self.min_words = min_words
+        self.require_letters = require_letters
+        self.junk_regex = re.compile(
+            '|'.join(f'(?P<{name}>{pattern})' for name, pattern in junk_patterns.items()),
+            re.IGNORECASE,
+        )
+        # Longest first so overlapping keywords report the more specific one
+        keywords = sorted(set(wisdom_keywords), key=lambda k: (-len(k), k))
+        self.wisdom_regex = re.compile('|'.join(re.escape(k) for k in keywords))
+        self.salutation_regex = None
+        if salutations:
+            self.salutation_regex = re.compile('|'.join(re.escape(s) for s in salutations))
+        self.hits: Counter = Counter()
+
+    def reject_reason(self, sentence: str, lowered: Optional[str] = None) -> Optional[str]:
+        """Return the name of the first rule that rejects the sentence, or None"""
+        length = len(sentence)
+        if length < self.min_length:
+            return 'too_short'
+        if length > self.max_length:
+            return 'too_long'
+
+        match = self.junk_regex.search(sentence)
+        if match:
+            return match.lastgroup
+
+        if self.require_letters and not _WORD_REGEX.search(sentence):
+            return 'no_letters'
+
+        if self.salutation_regex is not None:
+            if lowered is None:
+                lowered = sentence.lower()
+            if self.salutation_regex.match(lowered):
+                return 'salutation'
+
+        if self.min_words and len(_TOKEN_REGEX.findall(sentence)) < self.min_words:
+            return 'too_few_words'
+
+        return None
+
+    def classify(self, sentence: str) -> Verdict:
+        """Classify a stripped sentence and record which rule fired"""
+        lowered = sentence.lower()
+        rule = self.reject_reason(sentence, lowered)
+        if rule is not None:
+            self.hits[rule] += 1
+            return Verdict(False, rule, ())
+
+        wisdom = tuple(self.wisdom_regex.findall(lowered))
+        if wisdom or self.min_length < len(sentence) < self.keep_below:
+            self.hits['accepted'] += 1
+            for keyword in wisdom:
+                self.hits[f'wisdom:{keyword}'] += 1
+            return Verdict(True, None, wisdom)
+
+        self.hits['no_wisdom_too_long'] += 1
+        return Verdict(False, 'no_wisdom_too_long', ())
+
+    def accepts(self, sentence: str) -> bool:
+        return self.classify(sentence).accepted
+
+    def reset(self):
+        """Forget the hit counts; PDF_FILTER and SPEECH_FILTER are shared, so runs start with this"""
+        self.hits.clear()
+
+    def rule_counts(self) -> Dict[str, int]:
+        """Sentences accepted and rejected per rule so far, without the wisdom keyword hits"""
+        return {rule: n for rule, n in self.hits.items() if not rule.startswith('wisdom:')}
+
+# Headers, footers and front matter from the letters PDF
+PDF_JUNK_PATTERNS = {
+    'publisher': r'PUBUSH',
+    'printer_stamp': r'SJtllVEU',
+    'price': r'Price \d+',
+    'introduction': r'INTRODUCTION',
+    'page_number': r'Page \d+',
+    'preface_pages': r'^In these pages',
+    'preface_period': r'^During a period',
+    'only_digits': r'^\d+\s*$',
+    'caps_header': r'^[A-Z\s]{20,}$',
+    'publisher_address': r'KACHBRI ROAD',
+    'printing_works': r'PRINTING WORKS',
+}
+
+PDF_WISDOM_KEYWORDS = [
+    'truth', 'love', 'non-violence', 'god', 'soul', 'spirit',
+    'duty', 'service', 'sacrifice', 'peace', 'justice',
+    'believe', 'faith', 'prayer', 'heart', 'conscience',
+    'freedom', 'liberty', 'righteous', 'moral'
+]
+
+PDF_SALUTATIONS = ['dear sir', 'yours sincerely', 'yours truly', 'dear friend',
+                   'my dear', 'yours faithfully', 'with love', 'blessings']
+
+# Navigation and metadata from mkgandhi.org pages
+SPEECH_SKIP_PATTERNS = {
+    'nav_back_next': r'Back\s*Next',
+    'nav_home': r'Home\s*About Us',
+    'site_name': r'Mahatma Gandhi',
+    'site_domain': r'mkgandhi\.org',
+    'site_tagline': r'Comprehensive website',
+    'nav_institutions': r'Gandhian Institutions',
+    'list_number': r'^\s*\d+\.\s*$',
+    'nav_menu': r'Menu\s*Submit',
+    'nav_famous': r'Famous Speeches',
+}
+
+SPEECH_WISDOM_KEYWORDS = [
+    'truth', 'love', 'non-violence', 'god', 'freedom', 'duty',
+    'service', 'sacrifice', 'peace', 'justice', 'believe', 'faith',
+    'soul', 'spirit', 'heart', 'conscience', 'moral', 'righteous',
+    'ahimsa', 'satyagraha', 'mankind', 'humanity'
+]
+
+PDF_FILTER = QuoteFilter(PDF_JUNK_PATTERNS, PDF_WISDOM_KEYWORDS, salutations=PDF_SALUTATIONS)
+SPEECH_FILTER = QuoteFilter(SPEECH_SKIP_PATTERNS, SPEECH_WISDOM_KEYWORDS, min_words=5,
+                            require_letters=False)
+
+def load_corpus_sentences(path: str) -> List[str]:
+    """Read sentences from a numbered quotes file such as combined_gandhi_quotes.txt"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    return [re.sub(r'^\d+\.\s*', '', line) for line in lines if line]
+
+def benchmark(sentences: List[str], quote_filter: QuoteFilter, min_sentences: int = 100000) -> float:
+    """Classify the corpus repeatedly and return sentences per second"""
+    repeats = max(1, -(-min_sentences // max(1, len(sentences))))
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for sentence in sentences:
+            quote_filter.classify(sentence)
+    elapsed = time.perf_counter() - start
+    return repeats * len(sentences) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark for the quote filters")
+    parser.add_argument("corpus", nargs="?", default="combined_gandhi_quotes.txt")
+    args = parser.parse_args()
+
+    sentences = load_corpus_sentences(args.corpus)
+    print(f"Corpus: {len(sentences)} sentences from {args.corpus}")
+
+    for name, quote_filter in (("pdf", PDF_FILTER), ("speech", SPEECH_FILTER)):
+        rate = benchmark(sentences, quote_filter)
+        print(f"\n{name} filter: {rate:,.0f} sentences/sec")
+
+        # Hit counts for a single pass over the corpus
+        quote_filter.reset()
+        for sentence in sentences:
+            quote_filter.classify(sentence)
+        for rule, count in quote_filter.hits.most_common():
+            if not rule.startswith('wisdom:'):
+                print(f"  {rule}: {count}")
+
+if __name__ == "__main__":
+    main()
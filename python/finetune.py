@@ -1,8 +1,15 @@
+import argparse
+import asyncio
 import os
 import time
 from openai import OpenAI
 from dotenv import load_dotenv
 
+import metrics
+from orchestrator import DEFAULT_STATE_PATH, JobSpec, Orchestrator, print_results
+from shards import shard_paths, verify_manifest
+from tokens import DEFAULT_EPOCHS, count_file, print_report
+
 load_dotenv()
 
 API_KEY = os.getenv("OPENAI_API_KEY")
@@ -50,11 +57,18 @@ def upload_training_file(client, file_path):
         print(f"\nerror: {e}")
         return None
 
-def create_fine_tune_job(client, file_id, model="gpt-4o-mini-2024-07-18", suffix="gandhi-vn"):
+def create_fine_tune_job(client, file_id, model="gpt-4o-mini-2024-07-18", suffix="gandhi-vn",
+                         n_epochs=DEFAULT_EPOCHS, validation_file_id=None):
     """Create a fine-tuning job"""
     print(f"\nCreating fine-tune job...")
     print(f"  Model: {model}")
     print(f"  Suffix: {suffix}")
+    print(f"  Epochs: {n_epochs}")
+    
+    options = {}
+    if validation_file_id:
+        print(f"  Validation file: {validation_file_id}")
+        options["validation_file"] = validation_file_id
     
     try:
         response = client.fine_tuning.jobs.create(
@@ -62,8 +76,9 @@ def create_fine_tune_job(client, file_id, model="gpt-4o-mini-2024-07-18", suffix
             model=model,
             suffix=suffix,
             hyperparameters={
-                "n_epochs": 3
-            }
+                "n_epochs": n_epochs
+            },
+            **options
         )
         
         job_id = response.id
@@ -119,44 +134,173 @@ def monitor_fine_tune(client, job_id):
         print(f"\nerror: {e}")
         return None
 
+def training_files_from_manifest(manifest_file):
+    """(train file, validation file or None) from a shards.py manifest"""
+    problems = verify_manifest(manifest_file)
+    if problems:
+        print(f"\nerror: shards don't match {manifest_file}:")
+        for problem in problems:
+            print(f"  - {problem}")
+        return None, None
+    
+    train = shard_paths(manifest_file, 'train')
+    valid = shard_paths(manifest_file, 'valid')
+    # A fine-tuning job takes exactly one training file and one validation file
+    if len(train) != 1 or len(valid) > 1:
+        print(f"\nerror: {manifest_file} has {len(train)} train and {len(valid)} validation shards,")
+        print(f"a job needs one of each. Regenerate with a larger --shard-mb.")
+        return None, None
+    return train[0], valid[0] if valid else None
+
+def check_tokens(paths, model):
+    """Print the token report for each file; False if any is missing or oversized"""
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"\nerror: File '{path}' not found!")
+            print(f"Make sure you've run the scraper first.")
+            return False
+        report = count_file(path, model, DEFAULT_EPOCHS)
+        print_report(report, model)
+        if report.oversized:
+            print(f"\nFix oversized examples first: python tokens.py {path} --fix trim")
+            return False
+    return True
+
+def run_blocking(training_file, validation_file, model):
+    """Upload, create and monitor one job, one step at a time"""
+    # Initialize client
+    client = OpenAI(api_key=API_KEY)
+    
+    # Step 1: Upload
+    with metrics.stage("upload"):
+        file_id = upload_training_file(client, training_file)
+    if not file_id:
+        print("\nFailed to upload file. Exiting.")
+        return None
+    metrics.count('files_uploaded')
+    metrics.count('bytes_uploaded', os.path.getsize(training_file))
+    validation_file_id = None
+    if validation_file:
+        with metrics.stage("upload"):
+            validation_file_id = upload_training_file(client, validation_file)
+        if not validation_file_id:
+            print("\nFailed to upload validation file. Exiting.")
+            return None
+        metrics.count('files_uploaded')
+        metrics.count('bytes_uploaded', os.path.getsize(validation_file))
+    
+    # Step 2: Create fine-tune job
+    with metrics.stage("create_job"):
+        job_id = create_fine_tune_job(
+            client,
+            file_id, 
+            model=model,
+            suffix="gandhi-vn",
+            n_epochs=DEFAULT_EPOCHS,
+            validation_file_id=validation_file_id
+        )
+    
+    if not job_id:
+        print("\nFailed to create fine-tune job. Exiting.")
+        return None
+    metrics.count('jobs')
+    
+    # Step 3: Monitor
+    with metrics.stage("monitor"):
+        return monitor_fine_tune(client, job_id)
+
+def make_client(dry_run=False):
+    """AsyncOpenAI client, or the offline fake for --dry-run"""
+    if dry_run:
+        from fake_openai import FakeAsyncOpenAI
+        return FakeAsyncOpenAI()
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=API_KEY)
+
+def run_orchestrated(specs, state_path, dry_run=False, max_jobs=None):
+    """Run every spec concurrently; returns the first spec's model if it succeeded"""
+    if dry_run and os.path.exists(state_path):
+        # Fake jobs only exist inside one process, so never resume them
+        os.remove(state_path)
+    orchestrator = Orchestrator(make_client(dry_run), state_path, max_jobs=max_jobs,
+                                min_poll=0.01 if dry_run else 2.0)
+    try:
+        with metrics.stage("orchestrate"):
+            results = asyncio.run(orchestrator.run(specs))
+    except KeyboardInterrupt:
+        print(f"\n\nStopped. Jobs keep running; state saved to {state_path}")
+        print(f"Run the same command again to resume.")
+        return None
+    
+    print_results(results)
+    for record in results.values():
+        if record:
+            metrics.count(f"jobs_{record['status']}")
+            metrics.count('trained_tokens', record.get('trained_tokens') or 0)
+    first = results[specs[0].name]
+    if first and first['status'] == 'succeeded' and not dry_run:
+        return first['fine_tuned_model']
+    return None
+
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description="Upload training data and fine-tune")
+    parser.add_argument("--training-file", default="combined_gandhi_training.jsonl")
+    parser.add_argument("--manifest", help="use the train/validation shards from a shards.py manifest")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="upload and follow jobs concurrently, resumable from a state file")
+    parser.add_argument("--variant", action="append", default=[], metavar="NAME=PATH",
+                        help="extra training file to fine-tune alongside the main one (implies --async)")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="job state file for --async")
+    parser.add_argument("--max-jobs", type=int, default=None, help="max jobs running at once")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="run --async against an offline fake of the OpenAI API")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    
     print("="*50)
     print("GANDHI FINE-TUNING PIPELINE")
     print("="*50)
     
     # Check API key
-    if API_KEY == "sk-proj-YOUR-KEY-HERE":
+    if API_KEY == "sk-proj-YOUR-KEY-HERE" and not args.dry_run:
         print("\nerror: u need openai api key")
         return
     
-    # Initialize client
-    client = OpenAI(api_key=API_KEY)
-    
-    # Step 1: Upload
-    file_id = upload_training_file(client, "combined_gandhi_training.jsonl")
-    if not file_id:
-        print("\nFailed to upload file. Exiting.")
-        return
-    
-    # Step 2: Create fine-tune job
     # CHOOSE YOUR MODEL:
     # - gpt-4o-mini-2024-07-18 (RECOMMENDED: $3/M tokens training, good quality)
     # - gpt-3.5-turbo (CHEAPEST: $8/M tokens training, decent quality)
+    model = "gpt-4o-mini-2024-07-18"
+    training_file, validation_file = args.training_file, None
+    if args.manifest:
+        training_file, validation_file = training_files_from_manifest(args.manifest)
+        if not training_file:
+            return
     
-    job_id = create_fine_tune_job(
-        client,
-        file_id, 
-        model="gpt-4o-mini-2024-07-18",
-        suffix="gandhi-vn"
-    )
+    specs = [JobSpec("main", training_file, validation_file, model)]
+    for variant in args.variant:
+        name, _, path = variant.partition("=")
+        if not path:
+            parser.error(f"--variant expects NAME=PATH, got {variant!r}")
+        specs.append(JobSpec(name, path, validation_file, model))
     
-    if not job_id:
-        print("\nFailed to create fine-tune job. Exiting.")
+    metrics.start_run("finetune", args)
+    
+    # Step 0: Count tokens and cost before uploading anything
+    paths = [spec.training_file for spec in specs] + ([validation_file] if validation_file else [])
+    with metrics.stage("check_tokens"):
+        tokens_ok = check_tokens(paths, model)
+    if not tokens_ok:
+        metrics.finish()
         return
     
-    # Step 3: Monitor
-    model_id = monitor_fine_tune(client, job_id)
+    if args.use_async or args.variant or args.dry_run:
+        state_path = args.state
+        if args.dry_run:
+            state_path = os.path.splitext(args.state)[0] + ".dry_run.json"
+        model_id = run_orchestrated(specs, state_path, args.dry_run, args.max_jobs)
+    else:
+        model_id = run_blocking(training_file, validation_file, model)
     
     if model_id:
         print(f"\n{'='*50}")
@@ -185,6 +329,8 @@ print(response.choices[0].message.content)
         with open("gandhi_model_id.txt", "w") as f:
             f.write(model_id)
         print(f"\n✓ Model ID saved to: gandhi_model_id.txt")
+    
+    metrics.finish()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
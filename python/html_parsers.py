@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Pluggable HTML parser backends for scrape_speech
+All backends return the same title, content and links as the original
+BeautifulSoup html.parser code:
+
+- 'html.parser': BeautifulSoup with the pure-Python parser (reference)
+- 'lxml': lxml.html directly, no BeautifulSoup tree (used when installed)
+- 'stream': SAX-style extractor on the stdlib HTMLParser that only keeps
+  text under the first table, the title and links, without building a tree
+"""
+
+import argparse
+import glob
+import os
+import re
+import time
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Text inside these tags is not page content (BeautifulSoup skips it too)
+SKIP_TAGS = {'script', 'style', 'template'}
+
+class ParsedPage(NamedTuple):
+    title: Optional[str]
+    content: str
+    links: List[str]
+
+def _decode(html: bytes) -> str:
+    """Decode a page using its declared charset, falling back to UTF-8/cp1252"""
+    if isinstance(html, str):
+        return html
+    match = re.search(rb'charset=["\']?([\w-]+)', html[:2048], re.IGNORECASE)
+    if match:
+        try:
+            return html.decode(match.group(1).decode('ascii'))
+        except (LookupError, UnicodeDecodeError):
+            pass
+    try:
+        return html.decode('utf-8')
+    except UnicodeDecodeError:
+        return html.decode('cp1252', errors='replace')
+
+def parse_bs4(html: bytes, features: str = 'html.parser') -> ParsedPage:
+    """Reference implementation: full BeautifulSoup tree"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, features)
+
+    content_table = soup.find('table')
+    if content_table:
+        text = content_table.get_text(separator=' ', strip=True)
+    else:
+        paragraphs = soup.find_all('p')
+        text = ' '.join([p.get_text(strip=True) for p in paragraphs])
+
+    title_tag = soup.find('title')
+    title = title_tag.get_text() if title_tag else None
+    links = [a['href'] for a in soup.find_all('a', href=True)]
+    return ParsedPage(title, text, links)
+
+def _lxml_strings(element) -> List[str]:
+    """Stripped, non-empty text under an element, skipping comments/scripts"""
+    strings = []
+
+    def walk(node):
+        if isinstance(node.tag, str) and node.tag not in SKIP_TAGS and node.text:
+            strings.append(node.text)
+        if isinstance(node.tag, str) and node.tag not in SKIP_TAGS:
+            for child in node:
+                walk(child)
+                if child.tail:
+                    strings.append(child.tail)
+
+    walk(element)
+    return [s.strip() for s in strings if s.strip()]
+
+def parse_lxml(html: bytes) -> ParsedPage:
+    """lxml.html backend; C parser with no BeautifulSoup layer"""
+    if lxml is None:
+        raise RuntimeError("lxml is not installed: pip install lxml")
+
+    if not html.strip():
+        return ParsedPage(None, '', [])
+    document = lxml.html.document_fromstring(html)
+
+    content_table = document.find('.//table')
+    if content_table is not None:
+        text = ' '.join(_lxml_strings(content_table))
+    else:
+        text = ' '.join(''.join(_lxml_strings(p)) for p in document.iter('p'))
+
+    title_tag = document.find('.//title')
+    title = title_tag.text_content() if title_tag is not None else None
+    links = [a.get('href') for a in document.iter('a') if a.get('href') is not None]
+    return ParsedPage(title, text, links)
+
+class _StreamExtractor(HTMLParser):
+    """Collects text under the first table, the title and links in one pass"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.table_depth = 0
+        self.table_done = False
+        self.skip_depth = 0
+        self.in_title = False
+        self.title_parts: Optional[List[str]] = None
+        self.table_strings: List[str] = []
+        self.paragraphs: List[List[str]] = []
+        self.paragraph_depth = 0
+        self.links: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == 'table' and not self.table_done:
+            self.table_depth += 1
+        elif tag == 'title' and self.title_parts is None:
+            self.in_title = True
+            self.title_parts = []
+        elif tag == 'p' and not self.table_done and not self.table_depth:
+            # Paragraph text is only needed when the page has no table
+            self.paragraph_depth += 1
+            self.paragraphs.append([])
+        elif tag == 'a':
+            for name, value in attrs:
+                if name == 'href':
+                    self.links.append(value if value is not None else '')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == 'table' and self.table_depth:
+            self.table_depth -= 1
+            if not self.table_depth:
+                self.table_done = True
+        elif tag == 'title':
+            self.in_title = False
+        elif tag == 'p' and self.paragraph_depth:
+            self.paragraph_depth -= 1
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title_parts.append(data)
+        if self.skip_depth:
+            return
+        if self.table_depth:
+            stripped = data.strip()
+            if stripped:
+                self.table_strings.append(stripped)
+        elif self.paragraph_depth and not self.table_done:
+            stripped = data.strip()
+            if stripped:
+                self.paragraphs[-1].append(stripped)
+
+def parse_stream(html: bytes) -> ParsedPage:
+    """Streaming backend; never builds a document tree"""
+    extractor = _StreamExtractor()
+    extractor.feed(_decode(html))
+    extractor.close()
+
+    if extractor.table_done or extractor.table_depth:
+        text = ' '.join(extractor.table_strings)
+    else:
+        text = ' '.join(''.join(parts) for parts in extractor.paragraphs)
+
+    title = ''.join(extractor.title_parts) if extractor.title_parts is not None else None
+    return ParsedPage(title, text, extractor.links)
+
+BACKENDS: Dict[str, Callable[[bytes], ParsedPage]] = {
+    'html.parser': parse_bs4,
+    'lxml': parse_lxml,
+    'stream': parse_stream,
+}
+
+# 'auto' picks lxml when it is installed
+default_backend = 'auto'
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    name = name or default_backend
+    if name == 'auto':
+        return 'lxml' if lxml is not None else 'html.parser'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend {name!r}, choose from {sorted(BACKENDS)} or 'auto'")
+    return name
+
+def parse_page(html: bytes, backend: Optional[str] = None) -> ParsedPage:
+    """Parse a page with the named backend (default_backend when None)"""
+    return BACKENDS[resolve_backend(backend)](html)
+
+def load_fixture_pages(fixture_dir: Optional[str] = None) -> Dict[str, bytes]:
+    """Saved pages from a directory of .html files, or from the HTTP cache"""
+    if fixture_dir:
+        pages = {}
+        for path in sorted(glob.glob(os.path.join(fixture_dir, '*.htm*'))):
+            with open(path, 'rb') as f:
+                pages[path] = f.read()
+        return pages
+
+    from http_cache import HttpCache
+
+    cache = HttpCache()
+    return {url: cache.get(url).body for url in cache.urls()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTML parser backends on saved pages")
+    parser.add_argument("fixtures", nargs="?", help="directory of saved .html pages (default: HTTP cache)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_fixture_pages(args.fixtures)
+    if not pages:
+        print("No saved pages found; run scrape.py once or pass a fixture directory.")
+        return
+    total_bytes = sum(len(body) for body in pages.values())
+    print(f"{len(pages)} pages, {total_bytes / 1024:.0f} KiB")
+
+    reference = {key: parse_bs4(body) for key, body in pages.items()}
+    for name, backend in BACKENDS.items():
+        if name == 'lxml' and lxml is None:
+            print(f"\n{name}: not installed")
+            continue
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            results = {key: backend(body) for key, body in pages.items()}
+        elapsed = (time.perf_counter() - start) / args.repeat
+
+        mismatches = [key for key, result in results.items() if result != reference[key]]
+        print(f"\n{name}: {elapsed * 1000:.1f} ms per pass, "
+              f"{total_bytes / elapsed / 1024 / 1024:.1f} MiB/s")
+        print(f"  matches html.parser on {len(pages) - len(mismatches)}/{len(pages)} pages")
+        for key in mismatches[:5]:
+            print(f"  mismatch: {key}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Local conditional-GET cache for scraped pages
+Keeps each page's body, ETag and Last-Modified headers and the parsed
+speech in a SQLite file, so unchanged pages are answered with a 304 and
+offline runs can replay the cache without touching the network
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, NamedTuple, Optional
+
+DEFAULT_HTTP_CACHE_PATH = os.path.join(".cache", "http.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    parsed TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+def _header(headers: Dict[str, str], name: str) -> Optional[str]:
+    """Case-insensitive header lookup that works for plain dicts too"""
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+class CachedResponse(NamedTuple):
+    url: str
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    parsed: Optional[Dict]
+    fetched_at: float
+
+class HttpCache:
+    """SQLite-backed store of page bodies, validators and parsed results"""
+
+    def __init__(self, path: str = DEFAULT_HTTP_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        row = self.conn.execute(
+            "SELECT url, body, etag, last_modified, parsed, fetched_at FROM responses WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        parsed = json.loads(row[4]) if row[4] else None
+        return CachedResponse(row[0], row[1], row[2], row[3], parsed, row[5])
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Headers that let the server answer 304 Not Modified"""
+        entry = self.get(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, url: str, body: bytes, headers: Dict[str, str], parsed: Optional[Dict] = None):
+        """Save a 200 response along with its validators and parsed form"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    body,
+                    _header(headers, 'ETag'),
+                    _header(headers, 'Last-Modified'),
+                    json.dumps(parsed, ensure_ascii=False) if parsed is not None else None,
+                    time.time(),
+                ),
+            )
+
+    def touch(self, url: str):
+        """Record that a 304 confirmed the cached copy is still current"""
+        with self.conn:
+            self.conn.execute("UPDATE responses SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def urls(self):
+        return [row[0] for row in self.conn.execute("SELECT url FROM responses ORDER BY url")]
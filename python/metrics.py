@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Stage timers, counters and memory figures for the pipeline scripts
+A script starts a run from its parsed arguments, wraps its steps in
+stage() blocks and counts things along the way; finish() prints a stage
+table and writes everything as JSON. Library code calls count() and
+stage() at module level without being handed anything: with no run
+started they do nothing, so extract/scrape functions behave the same
+when imported by pipeline.py or a notebook.
+
+    python extract.py --metrics run.json --trace-memory
+    python scrape.py --profile cprofile --profile-stage merge
+    python metrics.py .cache/metrics/extract.json   # print a saved report
+
+Per stage the report has wall time, calls, the process's peak RSS so far
+and, with --trace-memory, the tracemalloc peak inside the stage and its
+top allocation sites. --profile writes one cProfile (.prof) or
+pyinstrument (.html) file per stage under .cache/profiles.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+DEFAULT_METRICS_DIR = os.path.join(".cache", "metrics")
+DEFAULT_PROFILE_DIR = os.path.join(".cache", "profiles")
+PROFILERS = ('cprofile', 'pyinstrument')
+TOP_ALLOCATIONS = 5
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Peak resident set size of this process (or its finished children) in MB"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(usage.ru_maxrss / scale, 1)
+
+class Metrics:
+    """One run's stages and counters"""
+
+    def __init__(self, name: str, report_path: Optional[str] = None, profiler: Optional[str] = None,
+                 profile_stages: Iterable[str] = (), trace_memory: bool = False,
+                 profile_dir: str = DEFAULT_PROFILE_DIR):
+        self.name = name
+        self.report_path = report_path or os.path.join(DEFAULT_METRICS_DIR, f"{name}.json")
+        self.profiler = profiler
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.counters: Counter = Counter()
+        self.stages: Dict[str, Dict] = {}
+        self.stack: List[str] = []
+        # tracemalloc has one peak, so each open stage's peak so far is kept here
+        self.peaks: List[int] = []
+        self.profiling = False
+        self.started_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+        if profiler == 'pyinstrument' and PyinstrumentProfiler is None:
+            print("warning: pyinstrument is not installed (pip install pyinstrument), profiling with cProfile")
+            self.profiler = 'cprofile'
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def add_counts(self, counts: Mapping[str, int], prefix: str = ''):
+        for name, n in counts.items():
+            self.counters[prefix + name] += n
+
+    def _profiled(self, path: str) -> bool:
+        # Profilers can't nest (cProfile refuses to on 3.12+), so an inner
+        # stage shows up inside its parent's profile instead
+        if self.profiler is None or self.profiling:
+            return False
+        return not self.profile_stages or path in self.profile_stages or path.split('/')[-1] in self.profile_stages
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Time a block; nested stages are recorded as parent/child"""
+        self.stack.append(name)
+        path = '/'.join(self.stack)
+        record = self.stages.setdefault(path, {'seconds': 0.0, 'calls': 0})
+        profiler = self._start_profiler() if self._profiled(path) else None
+        snapshot = None
+        if self.trace_memory:
+            if self.peaks:
+                # Fold the parent's peak in before the inner stage resets it
+                self.peaks[-1] = max(self.peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.peaks.append(0)
+            snapshot = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record['seconds'] += time.perf_counter() - start
+            record['calls'] += 1
+            record['peak_rss_mb'] = peak_rss_mb()
+            if snapshot is not None:
+                peak = max(tracemalloc.get_traced_memory()[1], self.peaks.pop())
+                if self.peaks:
+                    self.peaks[-1] = max(self.peaks[-1], peak)
+                record['traced_peak_mb'] = max(record.get('traced_peak_mb', 0.0), round(peak / 2**20, 2))
+                record['top_allocations'] = [
+                    {'where': str(stat.traceback[0]), 'size_kb': round(stat.size_diff / 1024, 1),
+                     'count': stat.count_diff}
+                    for stat in tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')[:TOP_ALLOCATIONS]
+                ]
+            if profiler is not None:
+                record['profile'] = self._stop_profiler(profiler, path)
+            self.stack.pop()
+
+    def _start_profiler(self):
+        self.profiling = True
+        if self.profiler == 'pyinstrument':
+            profiler = PyinstrumentProfiler()
+            profiler.start()
+            return profiler
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler, path: str) -> str:
+        self.profiling = False
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, f"{self.name}.{path.replace('/', '.')}")
+        if self.profiler == 'pyinstrument':
+            profiler.stop()
+            with open(base + ".html", 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+            return base + ".html"
+        profiler.disable()
+        profiler.dump_stats(base + ".prof")
+        return base + ".prof"
+
+    def report(self) -> Dict:
+        return {
+            'run': self.name,
+            'argv': sys.argv[1:],
+            'started_at': self.started_at,
+            'python': platform.python_version(),
+            'platform': sys.platform,
+            'seconds': round(time.perf_counter() - self.start, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'children_peak_rss_mb': peak_rss_mb(children=True),
+            'stages': {name: dict(record, seconds=round(record['seconds'], 4))
+                       for name, record in self.stages.items()},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def write(self) -> Dict:
+        report = self.report()
+        os.makedirs(os.path.dirname(self.report_path) or '.', exist_ok=True)
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+def print_report(report: Dict):
+    print(f"\n{'='*60}")
+    print(f"METRICS: {report['run']} in {report['seconds']:.2f}s, peak RSS {report['peak_rss_mb']} MB")
+    print(f"{'='*60}")
+    print(f"{'stage':<28} {'seconds':>9} {'calls':>6} {'rss MB':>8} {'traced MB':>10}")
+    for name, record in report['stages'].items():
+        traced = record.get('traced_peak_mb')
+        print(f"{name:<28} {record['seconds']:>9.3f} {record['calls']:>6} "
+              f"{record['peak_rss_mb'] if record['peak_rss_mb'] is not None else '-':>8} "
+              f"{traced if traced is not None else '-':>10}")
+    if report['counters']:
+        print()
+        for name, value in report['counters'].items():
+            print(f"  {name}: {value}")
+
+# The run of the current script, if any
+_run: Optional[Metrics] = None
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """The --metrics/--profile/--trace-memory flags every pipeline script takes"""
+    parser.add_argument("--metrics", metavar="PATH", default=None,
+                        help=f"metrics report path (default: {DEFAULT_METRICS_DIR}/<script>.json)")
+    parser.add_argument("--profile", choices=PROFILERS, default=None, help="profile each stage")
+    parser.add_argument("--profile-stage", action="append", default=[], metavar="STAGE",
+                        help="only profile this stage (repeatable)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record tracemalloc peaks and top allocations per stage (slower)")
+
+def start_run(name: str, args: Optional[argparse.Namespace] = None) -> Metrics:
+    global _run
+    _run = Metrics(
+        name,
+        report_path=getattr(args, 'metrics', None),
+        profiler=getattr(args, 'profile', None),
+        profile_stages=getattr(args, 'profile_stage', ()),
+        trace_memory=getattr(args, 'trace_memory', False),
+    )
+    return _run
+
+def finish(quiet: bool = False) -> Optional[Dict]:
+    """Write the current run's report and end the run"""
+    global _run
+    if _run is None:
+        return None
+    report = _run.write()
+    if not quiet:
+        print_report(report)
+        print(f"\n✓ Metrics written to {_run.report_path}")
+    _run = None
+    return report
+
+def stage(name: str):
+    return _run.stage(name) if _run is not None else contextlib.nullcontext()
+
+def count(name: str, n: int = 1):
+    if _run is not None:
+        _run.count(name, n)
+
+def add_counts(counts: Mapping[str, int], prefix: str = ''):
+    if _run is not None:
+        _run.add_counts(counts, prefix)
+
+def counted(name: str, items: Iterable) -> Iterator:
+    """Pass items through, counting each one"""
+    for item in items:
+        count(name)
+        yield item
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a saved metrics report")
+    parser.add_argument("report", help="JSON report written by one of the pipeline scripts")
+    args = parser.parse_args()
+    with open(args.report, 'r', encoding='utf-8') as f:
+        print_report(json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate quote detection with MinHash and locality-sensitive hashing
+Catches the same sentence with different punctuation or OCR noise, which
+the exact lowercase match in remove_duplicates misses. Runs in roughly
+linear time: every quote is hashed once and only compared with the first
+quote that shares one of its LSH buckets.
+"""
+
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+SHINGLE_BASE = np.uint64(1000003)
+
+def normalize_for_hashing(text: str) -> str:
+    """Lowercase and drop punctuation so only the words are compared"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+def shingle_hashes(texts: List[str], shingle_size: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash every character k-gram of every text in one vectorized pass
+
+    Returns (hashes, starts): the 32-bit shingle hashes of all texts laid
+    end to end, and the index where each text's shingles begin.
+    """
+    encoded = [normalize_for_hashing(t).encode('utf-8').ljust(shingle_size) for t in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+
+    # Polynomial rolling hash of each k-gram, computed for every offset at once
+    window_count = len(data) - shingle_size + 1
+    hashes = np.zeros(window_count, dtype=np.uint64)
+    for j in range(shingle_size):
+        hashes = hashes * SHINGLE_BASE + data[j:j + window_count]
+    hashes &= np.uint64(0xFFFFFFFF)
+
+    # Keep only k-grams that lie entirely inside one text
+    text_ends = np.cumsum(lengths)
+    text_of = np.repeat(np.arange(len(texts)), lengths)[:window_count]
+    valid = np.arange(window_count) + shingle_size <= text_ends[text_of]
+    hashes = hashes[valid]
+    counts = lengths - shingle_size + 1
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return hashes, starts
+
+def minhash_signatures(texts: List[str], num_perm: int = 64, shingle_size: int = 5,
+                       seed: int = 1) -> np.ndarray:
+    """Return an (len(texts), num_perm) MinHash signature matrix"""
+    if not texts:
+        return np.zeros((0, num_perm), dtype=np.uint32)
+
+    hashes, starts = shingle_hashes(texts, shingle_size)
+    rng = np.random.default_rng(seed)
+    # Multiply-shift hashing: (a*h + b) >> 32 with odd a, which avoids a
+    # slow 64-bit modulo per shingle
+    a = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    shift = np.uint64(32)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    # One permutation at a time keeps memory at a single row of shingles
+    for i in range(num_perm):
+        permuted = (a[i] * hashes + b[i]) >> shift
+        signatures[:, i] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH S-curve crosses 50% closest to threshold"""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        crossover = (1 / bands) ** (1 / rows)
+        error = abs(crossover - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+def near_duplicate_groups(texts: List[str], threshold: float = 0.8, num_perm: int = 64,
+                          shingle_size: int = 5, seed: int = 1) -> np.ndarray:
+    """Label each text with the index of the earliest text it duplicates
+
+    A text that duplicates nothing is labelled with its own index.
+    """
+    signatures = minhash_signatures(texts, num_perm, shingle_size, seed)
+    bands, rows = choose_bands(num_perm, threshold)
+    parent = np.arange(len(texts))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    mixer = np.random.default_rng(seed + 1).integers(1, 2**63, size=rows, dtype=np.uint64)
+    for band in range(bands):
+        block = signatures[:, band * rows:(band + 1) * rows]
+        keys = (block.astype(np.uint64) * mixer).sum(axis=1)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        representative = first[inverse.ravel()]
+
+        # Compare each text only with the first text in its bucket
+        candidates = np.nonzero(representative != np.arange(len(texts)))[0]
+        if not len(candidates):
+            continue
+        agreement = (signatures[candidates] == signatures[representative[candidates]]).mean(axis=1)
+        for i in candidates[agreement >= threshold]:
+            root_i, root_j = find(i), find(representative[i])
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    return np.array([find(i) for i in range(len(texts))])
+
+def remove_near_duplicates(quotes: List[str], threshold: float = 0.8, num_perm: int = 64,
+                           shingle_size: int = 5, seed: int = 1) -> List[str]:
+    """Keep the first quote of every near-duplicate group, preserving order"""
+    if not quotes:
+        return []
+    groups = near_duplicate_groups(quotes, threshold, num_perm, shingle_size, seed)
+    return [quote for i, quote in enumerate(quotes) if groups[i] == i]
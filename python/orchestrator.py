@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Resumable, concurrent fine-tuning orchestration
+Uploads several training files at once, starts one job per JobSpec and
+follows them all from a single event loop. Polling backs off while a job
+is quiet and resets as soon as new events arrive. Every upload and job is
+recorded in a state file as it happens, so after a Ctrl-C or crash the
+next run picks up the same jobs instead of uploading and training again.
+Jobs are keyed by their spec and the sha256 of their files, so a changed
+training file or hyperparameter starts a new job rather than returning the
+old result, and a failed or cancelled job is retried on the next run.
+An exception in one job (say a rejected upload) is recorded against that
+job and doesn't stop the others.
+
+The client is injected: openai.AsyncOpenAI in production, or
+fake_openai.FakeAsyncOpenAI for offline runs.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+from page_cache import file_hash
+from tokens import DEFAULT_EPOCHS, DEFAULT_MODEL
+
+DEFAULT_STATE_PATH = os.path.join(".cache", "finetune_state.json")
+
+TERMINAL_STATUSES = {'succeeded', 'failed', 'cancelled'}
+# Terminal statuses that a later run starts again instead of reusing
+RETRY_STATUSES = {'failed', 'cancelled'}
+# Status of a spec whose upload or job creation raised; it has no job_id,
+# so the next run starts it again
+ERROR_STATUS = 'error'
+
+class JobSpec(NamedTuple):
+    name: str
+    training_file: str
+    validation_file: Optional[str] = None
+    model: str = DEFAULT_MODEL
+    n_epochs: int = DEFAULT_EPOCHS
+    learning_rate_multiplier: Optional[float] = None
+    suffix: str = "gandhi-vn"
+
+    def hyperparameters(self) -> Dict:
+        params = {"n_epochs": self.n_epochs}
+        if self.learning_rate_multiplier is not None:
+            params["learning_rate_multiplier"] = self.learning_rate_multiplier
+        return params
+
+class Backoff:
+    """Poll delay that grows while nothing changes and resets on activity"""
+
+    def __init__(self, minimum: float = 2.0, maximum: float = 60.0, factor: float = 1.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.delay = minimum
+
+    def next(self, active: bool) -> float:
+        self.delay = self.minimum if active else min(self.maximum, self.delay * self.factor)
+        return self.delay
+
+def job_key(spec: JobSpec) -> str:
+    """State key of a spec: its name plus a hash of every input, file contents included"""
+    inputs = dict(spec._asdict(),
+                  training_digest=file_hash(spec.training_file),
+                  validation_digest=file_hash(spec.validation_file) if spec.validation_file else None)
+    digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+    return f"{spec.name}:{digest[:16]}"
+
+def load_state(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {'uploads': {}, 'jobs': {}, 'archived': []}
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    state.setdefault('archived', [])
+    return state
+
+def save_state(path: str, state: Dict):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+class Orchestrator:
+    """Upload files and run fine-tuning jobs concurrently, resumably"""
+
+    def __init__(self, client, state_path: str = DEFAULT_STATE_PATH, max_uploads: int = 4,
+                 max_jobs: Optional[int] = None, min_poll: float = 2.0, max_poll: float = 60.0):
+        self.client = client
+        self.state_path = state_path
+        self.state = load_state(state_path)
+        self.upload_slots = asyncio.Semaphore(max_uploads)
+        # OpenAI limits how many jobs can be active at once per organization
+        self.job_slots = asyncio.Semaphore(max_jobs) if max_jobs else None
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.upload_locks: Dict[str, asyncio.Lock] = {}
+        self.keys: Dict[str, str] = {}
+
+    def key(self, spec: JobSpec) -> str:
+        # Hashed once per run, so a file edited mid-run doesn't orphan its job
+        if spec.name not in self.keys:
+            self.keys[spec.name] = job_key(spec)
+        return self.keys[spec.name]
+
+    def records(self, specs: List[JobSpec]) -> Dict[str, Optional[Dict]]:
+        """Current record per spec name, e.g. after an interrupted run"""
+        return {spec.name: self.state['jobs'].get(self.key(spec)) for spec in specs}
+
+    def save(self):
+        save_state(self.state_path, self.state)
+
+    async def upload(self, path: str) -> Optional[str]:
+        """Upload a file once per content hash and wait until it is processed"""
+        digest = file_hash(path)
+        # Two jobs sharing a validation file must not upload it twice
+        async with self.upload_locks.setdefault(digest, asyncio.Lock()):
+            record = self.state['uploads'].get(digest)
+            if record is None:
+                async with self.upload_slots:
+                    print(f"Uploading {path}...")
+                    with open(path, 'rb') as f:
+                        response = await self.client.files.create(file=f, purpose='fine-tune')
+                record = {'path': path, 'file_id': response.id, 'status': response.status}
+                self.state['uploads'][digest] = record
+                self.save()
+                print(f"✓ {path} uploaded as {response.id}")
+
+            backoff = Backoff(self.min_poll, self.max_poll)
+            while record['status'] not in ('processed', 'error'):
+                await asyncio.sleep(backoff.next(False))
+                file_info = await self.client.files.retrieve(record['file_id'])
+                if file_info.status != record['status']:
+                    record['status'] = file_info.status
+                    self.save()
+
+            if record['status'] == 'error':
+                print(f"✗ Error processing {path} ({record['file_id']})")
+                # Forget it so the next run uploads the file again
+                del self.state['uploads'][digest]
+                self.save()
+                return None
+            return record['file_id']
+
+    async def start_job(self, spec: JobSpec) -> Optional[Dict]:
+        """Create the job for a spec unless the state file already has a usable one"""
+        key = self.key(spec)
+        record = self.state['jobs'].get(key)
+        if record is not None and record.get('job_id'):
+            if record['status'] not in RETRY_STATUSES:
+                return record
+            print(f"  {spec.name}: previous job {record['job_id']} {record['status']}, retrying")
+            self.state['archived'].append(dict(record, key=key))
+            del self.state['jobs'][key]
+            self.save()
+
+        files = [self.upload(spec.training_file)]
+        if spec.validation_file:
+            files.append(self.upload(spec.validation_file))
+        file_ids = await asyncio.gather(*files)
+        if not all(file_ids):
+            return None
+
+        options = {}
+        if spec.validation_file:
+            options['validation_file'] = file_ids[1]
+        job = await self.client.fine_tuning.jobs.create(
+            training_file=file_ids[0],
+            model=spec.model,
+            suffix=spec.suffix,
+            hyperparameters=spec.hyperparameters(),
+            **options
+        )
+        record = {
+            'spec': spec._asdict(),
+            'job_id': job.id,
+            'status': job.status,
+            'fine_tuned_model': None,
+            'last_event_id': None,
+            'metrics': {},
+            'trained_tokens': None,
+            'error': None,
+        }
+        self.state['jobs'][key] = record
+        self.save()
+        print(f"✓ {spec.name}: job {job.id} created ({spec.model}, {spec.hyperparameters()})")
+        return record
+
+    async def _new_events(self, record: Dict) -> List:
+        """Events since the last one recorded, oldest first"""
+        page = await self.client.fine_tuning.jobs.list_events(record['job_id'], limit=50)
+        events = []
+        for event in page.data:  # newest first
+            if event.id == record['last_event_id']:
+                break
+            events.append(event)
+        events.reverse()
+        return events
+
+    async def follow_job(self, spec: JobSpec) -> Dict:
+        """Poll one job until it finishes, recording status, events and metrics"""
+        name = spec.name
+        record = self.state['jobs'][self.key(spec)]
+        backoff = Backoff(self.min_poll, self.max_poll)
+        while record['status'] not in TERMINAL_STATUSES:
+            try:
+                job = await self.client.fine_tuning.jobs.retrieve(record['job_id'])
+                events = await self._new_events(record)
+            except Exception as e:
+                # Transient API errors just slow polling down
+                print(f"  {name}: poll failed ({e}), retrying")
+                await asyncio.sleep(backoff.next(False))
+                continue
+
+            for event in events:
+                if event.type == 'metrics' and event.data:
+                    # valid_loss is only reported on some steps, so keep the latest of each
+                    record['metrics'].update(dict(event.data))
+                else:
+                    print(f"  {name}: {event.message}")
+            if events:
+                record['last_event_id'] = events[-1].id
+
+            changed = job.status != record['status']
+            record['status'] = job.status
+            record['fine_tuned_model'] = job.fine_tuned_model
+            record['trained_tokens'] = getattr(job, 'trained_tokens', None)
+            if job.status == 'failed' and getattr(job, 'error', None) is not None:
+                record['error'] = getattr(job.error, 'message', None) or str(job.error)
+            if changed or events:
+                self.save()
+            if changed:
+                print(f"  {name}: {job.status}")
+            if job.status not in TERMINAL_STATUSES:
+                await asyncio.sleep(backoff.next(changed or bool(events)))
+        return record
+
+    async def _start_and_follow(self, spec: JobSpec) -> Optional[Dict]:
+        record = await self.start_job(spec)
+        return await self.follow_job(spec) if record else None
+
+    def record_error(self, spec: JobSpec, error: Exception) -> Dict:
+        """Record an exception against a spec's job, creating a record if it has none"""
+        message = f"{type(error).__name__}: {error}"
+        print(f"✗ {spec.name}: {message}")
+        key = self.key(spec)
+        record = self.state['jobs'].get(key)
+        if record is None:
+            record = {
+                'spec': spec._asdict(),
+                'job_id': None,
+                'status': ERROR_STATUS,
+                'fine_tuned_model': None,
+                'last_event_id': None,
+                'metrics': {},
+                'trained_tokens': None,
+                'error': None,
+            }
+            self.state['jobs'][key] = record
+        record['error'] = message
+        self.save()
+        return record
+
+    async def run_one(self, spec: JobSpec) -> Optional[Dict]:
+        record = self.state['jobs'].get(self.key(spec))
+        if record is not None and record['status'] == 'succeeded':
+            return record
+        try:
+            if self.job_slots is None:
+                return await self._start_and_follow(spec)
+            async with self.job_slots:
+                return await self._start_and_follow(spec)
+        except Exception as e:
+            return self.record_error(spec, e)
+
+    async def run(self, specs: List[JobSpec]) -> Dict[str, Optional[Dict]]:
+        """Run every spec concurrently; returns the final record per spec name"""
+        names = [spec.name for spec in specs]
+        if len(set(names)) != len(names):
+            raise ValueError("JobSpec names must be unique")
+        results = await asyncio.gather(*(self.run_one(spec) for spec in specs))
+        return dict(zip(names, results))
+
+def print_results(results: Dict[str, Optional[Dict]]):
+    print(f"\n{'='*50}")
+    print(f"FINE-TUNING JOBS")
+    print(f"{'='*50}")
+    for name, record in results.items():
+        if record is None:
+            print(f"{name}: not started (upload failed)")
+            continue
+        print(f"{name}: {record['status']} {record['fine_tuned_model'] or ''}".rstrip())
+        if record.get('error'):
+            print(f"  Error: {record['error']}")
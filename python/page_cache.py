@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Persistent per-page text cache for PDF extraction
+Stores the raw text of every page in a single SQLite file, keyed by the
+PDF's content hash, the page index and the extractor version
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Iterable, Iterator, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "pages.sqlite")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    pdf_hash TEXT NOT NULL,
+    version TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (pdf_hash, version)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    pdf_hash TEXT NOT NULL,
+    version TEXT NOT NULL,
+    page_index INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (pdf_hash, version, page_index)
+);
+"""
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PageCache:
+    """SQLite-backed store of extracted page text with LRU eviction
+
+    A document only counts as cached once all of its pages were written,
+    so an interrupted run never serves a partial PDF.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def has_document(self, pdf_hash: str, version: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM documents WHERE pdf_hash = ? AND version = ?",
+            (pdf_hash, version),
+        ).fetchone()
+        return row is not None
+
+    def iter_pages(self, pdf_hash: str, version: str) -> Iterator[str]:
+        """Yield cached page texts in page order"""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE documents SET last_used = ? WHERE pdf_hash = ? AND version = ?",
+                (time.time(), pdf_hash, version),
+            )
+        cursor = self.conn.execute(
+            "SELECT text FROM pages WHERE pdf_hash = ? AND version = ? ORDER BY page_index",
+            (pdf_hash, version),
+        )
+        for (text,) in cursor:
+            yield text
+
+    def store_pages(self, pdf_hash: str, version: str, pages: Iterable[str]) -> Iterator[str]:
+        """Pass pages through while writing them to the cache
+
+        The document is committed once the iterator is exhausted.
+        """
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM pages WHERE pdf_hash = ? AND version = ?", (pdf_hash, version)
+            )
+
+        page_count = 0
+        size = 0
+        for page_index, text in enumerate(pages):
+            self.conn.execute(
+                "INSERT INTO pages (pdf_hash, version, page_index, text) VALUES (?, ?, ?, ?)",
+                (pdf_hash, version, page_index, text),
+            )
+            page_count += 1
+            size += len(text.encode('utf-8'))
+            yield text
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (pdf_hash, version, page_count, size, time.time()),
+            )
+        self.evict()
+
+    def total_size(self) -> int:
+        row = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()
+        return row[0]
+
+    def evict(self, max_bytes: Optional[int] = None):
+        """Drop least recently used documents until the cache fits in max_bytes"""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        total = self.total_size()
+        if total <= limit:
+            return
+
+        rows = self.conn.execute(
+            "SELECT pdf_hash, version, size FROM documents ORDER BY last_used"
+        ).fetchall()
+        with self.conn:
+            for pdf_hash, version, size in rows:
+                if total <= limit:
+                    break
+                self.conn.execute(
+                    "DELETE FROM pages WHERE pdf_hash = ? AND version = ?", (pdf_hash, version)
+                )
+                self.conn.execute(
+                    "DELETE FROM documents WHERE pdf_hash = ? AND version = ?", (pdf_hash, version)
+                )
+                total -= size
+        self.conn.execute("VACUUM")
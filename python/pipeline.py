@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Incremental pipeline driver
+Runs extract -> scrape -> training JSONL -> validate and records content
+hashes for every stage's inputs and outputs in a state file. Only sources
+whose inputs changed are reprocessed, and the training JSONL is patched
+block by block (one block per PDF page or speech URL) instead of being
+rebuilt from scratch. Quotes go through the same duplicate, near-duplicate
+and quality-score steps as in scrape.py, so both write the same selection.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from extract import clean_text, iter_letters, iter_pdf_pages, iter_quotes, letter_strategy
+from filters import PDF_FILTER, SPEECH_FILTER
+from http_cache import DEFAULT_HTTP_CACHE_PATH, HttpCache
+from page_cache import PageCache, file_hash
+from near_dedup import near_duplicate_groups
+from quote_store import DEFAULT_QUOTE_STORE_PATH, QuoteStore, normalize_quote, pdf_source, quote_hash
+from scoring import DEFAULT_MIN_SCORE, DEFAULT_SCORER, score_quotes
+from scrape import (SPEECH_URLS, SYSTEM_PROMPTS, USER_PROMPTS, extract_quotes_from_speech,
+                    make_training_examples, scrape_speech)
+
+DEFAULT_STATE_PATH = os.path.join(".cache", "pipeline_state.json")
+DEFAULT_OUTPUT_PATH = "combined_gandhi_training.jsonl"
+
+# Bump when sentence splitting or example generation changes in a way the
+# filter config below does not capture
+PIPELINE_VERSION = 1
+
+class Source(NamedTuple):
+    name: str  # pdf:<file>#page=N or a speech URL
+    input_hash: str
+    quotes: List[str]
+
+class Selection(NamedTuple):
+    """Which quotes make it into the output, as scrape.py's options choose"""
+    near_dup_threshold: float = 0.8  # 0 disables near-duplicate removal
+    scoring: bool = True
+    min_score: Optional[float] = DEFAULT_MIN_SCORE
+    top_n: Optional[int] = None
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def filter_config_hash(selection: Selection = Selection()) -> str:
+    """Hash of everything that decides which quotes and examples come out"""
+    config = {
+        'selection': selection._asdict(),
+        'score_weights': DEFAULT_SCORER.weights if selection.scoring else None,
+        'version': PIPELINE_VERSION,
+        'filters': [
+            [f.junk_regex.pattern, f.wisdom_regex.pattern,
+             f.salutation_regex.pattern if f.salutation_regex is not None else None,
+             f.min_length, f.max_length, f.keep_below, f.min_words, f.require_letters]
+            for f in (PDF_FILTER, SPEECH_FILTER)
+        ],
+        'prompts': [SYSTEM_PROMPTS, USER_PROMPTS],
+    }
+    return _hash(json.dumps(config, sort_keys=True))
+
+def load_state(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(path: str, state: Dict):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def collect_pdf_sources(pdf_path: str, state: Dict, config: str, cache: PageCache) -> List[Source]:
+    """One source per PDF page that starts a letter; reused when nothing changed
+
+    The page sources are kept under state['pdf'] rather than read back from
+    state['sources'], which only holds the sources of the last output and
+    loses the PDF's after a run without it.
+    """
+    pdf_hash = file_hash(pdf_path)
+    previous = state.get('pdf', {})
+    # States from before the quotes were kept here list only the page names
+    if (previous.get('hash') == pdf_hash and previous.get('config') == config
+            and isinstance(previous.get('sources'), dict)):
+        print(f"extract: {pdf_path} unchanged, reusing {len(previous['sources'])} page sources")
+        return [Source(name, record['input'], record['quotes'])
+                for name, record in previous['sources'].items()]
+
+    print(f"extract: {pdf_path} or filters changed, re-extracting")
+    pages = [clean_text(page) for page in iter_pdf_pages(pdf_path, cache=cache)]
+    by_page = defaultdict(list)
+    for page_index, quote in iter_quotes(iter_letters(pages, letter_strategy(pages))):
+        by_page[page_index].append(quote)
+
+    sources = [Source(pdf_source(pdf_path, i), _hash(pages[i]), by_page[i]) for i in sorted(by_page)]
+    state['pdf'] = {
+        'path': pdf_path,
+        'hash': pdf_hash,
+        'config': config,
+        'sources': {source.name: {'input': source.input_hash, 'quotes': source.quotes}
+                    for source in sources},
+    }
+    return sources
+
+def collect_speech_sources(urls: List[str], state: Dict, config: str, cache: HttpCache,
+                           offline: bool) -> List[Source]:
+    """One source per speech URL; quotes are only re-extracted when the page changed"""
+    sources = []
+    for url in urls:
+        speech_data = scrape_speech(url, cache, offline)
+        if not speech_data:
+            continue
+        content_hash = _hash(speech_data['content'])
+        previous = state.get('sources', {}).get(url)
+        if previous and previous['input'] == content_hash and previous['config'] == config:
+            quotes = previous['quotes']
+        else:
+            print(f"scrape: {url} changed, re-extracting quotes")
+            quotes = extract_quotes_from_speech(speech_data)
+        sources.append(Source(url, content_hash, quotes))
+    return sources
+
+def render_block(quotes: List[str]) -> bytes:
+    """JSONL lines for a block; prompts are seeded by the quote so reruns match"""
+    lines = []
+    for quote in quotes:
+        rng = random.Random(quote_hash(quote))
+        for example in make_training_examples(quote, rng):
+            lines.append(json.dumps(example, ensure_ascii=False) + '\n')
+    return ''.join(lines).encode('utf-8')
+
+def select_quotes(sources: Sequence[Source], selection: Selection = Selection()) -> List[List[str]]:
+    """Kept quotes per source after dropping duplicates (first source wins),
+    near-duplicates and low scorers, in that order, like scrape.py"""
+    seen = set()
+    candidates = []  # (source index, quote)
+    for i, source in enumerate(sources):
+        for quote in source.quotes:
+            normalized = normalize_quote(quote)
+            if normalized not in seen:
+                seen.add(normalized)
+                candidates.append((i, quote))
+
+    if selection.near_dup_threshold and candidates:
+        groups = near_duplicate_groups([quote for _, quote in candidates], selection.near_dup_threshold)
+        candidates = [candidate for j, candidate in enumerate(candidates) if groups[j] == j]
+    if selection.scoring and candidates:
+        scored = score_quotes([quote for _, quote in candidates], selection.min_score, selection.top_n)
+        candidates = [candidates[j] for j in scored.kept]
+
+    kept = [[] for _ in sources]
+    for i, quote in candidates:
+        kept[i].append(quote)
+    return kept
+
+def write_output(output_path: str, sources: List[Source], state: Dict, config: str,
+                 store: Optional[QuoteStore] = None, selection: Selection = Selection()) -> bool:
+    """Patch the training JSONL; returns True if its contents changed"""
+    previous_sources = state.get('sources', {})
+    previous_output = state.get('output', {})
+    # Blocks can only be copied out of a file we wrote and nobody edited since
+    old_intact = (os.path.exists(output_path)
+                  and previous_output.get('path') == output_path
+                  and previous_output.get('hash') == file_hash(output_path))
+
+    plan = []
+    for source, kept in zip(sources, select_quotes(sources, selection)):
+        previous = previous_sources.get(source.name)
+        reuse = old_intact and previous is not None and previous['kept'] == kept
+        plan.append((source, kept, previous if reuse else None))
+
+    unchanged_layout = [source.name for source in sources] == previous_output.get('order')
+    if old_intact and unchanged_layout and all(previous for _, _, previous in plan):
+        print(f"build: {output_path} is up to date")
+        state['sources'] = {source.name: {**previous_sources[source.name], 'input': source.input_hash}
+                            for source in sources}
+        return False
+
+    new_sources = {}
+    copied = regenerated = 0
+    tmp_path = output_path + ".tmp"
+    old_file = open(output_path, 'rb') if old_intact else None
+    try:
+        with open(tmp_path, 'wb') as out:
+            for source, kept, previous in plan:
+                if previous is not None:
+                    old_file.seek(previous['offset'])
+                    block = old_file.read(previous['length'])
+                    copied += 1
+                else:
+                    block = render_block(kept)
+                    regenerated += 1
+                    if store is not None:
+                        added_at = time.time()
+                        store.add_many((quote, source.name) for quote in kept)
+                        store.prune(source.name, added_at)
+                new_sources[source.name] = {
+                    'input': source.input_hash,
+                    'config': config,
+                    'quotes': source.quotes,
+                    'kept': kept,
+                    'offset': out.tell(),
+                    'length': len(block),
+                }
+                out.write(block)
+    finally:
+        if old_file is not None:
+            old_file.close()
+    os.replace(tmp_path, output_path)
+
+    state['sources'] = new_sources
+    state['output'] = {
+        'path': output_path,
+        'hash': file_hash(output_path),
+        'order': [source.name for source in sources],
+    }
+    print(f"build: {output_path} patched, {regenerated} blocks regenerated, {copied} copied")
+    return state['output']['hash'] != previous_output.get('hash')
+
+def run(pdf_path: Optional[str], urls: List[str], output_path: str = DEFAULT_OUTPUT_PATH,
+        state_path: str = DEFAULT_STATE_PATH, offline: bool = False, full: bool = False,
+        validate: bool = True, store: Optional[QuoteStore] = None, selection: Selection = Selection()):
+    """Run every stage, skipping work whose inputs are unchanged"""
+    state = {} if full else load_state(state_path)
+    config = filter_config_hash(selection)
+    state.setdefault('sources', {})
+
+    # Speeches first, then the PDF, matching scrape.py's merge order
+    sources = collect_speech_sources(urls, state, config, HttpCache(DEFAULT_HTTP_CACHE_PATH), offline)
+    if pdf_path:
+        sources += collect_pdf_sources(pdf_path, state, config, PageCache())
+
+    changed = write_output(output_path, sources, state, config, store, selection)
+
+    output_hash = state['output']['hash']
+    if validate and state.get('validated') != output_hash:
+        from validate import validate_jsonl
+
+        if validate_jsonl(output_path):
+            state['validated'] = output_hash
+    elif validate:
+        print("validate: output unchanged since last successful validation")
+
+    save_state(state_path, state)
+    if changed:
+        print(f"\n{output_path} changed; run finetune.py to train on it")
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally rebuild the Gandhi training data")
+    parser.add_argument("--pdf", default="gandhi-letters.pdf",
+                        help="letters PDF (pass '' to skip the PDF stage)")
+    parser.add_argument("--url", action="append", default=[],
+                        help="extra speech URL to include (repeatable)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH)
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH)
+    parser.add_argument("--offline", action="store_true", help="use cached speech pages only")
+    parser.add_argument("--full", action="store_true", help="ignore recorded state and rebuild everything")
+    parser.add_argument("--no-validate", action="store_true")
+    parser.add_argument("--store", default=DEFAULT_QUOTE_STORE_PATH)
+    parser.add_argument("--no-store", action="store_true")
+    parser.add_argument("--near-dup-threshold", type=float, default=0.8,
+                        help="MinHash similarity above which quotes count as duplicates (0 disables)")
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE,
+                        help="drop quotes whose quality score is below this")
+    parser.add_argument("--top-n", type=int, default=None, help="keep at most the N best scoring quotes")
+    parser.add_argument("--no-scoring", action="store_true", help="keep every quote the filters accept")
+    args = parser.parse_args()
+
+    urls = SPEECH_URLS + [url for url in args.url if url not in SPEECH_URLS]
+    store = None if args.no_store else QuoteStore(args.store)
+    run(args.pdf or None, urls, args.output, args.state, offline=args.offline, full=args.full,
+        validate=not args.no_validate, store=store,
+        selection=Selection(args.near_dup_threshold, not args.no_scoring, args.min_score, args.top_n))
+
+if __name__ == "__main__":
+    main()
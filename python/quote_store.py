@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Structured quote store shared by extract.py and scrape.py
+One SQLite table holding every quote with its normalized hash, source
+(PDF page or speech URL) and timestamps. Adding a quote is an indexed
+upsert on the hash, so merging never re-parses a text file.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_QUOTE_STORE_PATH = "gandhi_quotes.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hash TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quotes_source ON quotes (source);
+"""
+
+def normalize_quote(text: str) -> str:
+    """Same normalization remove_duplicates uses for exact matches"""
+    return text.lower().strip()
+
+def quote_hash(text: str) -> str:
+    return hashlib.sha1(normalize_quote(text).encode('utf-8')).hexdigest()
+
+def pdf_source(pdf_path: str, page_index: Optional[int] = None) -> str:
+    """Source label for a PDF quote; pages are numbered from 1"""
+    source = f"pdf:{os.path.basename(pdf_path)}"
+    if page_index is not None:
+        source += f"#page={page_index + 1}"
+    return source
+
+class QuoteStore:
+    """Append-only quote table with upsert-by-hash"""
+
+    def __init__(self, path: str = DEFAULT_QUOTE_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_many(self, records: Iterable[Tuple[str, str]]) -> int:
+        """Upsert (text, source) pairs; returns how many quotes were new"""
+        now = time.time()
+        before = self.count()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO quotes (hash, text, source, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (hash) DO UPDATE SET updated_at = excluded.updated_at
+                """,
+                ((quote_hash(text), text.strip(), source, now, now)
+                 for text, source in records if text.strip()),
+            )
+        return self.count() - before
+
+    def add(self, text: str, source: str) -> bool:
+        return self.add_many([(text, source)]) == 1
+
+    def count(self, source_prefix: Optional[str] = None) -> int:
+        if source_prefix is None:
+            return self.conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0]
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM quotes WHERE source >= ? AND source < ?",
+            (source_prefix, source_prefix + '\uffff'),
+        ).fetchone()[0]
+
+    def stats(self) -> Tuple[int, Optional[float]]:
+        """(quote count, latest updated_at); changes whenever the quotes do"""
+        return self.conn.execute("SELECT COUNT(*), MAX(updated_at) FROM quotes").fetchone()
+
+    def texts(self, source_prefix: Optional[str] = None) -> List[str]:
+        """Quote texts in insertion order, optionally only from some sources"""
+        if source_prefix is None:
+            rows = self.conn.execute("SELECT text FROM quotes ORDER BY id")
+        else:
+            # Range scan on the source index rather than LIKE
+            rows = self.conn.execute(
+                "SELECT text FROM quotes WHERE source >= ? AND source < ? ORDER BY id",
+                (source_prefix, source_prefix + '\uffff'),
+            )
+        return [row[0] for row in rows]
+
+    def records(self) -> List[Tuple[str, str, str, float]]:
+        """(text, hash, source, created_at) for every quote, in insertion order"""
+        return self.conn.execute(
+            "SELECT text, hash, source, created_at FROM quotes ORDER BY id"
+        ).fetchall()
+
+    def remove_source(self, source: str) -> int:
+        with self.conn:
+            return self.conn.execute("DELETE FROM quotes WHERE source = ?", (source,)).rowcount
+
+    def prune(self, source: str, since: float) -> int:
+        """Delete quotes from source (or its #page=N parts) not upserted since a time
+
+        Call it after re-adding everything a source currently yields, so
+        quotes it no longer produces don't linger in the table.
+        """
+        with self.conn:
+            return self.conn.execute(
+                "DELETE FROM quotes WHERE (source = ? OR (source >= ? AND source < ?)) AND updated_at < ?",
+                (source, source + '#', source + '#\uffff', since),
+            ).rowcount
+
+    def import_numbered_file(self, path: str, source: str) -> int:
+        """One-time import of a legacy 'N. quote' text file such as gandhi_quotes.txt"""
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        # Quotes are separated by blank lines, so a "\n3." inside a quote is safe
+        blocks = (re.sub(r'^\d+\.\s*', '', block.strip()) for block in content.split('\n\n'))
+        return self.add_many((block, source) for block in blocks if block)
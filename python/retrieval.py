@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+BM25 retrieval over the quote corpus for few-shot prompting
+Instead of sending the same 30 quotes with every dialogue call, pick the
+few quotes most relevant to the user's message. The index is a CSR
+posting list (per-term document ids and precomputed BM25 weights) stored
+as .npy files next to a UTF-8 blob of the quote texts. Loading maps them
+with mmap, so opening the index is instant. A query only touches the
+postings of its own terms, which takes well under a millisecond.
+
+    python retrieval.py build
+    python retrieval.py query "what is true love" -k 5
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import time
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from quote_store import DEFAULT_QUOTE_STORE_PATH, QuoteStore
+
+DEFAULT_INDEX_DIR = os.path.join(".cache", "retrieval")
+DEFAULT_QUOTES_FILE = "combined_gandhi_quotes.txt"
+INDEX_VERSION = 1
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have he her his
+i if in into is it its me my no not of on or our she so than that the their them then there
+these they this those to too us was we were what when where which who whom why will with
+would you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z']*")
+
+def tokenize(text: str) -> List[str]:
+    return [t.strip("'") for t in TOKEN_PATTERN.findall(text.lower()) if t.strip("'") not in STOPWORDS]
+
+class SearchResult(NamedTuple):
+    index: int
+    score: float
+    text: str
+
+def quotes_fingerprint(store_path: str = DEFAULT_QUOTE_STORE_PATH,
+                       quotes_file: str = DEFAULT_QUOTES_FILE) -> str:
+    """Changes when the quotes load_quotes would return do, without reading them"""
+    if os.path.exists(store_path):
+        store = QuoteStore(store_path)
+        try:
+            count, updated = store.stats()
+        finally:
+            store.close()
+        if count:
+            return f"store:{count}:{updated}"
+    info = os.stat(quotes_file)
+    return f"file:{info.st_size}:{info.st_mtime_ns}"
+
+def load_quotes(store_path: str = DEFAULT_QUOTE_STORE_PATH,
+                quotes_file: str = DEFAULT_QUOTES_FILE) -> Tuple[List[str], str]:
+    """Quotes from the store, or from the numbered text file if the store is empty
+
+    Returns (quotes, fingerprint); see quotes_fingerprint.
+    """
+    if os.path.exists(store_path):
+        store = QuoteStore(store_path)
+        try:
+            count, updated = store.stats()
+            if count:
+                return store.texts(), f"store:{count}:{updated}"
+        finally:
+            store.close()
+
+    with open(quotes_file, 'r', encoding='utf-8') as f:
+        blocks = f.read().split('\n\n')
+    quotes = [re.sub(r'^\d+\.\s*', '', block.strip()) for block in blocks if block.strip()]
+    return quotes, quotes_fingerprint(store_path, quotes_file)
+
+def build_index(quotes: List[str], index_dir: str = DEFAULT_INDEX_DIR, fingerprint: str = '') -> str:
+    """Write the BM25 index for a list of quotes; returns index_dir"""
+    os.makedirs(index_dir, exist_ok=True)
+    tokenized = [tokenize(quote) for quote in quotes]
+    vocab = sorted({term for terms in tokenized for term in terms})
+    term_ids = {term: i for i, term in enumerate(vocab)}
+    doc_count = len(quotes)
+
+    lengths = np.array([len(terms) for terms in tokenized], dtype=np.float32)
+    token_docs = np.repeat(np.arange(doc_count, dtype=np.int64), lengths.astype(np.int64))
+    token_terms = np.fromiter((term_ids[t] for terms in tokenized for t in terms),
+                              dtype=np.int64, count=len(token_docs))
+
+    # One (term, doc) pair per posting, sorted by term then doc, with its tf
+    pairs, tf = np.unique(token_terms * doc_count + token_docs, return_counts=True)
+    posting_terms = pairs // max(doc_count, 1)
+    posting_docs = (pairs % max(doc_count, 1)).astype(np.int32)
+    df = np.bincount(posting_terms, minlength=len(vocab))
+    offsets = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+
+    # Precompute the whole BM25 term weight so a query is only additions
+    idf = np.log1p((doc_count - df + 0.5) / (df + 0.5)).astype(np.float32)
+    avg_length = float(lengths.mean()) if doc_count else 1.0
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[posting_docs] / max(avg_length, 1e-9))
+    weights = (idf[posting_terms] * tf * (BM25_K1 + 1) / (tf + norm)).astype(np.float32)
+
+    blob = '\n'.join(quotes).encode('utf-8')
+    encoded_lengths = [len(quote.encode('utf-8')) for quote in quotes]
+    text_offsets = np.zeros(doc_count + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum(np.array(encoded_lengths, dtype=np.int64) + 1)
+
+    np.save(os.path.join(index_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(index_dir, "docs.npy"), posting_docs)
+    np.save(os.path.join(index_dir, "weights.npy"), weights)
+    np.save(os.path.join(index_dir, "text_offsets.npy"), text_offsets)
+    with open(os.path.join(index_dir, "texts.bin"), 'wb') as f:
+        f.write(blob)
+    with open(os.path.join(index_dir, "vocab.json"), 'w', encoding='utf-8') as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    # Written last, so a half-built index never looks current
+    with open(os.path.join(index_dir, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'fingerprint': fingerprint, 'quotes': doc_count,
+                   'terms': len(vocab), 'postings': int(len(posting_docs))}, f)
+    return index_dir
+
+class RetrievalIndex:
+    """Memory-mapped BM25 index"""
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_dir, "vocab.json"), 'r', encoding='utf-8') as f:
+            self.term_ids: Dict[str, int] = {term: i for i, term in enumerate(json.load(f))}
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode='r')
+        self.docs = np.load(os.path.join(index_dir, "docs.npy"), mmap_mode='r')
+        self.weights = np.load(os.path.join(index_dir, "weights.npy"), mmap_mode='r')
+        self.text_offsets = np.load(os.path.join(index_dir, "text_offsets.npy"), mmap_mode='r')
+        self.doc_count = self.meta['quotes']
+        self._texts_file = open(os.path.join(index_dir, "texts.bin"), 'rb')
+        self.texts = (mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ)
+                      if self.doc_count else b'')
+
+    def close(self):
+        if self.doc_count:
+            self.texts.close()
+        self._texts_file.close()
+
+    def text(self, index: int) -> str:
+        start, end = int(self.text_offsets[index]), int(self.text_offsets[index + 1]) - 1
+        return self.texts[start:end].decode('utf-8')
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # Doc ids are unique within one term's postings, so += is safe
+            scores[self.docs[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query: str, k: int = 5) -> List[SearchResult]:
+        """Top-k quotes for a query, best first; quotes with no shared term are skipped"""
+        scores = self.scores(query)
+        if not self.doc_count:
+            return []
+        k = min(k, self.doc_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [SearchResult(int(i), float(scores[i]), self.text(int(i))) for i in top if scores[i] > 0]
+
+def load_or_build(index_dir: str = DEFAULT_INDEX_DIR, store_path: str = DEFAULT_QUOTE_STORE_PATH,
+                  quotes_file: str = DEFAULT_QUOTES_FILE) -> RetrievalIndex:
+    """Open the index, rebuilding it first if the quotes changed
+
+    Only the store's stats (or the file's size and mtime) are read when the
+    index is current.
+    """
+    fingerprint = quotes_fingerprint(store_path, quotes_file)
+    meta_path = os.path.join(index_dir, "meta.json")
+    current = False
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        current = meta.get('version') == INDEX_VERSION and meta.get('fingerprint') == fingerprint
+    if not current:
+        quotes, fingerprint = load_quotes(store_path, quotes_file)
+        build_index(quotes, index_dir, fingerprint)
+    return RetrievalIndex(index_dir)
+
+def few_shot_prompt(index: RetrievalIndex, message: str, k: int = 5,
+                    base_prompt: str = "You are Mahatma Gandhi in a romantic visual novel set in the 1920s-1940s.") -> str:
+    """System prompt with the k quotes most relevant to the user's message"""
+    results = index.search(message, k)
+    if not results:
+        return base_prompt
+    quotes = '\n'.join(f"{i}. {result.text}" for i, result in enumerate(results, 1))
+    return f"{base_prompt}\n\nAuthentic Gandhi wisdom relevant to this conversation:\n{quotes}\n\nRespond authentically as Gandhi would, blending wisdom with warmth."
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 retrieval over the Gandhi quote corpus")
+    parser.add_argument("command", choices=['build', 'query', 'bench'])
+    parser.add_argument("text", nargs="?", help="query text for 'query'")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--store", default=DEFAULT_QUOTE_STORE_PATH)
+    parser.add_argument("--quotes-file", default=DEFAULT_QUOTES_FILE,
+                        help="numbered quotes file used when the store is empty")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        quotes, fingerprint = load_quotes(args.store, args.quotes_file)
+        build_index(quotes, args.index_dir, fingerprint)
+        index = RetrievalIndex(args.index_dir)
+        print(f"✓ Indexed {index.meta['quotes']} quotes, {index.meta['terms']} terms, "
+              f"{index.meta['postings']} postings in {time.perf_counter() - start:.2f}s")
+        return
+
+    index = load_or_build(args.index_dir, args.store, args.quotes_file)
+    if args.command == 'query':
+        if not args.text:
+            parser.error("query needs text")
+        for result in index.search(args.text, args.k):
+            print(f"{result.score:6.2f}  {result.text}")
+        return
+
+    # bench: time queries built from the corpus's own words
+    rng = np.random.default_rng(0)
+    vocab = list(index.term_ids)
+    queries = [' '.join(rng.choice(vocab, size=4)) for _ in range(1000)]
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, args.k)
+    elapsed = (time.perf_counter() - start) / len(queries)
+    print(f"{index.meta['quotes']} quotes: {elapsed * 1e6:.0f} µs per top-{args.k} query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Topic-balanced sampling of the training quotes
+Every quote gets two examples, so whatever topic fills the most pages
+(one long speech, say) also fills most of the fine-tune file. This module
+clusters the quotes by topic and then draws a training set of a fixed
+size with the budget spread as evenly over the clusters as their sizes
+allow. Small topics are kept whole and big ones are thinned out.
+
+Quotes become sparse TF-IDF vectors (sublinear tf, L2-normalized, CSR
+arrays as in retrieval.py). They are clustered by spherical mini-batch
+k-means in plain NumPy: each step assigns one random batch to the nearest
+centers by cosine similarity and moves those centers towards it. Within
+a cluster, the best-scoring quotes are taken first, or the quotes closest
+to the center when there are no scores. 100k quotes take a few seconds
+on one CPU.
+
+    python sampling.py --budget 500
+    python sampling.py --fraction 0.3 --clusters 48 --prefix combined_gandhi_sampled
+"""
+
+import argparse
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from quote_store import DEFAULT_QUOTE_STORE_PATH
+from retrieval import DEFAULT_QUOTES_FILE, load_quotes, tokenize
+
+DEFAULT_CLUSTERS = 32
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_ITERATIONS = 100
+MAX_FEATURES = 2**15
+MIN_DF = 2
+# Rows per chunk when multiplying the sparse matrix with the centers
+CHUNK_ROWS = 8192
+# Quotes used to seed the centers with k-means++
+SEED_SAMPLE = 10000
+
+class TfidfMatrix(NamedTuple):
+    """CSR rows: row i's columns are indices[indptr[i]:indptr[i + 1]]"""
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    vocab: List[str]
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, len(self.vocab)
+
+class Sample(NamedTuple):
+    indices: np.ndarray     # chosen quotes, in corpus order
+    labels: np.ndarray      # cluster of every quote
+    centers: np.ndarray     # (clusters, features), unit length
+    quotas: np.ndarray      # quotes drawn from each cluster
+    vocab: List[str]
+
+def tfidf_matrix(quotes: Sequence[str], max_features: int = MAX_FEATURES, min_df: int = MIN_DF) -> TfidfMatrix:
+    """Sublinear TF-IDF rows over the max_features terms found in the most quotes"""
+    # One-letter tokens are mostly the tails of curly-apostrophe contractions
+    tokenized = [[t for t in tokenize(quote) if len(t) > 1] for quote in quotes]
+    term_ids: Dict[str, int] = {}
+    lengths = np.fromiter((len(terms) for terms in tokenized), dtype=np.int64, count=len(tokenized))
+    token_terms = np.fromiter((term_ids.setdefault(t, len(term_ids)) for terms in tokenized for t in terms),
+                              dtype=np.int64, count=int(lengths.sum()))
+    token_docs = np.repeat(np.arange(len(quotes), dtype=np.int64), lengths)
+
+    # One entry per (doc, term) with its count, sorted by doc
+    vocab_size = max(len(term_ids), 1)
+    pairs, tf = np.unique(token_docs * vocab_size + token_terms, return_counts=True)
+    docs, terms = pairs // vocab_size, pairs % vocab_size
+    df = np.bincount(terms, minlength=vocab_size)
+
+    # Keep the most common terms, dropping ones seen in fewer than min_df quotes
+    candidates = np.flatnonzero(df >= min_df)
+    kept = candidates[np.argsort(-df[candidates], kind='stable')[:max_features]]
+    kept.sort()
+    new_ids = np.full(vocab_size, -1, dtype=np.int64)
+    new_ids[kept] = np.arange(len(kept))
+    mask = new_ids[terms] >= 0
+    docs, terms, tf = docs[mask], new_ids[terms[mask]], tf[mask]
+
+    idf = np.log((1 + len(quotes)) / (1 + df[kept])) + 1
+    data = ((1 + np.log(tf)) * idf[terms]).astype(np.float32)
+    norms = np.sqrt(np.bincount(docs, weights=data.astype(np.float64) ** 2, minlength=len(quotes)))
+    data /= np.maximum(norms[docs], 1e-12).astype(np.float32)
+
+    indptr = np.zeros(len(quotes) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(docs, minlength=len(quotes)))
+    names = sorted(term_ids, key=term_ids.get)
+    return TfidfMatrix(indptr, terms.astype(np.int32), data, [names[i] for i in kept])
+
+def _rows_times(matrix: TfidfMatrix, rows: np.ndarray, dense: np.ndarray) -> np.ndarray:
+    """matrix[rows] @ dense.T for a (k, features) dense array"""
+    starts, ends = matrix.indptr[rows], matrix.indptr[rows + 1]
+    lengths = ends - starts
+    # Positions of the selected rows' nonzeros, laid end to end
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    products = matrix.data[offsets, None] * dense.T[matrix.indices[offsets]]
+    # reduceat needs a valid start for empty rows; their sums are zeroed below
+    products = np.vstack([products, np.zeros((1, dense.shape[0]), dtype=products.dtype)])
+    row_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    sums = np.add.reduceat(products, row_starts, axis=0) if len(rows) else np.zeros((0, dense.shape[0]))
+    sums[lengths == 0] = 0
+    return sums
+
+def _similarities(matrix: TfidfMatrix, centers: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    rows = np.arange(matrix.shape[0]) if rows is None else rows
+    return np.vstack([_rows_times(matrix, rows[i:i + CHUNK_ROWS], centers)
+                      for i in range(0, len(rows), CHUNK_ROWS)] or [np.zeros((0, len(centers)))])
+
+def _row_sums(matrix: TfidfMatrix, rows: np.ndarray, labels: np.ndarray, clusters: int) -> np.ndarray:
+    """(clusters, features) sum of the given rows per label"""
+    lengths = matrix.indptr[rows + 1] - matrix.indptr[rows]
+    offsets = np.repeat(matrix.indptr[rows] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    features = matrix.shape[1]
+    flat = np.repeat(labels, lengths) * features + matrix.indices[offsets]
+    return np.bincount(flat, weights=matrix.data[offsets], minlength=clusters * features).reshape(clusters, features)
+
+def _seed_centers(matrix: TfidfMatrix, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """k-means++ on a random sample of the quotes, with cosine distance"""
+    n, features = matrix.shape
+    sample = rng.choice(n, size=min(n, SEED_SAMPLE), replace=False)
+    sample = sample[matrix.indptr[sample + 1] > matrix.indptr[sample]]
+    centers = np.zeros((clusters, features))
+    if not len(sample):
+        return centers
+    chosen = rng.integers(len(sample))
+    distance = np.full(len(sample), np.inf)
+    for j in range(clusters):
+        centers[j] = _row_sums(matrix, sample[[chosen]], np.zeros(1, dtype=np.int64), 1)[0]
+        distance = np.minimum(distance, 1 - _similarities(matrix, centers[j:j + 1], sample)[:, 0])
+        distance = np.maximum(distance, 0)
+        total = distance.sum()
+        if total <= 0:
+            break
+        chosen = rng.choice(len(sample), p=distance / total)
+    return centers
+
+def minibatch_kmeans(matrix: TfidfMatrix, clusters: int = DEFAULT_CLUSTERS, batch_size: int = DEFAULT_BATCH_SIZE,
+                     iterations: int = DEFAULT_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Unit-length cluster centers from spherical mini-batch k-means"""
+    n = matrix.shape[0]
+    rng = np.random.default_rng(seed)
+    centers = _seed_centers(matrix, clusters, rng)
+    counts = np.zeros(clusters)
+    for _ in range(iterations if n else 0):
+        batch = rng.choice(n, size=min(batch_size, n), replace=False)
+        labels = _similarities(matrix, centers, batch).argmax(axis=1)
+        sums = _row_sums(matrix, batch, labels, clusters)
+        batch_counts = np.bincount(labels, minlength=clusters)
+        # Each center is the running mean of every row ever assigned to it
+        new_counts = counts + batch_counts
+        moved = batch_counts > 0
+        centers[moved] = (centers[moved] * (counts[moved] / new_counts[moved])[:, None]
+                          + sums[moved] / new_counts[moved][:, None])
+        counts = new_counts
+        norms = np.linalg.norm(centers, axis=1)
+        centers[norms > 0] /= norms[norms > 0][:, None]
+    return centers
+
+def cluster_quotas(sizes: np.ndarray, budget: int) -> np.ndarray:
+    """Split budget over clusters as evenly as their sizes allow (water filling)"""
+    budget = min(budget, int(sizes.sum()))
+    low, high = 0, int(sizes.max()) if len(sizes) else 0
+    # Highest per-cluster level whose total still fits the budget
+    while low < high:
+        level = (low + high + 1) // 2
+        if np.minimum(sizes, level).sum() <= budget:
+            low = level
+        else:
+            high = level - 1
+    quotas = np.minimum(sizes, low)
+    # What's left goes one each to the biggest clusters that still have quotes
+    leftover = budget - int(quotas.sum())
+    room = np.flatnonzero(sizes > quotas)
+    quotas[room[np.argsort(-sizes[room], kind='stable')[:leftover]]] += 1
+    return quotas
+
+def balanced_sample(quotes: Sequence[str], budget: int, clusters: int = DEFAULT_CLUSTERS,
+                    scores: Optional[np.ndarray] = None, seed: int = 0,
+                    iterations: int = DEFAULT_ITERATIONS) -> Sample:
+    """At most budget quotes, spread evenly over topic clusters
+
+    Within a cluster, quotes are taken by descending score when scores are
+    given, otherwise by similarity to the cluster center.
+    """
+    matrix = tfidf_matrix(quotes)
+    clusters = max(1, min(clusters, len(quotes)))
+    centers = minibatch_kmeans(matrix, clusters, iterations=iterations, seed=seed)
+    similarities = _similarities(matrix, centers)
+    labels = similarities.argmax(axis=1) if len(quotes) else np.zeros(0, dtype=np.int64)
+    quotas = cluster_quotas(np.bincount(labels, minlength=clusters), budget)
+
+    rank = np.asarray(scores, dtype=np.float64) if scores is not None else \
+        similarities[np.arange(len(quotes)), labels]
+    # Best first within each cluster: sort by cluster, then by descending rank
+    order = np.lexsort((-rank, labels))
+    cluster_starts = np.searchsorted(labels[order], np.arange(clusters))
+    position = np.arange(len(quotes)) - np.repeat(cluster_starts, np.bincount(labels, minlength=clusters))
+    chosen = np.sort(order[position < quotas[labels[order]]])
+    return Sample(chosen, labels, centers, quotas, matrix.vocab)
+
+def print_sample_report(sample: Sample, top_terms: int = 6, show: int = 12):
+    sizes = np.bincount(sample.labels, minlength=len(sample.centers))
+    total, chosen = int(sizes.sum()), int(sample.quotas.sum())
+    print(f"\n{'='*60}")
+    print(f"SAMPLING: {chosen} of {total} quotes from {int((sizes > 0).sum())} topic clusters")
+    print(f"{'='*60}")
+    if not total:
+        return
+    print(f"Largest cluster: {sizes.max() / total:.1%} of all quotes, "
+          f"{sample.quotas.max() / max(chosen, 1):.1%} of the sample")
+    print(f"Clusters kept whole: {int((sample.quotas == sizes).sum())}")
+    print(f"\n{'quotes':>7} {'kept':>6}  top terms")
+    for j in np.argsort(-sizes, kind='stable')[:show]:
+        terms = [sample.vocab[t] for t in np.argsort(-sample.centers[j])[:top_terms] if sample.centers[j, t] > 0]
+        print(f"{sizes[j]:>7} {sample.quotas[j]:>6}  {', '.join(terms)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw a topic-balanced training set from the quotes")
+    parser.add_argument("--budget", type=int, default=None, help="number of quotes to keep")
+    parser.add_argument("--fraction", type=float, default=None, help="keep this fraction of the quotes instead")
+    parser.add_argument("--clusters", type=int, default=DEFAULT_CLUSTERS)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store", default=DEFAULT_QUOTE_STORE_PATH)
+    parser.add_argument("--quotes-file", default=DEFAULT_QUOTES_FILE,
+                        help="numbered quotes file used when the store is empty")
+    parser.add_argument("--no-scoring", action="store_true", help="rank by closeness to the topic, not by score")
+    parser.add_argument("--prefix", default="combined_gandhi_sampled", help="training files to write")
+    parser.add_argument("--dry-run", action="store_true", help="only print the clusters")
+    args = parser.parse_args()
+
+    quotes, _ = load_quotes(args.store, args.quotes_file)
+    if args.budget is None and args.fraction is None:
+        parser.error("give --budget or --fraction")
+    budget = args.budget if args.budget is not None else int(round(len(quotes) * args.fraction))
+
+    start = time.perf_counter()
+    scores = None
+    if not args.no_scoring:
+        from scoring import score_quotes
+
+        scores = score_quotes(quotes, min_score=None).scores
+    sample = balanced_sample(quotes, budget, args.clusters, scores, args.seed, args.iterations)
+    print(f"Sampled in {time.perf_counter() - start:.2f}s")
+    print_sample_report(sample)
+
+    if not args.dry_run:
+        from scrape import create_training_files
+
+        create_training_files([quotes[i] for i in sample.indices], prefix=args.prefix)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Quote quality scoring
+The filters only reject obvious junk: any sentence of 30-250 characters
+passes, so headings like "Kashmir Issue (Speech at the Prayer Meeting on
+4th January 1948)" and OCR-mangled lines end up in the training data.
+This stage scores every quote on a few features and keeps the top N or
+everything above a threshold.
+
+Features are computed for the whole corpus at once: the quotes are laid
+end to end as one array of code points, character classes become boolean
+masks, and per-quote counts are a bincount over the quote each character
+belongs to. Every feature is scaled to 0..1; the score is their weighted
+sum.
+
+    python scoring.py                         # score combined_gandhi_quotes.txt
+    python scoring.py --top-n 500 --show 10
+"""
+
+import argparse
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from filters import PDF_WISDOM_KEYWORDS, SPEECH_WISDOM_KEYWORDS
+
+FEATURES = ('keyword_density', 'caps_digits', 'garbage_rate', 'completeness', 'title_case', 'has_date')
+
+DEFAULT_WEIGHTS = {
+    'keyword_density': 1.0,  # wisdom keywords per word, saturating at 1 in 10
+    'caps_digits': -3.0,  # share of capitals and digits among letters and digits
+    'garbage_rate': -2.0,  # OCR debris: stray symbols, d1gits in words, broken hyph- enation
+    'completeness': 1.0,  # starts with a capital, ends cleanly, brackets balance
+    'title_case': -1.5,  # share of capitalized words after the first, i.e. headings
+    'has_date': -0.5,  # a year, a day and month, or a numeric date
+}
+
+DEFAULT_MIN_SCORE = 0.4
+
+# Saturation points of the rate features
+KEYWORD_DENSITY_CAP = 0.1
+GARBAGE_RATE_CAP = 0.05
+
+# Punctuation that is normal in prose; anything else that isn't a letter,
+# digit or space counts as OCR garbage
+PROSE_PUNCTUATION = ".,;:'\"!?()-/&%‘’“”–—…"
+
+# A sentence ending on one of these was cut off mid-phrase
+DANGLING_WORDS = frozenset("""
+a an and as at but by dr for from in into mr mrs no of on or st the their to with
+""".split())
+DANGLING_WIDTH = max(len(word) for word in DANGLING_WORDS)
+
+MONTHS = ("January|February|March|April|May|June|July|August|September|October|November|December|"
+          "Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sept|Sep|Oct|Nov|Dec")
+DATE_PATTERN = re.compile(
+    rf"\b1[6-9]\d\d\b|\b\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?(?:{MONTHS})\b|\b(?:{MONTHS})\.?\s+\d{{1,2}}\b"
+    r"|\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b"
+)
+
+class Selection(NamedTuple):
+    quotes: List[str]  # kept quotes, in their original order
+    kept: np.ndarray  # indices of the kept quotes
+    scores: np.ndarray  # score of every input quote
+    features: np.ndarray  # (quotes, FEATURES) matrix
+
+def _char_table(chars: str, size: int = 0x250) -> np.ndarray:
+    table = np.zeros(size, dtype=bool)
+    table[[ord(c) for c in chars]] = True
+    return table
+
+def _pack_words(cps: np.ndarray, word_starts: np.ndarray, letter: np.ndarray,
+                width: int = DANGLING_WIDTH) -> np.ndarray:
+    """Words of at most `width` letters packed into one integer each, -1 for longer words
+
+    Lowercase code points are all below 1024, so each letter takes 10 bits.
+    """
+    keys = np.zeros(len(word_starts), dtype=np.int64)
+    inside = np.ones(len(word_starts), dtype=bool)
+    for k in range(width + 1):
+        positions = np.minimum(word_starts + k, len(cps) - 1)
+        inside &= letter[positions]
+        if k < width:
+            keys = np.where(inside, keys * 1024 + (cps[positions] & 1023), keys)
+    return np.where(inside, -1, keys)
+
+def _dangling_keys() -> np.ndarray:
+    text = '\0'.join(sorted(DANGLING_WORDS)) + '\0'
+    cps = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    starts = np.r_[0, np.flatnonzero(cps == 0)[:-1] + 1]
+    return _pack_words(cps, starts, cps > 0)
+
+_DANGLING_KEYS = _dangling_keys()
+_PROSE_TABLE = _char_table(PROSE_PUNCTUATION, 0x2100)
+_OPENERS = _char_table("\"'(‘“", 0x2100)
+
+class QuoteScorer:
+    """Vectorized feature extraction and weighted scoring"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None,
+                 keywords: Sequence[str] = tuple(PDF_WISDOM_KEYWORDS) + tuple(SPEECH_WISDOM_KEYWORDS)):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.weight_vector = np.array([self.weights[name] for name in FEATURES], dtype=np.float32)
+        keywords = sorted({k.lower() for k in keywords}, key=lambda k: (-len(k), k))
+        # Matched against lowercased text; lookarounds are much faster than \b with IGNORECASE
+        self.keyword_regex = re.compile(r'(?<![a-z])(?:' + '|'.join(re.escape(k) for k in keywords) + r')(?![a-z])')
+
+    def features(self, quotes: Sequence[str]) -> np.ndarray:
+        """(len(quotes), len(FEATURES)) float32 matrix of features in 0..1"""
+        count = len(quotes)
+        if not count:
+            return np.zeros((0, len(FEATURES)), dtype=np.float32)
+
+        # NUL-terminated so no mask or neighbour test crosses from one quote
+        # into the next, and even an empty quote has a character to look at
+        blob = '\0'.join(quotes) + '\0'
+        cps = np.frombuffer(blob.encode('utf-32-le'), dtype=np.uint32)
+        lengths = np.fromiter((len(q) for q in quotes), dtype=np.int64, count=count)
+        starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+        owner = np.repeat(np.arange(count), lengths + 1)
+
+        def per_quote(mask: np.ndarray) -> np.ndarray:
+            # Every segment holds at least its terminator, so none is empty
+            return np.add.reduceat(mask, starts, dtype=np.int64)
+
+        upper = (cps >= 65) & (cps <= 90)
+        lower = (cps >= 97) & (cps <= 122)
+        digit = (cps >= 48) & (cps <= 57)
+        # Latin-1 and Latin Extended letters cover transliterated names
+        accented = (cps >= 0xC0) & (cps < 0x250) & (cps != 0xD7) & (cps != 0xF7)
+        letter = upper | lower | accented
+        space = (cps == 32) | (cps == 9) | (cps == 10)
+        prose = np.zeros(len(cps), dtype=bool)
+        small = cps < len(_PROSE_TABLE)
+        prose[small] = _PROSE_TABLE[cps[small]]
+
+        stray = ~(letter | digit | space | prose | (cps == 0))
+        # "d1ed", "matte1": a digit straight after a lowercase letter
+        digit_in_word = np.zeros(len(cps), dtype=bool)
+        digit_in_word[1:] = lower[:-1] & digit[1:]
+        # "conclud- ing": a line-break hyphen left between two lowercase halves
+        broken = np.zeros(len(cps), dtype=bool)
+        if len(cps) > 3:
+            broken[:-3] = lower[:-3] & (cps[1:-2] == 45) & (cps[2:-1] == 32) & lower[3:]
+
+        safe_lengths = np.maximum(lengths, 1)
+        alnum = np.maximum(per_quote(letter | digit), 1)
+        caps_digits = per_quote(upper | digit) / alnum
+        garbage = per_quote(stray | digit_in_word | broken) / safe_lengths
+
+        # A word starts at a letter that doesn't continue a word
+        in_word = letter | digit | (cps == 39) | (cps == 45) | (cps == 95)
+        word_start = letter.copy()
+        word_start[1:] &= ~in_word[:-1]
+        word_starts = np.flatnonzero(word_start)
+        word_owner = owner[word_starts]
+        words = np.bincount(word_owner, minlength=count)
+        capitalized = np.bincount(word_owner, weights=upper[word_starts], minlength=count)
+        first_capitalized = upper[starts] & (words > 0)
+        title_case = (capitalized - first_capitalized) / np.maximum(words - 1, 1)
+
+        lowered = blob.lower()
+        if len(lowered) == len(blob):
+            keyword_starts = np.fromiter((m.start() for m in self.keyword_regex.finditer(lowered)), dtype=np.int64)
+            keywords = np.bincount(owner[keyword_starts], minlength=count)
+        else:
+            # A few characters change length when lowercased; positions no longer line up
+            keywords = np.array([len(self.keyword_regex.findall(q.lower())) for q in quotes])
+        keyword_density = keywords / np.maximum(words, 1)
+
+        # Every date pattern has a digit, so only quotes with one are searched
+        has_date = np.zeros(count, dtype=bool)
+        for i in np.flatnonzero(per_quote(digit)):
+            has_date[i] = DATE_PATTERN.search(quotes[i]) is not None
+
+        ends = starts + lengths - 1
+        first = cps[starts]
+        last = cps[np.maximum(ends, starts)]
+        opener = np.zeros(count, dtype=bool)
+        opener[first < len(_OPENERS)] = _OPENERS[first[first < len(_OPENERS)]]
+        starts_well = upper[starts] | opener
+        clean_end = letter[np.maximum(ends, starts)] | np.isin(last, [ord(c) for c in ".!?\"')’”"])
+        # Sentences cut off at "... of the": pack each quote's last word, if
+        # short, into an integer and look it up among the packed dangling words
+        if len(word_owner):
+            last = np.flatnonzero(np.r_[word_owner[1:] != word_owner[:-1], True])
+            clean_end[word_owner[last]] &= ~np.isin(_pack_words(cps | 32, word_starts[last], letter),
+                                                     _DANGLING_KEYS)
+        balanced = per_quote(cps == 40) == per_quote(cps == 41)
+        completeness = (starts_well.astype(np.float64) + clean_end + balanced) / 3
+
+        matrix = np.column_stack([
+            np.minimum(keyword_density / KEYWORD_DENSITY_CAP, 1.0),
+            caps_digits,
+            np.minimum(garbage / GARBAGE_RATE_CAP, 1.0),
+            completeness,
+            title_case,
+            has_date,
+        ])
+        return matrix.astype(np.float32)
+
+    def scores(self, features: np.ndarray) -> np.ndarray:
+        return features @ self.weight_vector
+
+    def select(self, quotes: Sequence[str], min_score: Optional[float] = DEFAULT_MIN_SCORE,
+               top_n: Optional[int] = None) -> Selection:
+        """Quotes scoring at least min_score, and of those at most the top_n best"""
+        features = self.features(quotes)
+        scores = self.scores(features)
+        keep = np.ones(len(quotes), dtype=bool)
+        if min_score is not None:
+            keep &= scores >= min_score
+        if top_n is not None and keep.sum() > top_n:
+            candidates = np.flatnonzero(keep)
+            best = candidates[np.argsort(-scores[candidates], kind='stable')[:top_n]]
+            keep[:] = False
+            keep[best] = True
+        kept = np.flatnonzero(keep)
+        return Selection([quotes[i] for i in kept], kept, scores, features)
+
+    def contributions(self, selection: Selection) -> List[Dict]:
+        """Per feature: weight, mean value and contribution of kept and dropped quotes,
+        and how many dropped quotes that feature's penalty alone pushed under the cut"""
+        kept = np.zeros(len(selection.scores), dtype=bool)
+        kept[selection.kept] = True
+        weighted = selection.features * self.weight_vector
+        cut = selection.scores[kept].min() if kept.any() else np.inf
+        rows = []
+        for j, name in enumerate(FEATURES):
+            column = weighted[:, j]
+            decisive = (~kept) & (column < 0) & (selection.scores - column >= cut)
+            rows.append({
+                'feature': name,
+                'weight': self.weights[name],
+                'mean': float(selection.features[:, j].mean()) if len(kept) else 0.0,
+                'kept': float(column[kept].mean()) if kept.any() else 0.0,
+                'dropped': float(column[~kept].mean()) if (~kept).any() else 0.0,
+                'decisive': int(decisive.sum()),
+            })
+        return rows
+
+    def explain(self, features: np.ndarray) -> Dict[str, float]:
+        """Weighted contribution of each feature for one quote's feature row"""
+        return {name: float(value * self.weights[name]) for name, value in zip(FEATURES, features)}
+
+DEFAULT_SCORER = QuoteScorer()
+
+def score_quotes(quotes: Sequence[str], min_score: Optional[float] = DEFAULT_MIN_SCORE,
+                 top_n: Optional[int] = None, scorer: QuoteScorer = DEFAULT_SCORER) -> Selection:
+    return scorer.select(quotes, min_score, top_n)
+
+def filter_scored(pairs: Iterable[Tuple[int, str]], min_score: float = DEFAULT_MIN_SCORE,
+                  batch_size: int = 1000, scorer: QuoteScorer = DEFAULT_SCORER) -> Iterator[Tuple[int, str]]:
+    """Stream the (page_index, quote) pairs that score at least min_score, scored in batches"""
+    def kept(batch: List[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+        scores = scorer.scores(scorer.features([quote for _, quote in batch]))
+        return (pair for pair, score in zip(batch, scores) if score >= min_score)
+
+    batch: List[Tuple[int, str]] = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) >= batch_size:
+            yield from kept(batch)
+            batch = []
+    if batch:
+        yield from kept(batch)
+
+def print_report(selection: Selection, scorer: QuoteScorer = DEFAULT_SCORER):
+    total = len(selection.scores)
+    print(f"\n{'='*60}")
+    print(f"Quote scoring: kept {len(selection.kept)} of {total}")
+    print(f"{'='*60}")
+    if not total:
+        return
+    p10, p50, p90 = np.percentile(selection.scores, [10, 50, 90])
+    print(f"Scores: p10 {p10:.2f}, median {p50:.2f}, p90 {p90:.2f}")
+    print(f"\n{'feature':<16} {'weight':>7} {'mean':>6} {'kept':>7} {'dropped':>8} {'decisive':>9}")
+    for row in scorer.contributions(selection):
+        print(f"{row['feature']:<16} {row['weight']:>7.1f} {row['mean']:>6.2f} "
+              f"{row['kept']:>+7.2f} {row['dropped']:>+8.2f} {row['decisive']:>9}")
+
+def main():
+    from filters import load_corpus_sentences
+
+    parser = argparse.ArgumentParser(description="Score quotes and keep the best ones")
+    parser.add_argument("corpus", nargs="?", default="combined_gandhi_quotes.txt")
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE)
+    parser.add_argument("--top-n", type=int, default=None)
+    parser.add_argument("--show", type=int, default=5, help="print the N lowest and highest scoring quotes")
+    parser.add_argument("--output", default=None, help="write the kept quotes as a numbered file")
+    args = parser.parse_args()
+
+    quotes = load_corpus_sentences(args.corpus)
+    selection = score_quotes(quotes, args.min_score, args.top_n)
+    print_report(selection)
+
+    order = np.argsort(selection.scores, kind='stable')
+    for title, picks in (("Lowest", order[:args.show]), ("Highest", order[::-1][:args.show])):
+        if not args.show:
+            break
+        print(f"\n{title} scoring:")
+        for i in picks:
+            parts = ', '.join(f"{name} {value:+.2f}"
+                              for name, value in DEFAULT_SCORER.explain(selection.features[i]).items() if value)
+            print(f"  {selection.scores[i]:+.2f}  {quotes[i][:100]}")
+            print(f"         {parts}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for i, quote in enumerate(selection.quotes, 1):
+                f.write(f"{i}. {quote}\n\n")
+        print(f"\n✓ Wrote {len(selection.quotes)} quotes to {args.output}")
+
+if __name__ == "__main__":
+    main()
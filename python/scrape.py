@@ -5,13 +5,26 @@ Scrapes speeches from mkgandhi.org and combines with PDF data
 """
 
 import requests
-from bs4 import BeautifulSoup
+import argparse
+import asyncio
 import json
 import csv
+import random
 import re
 import time
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+from async_fetch import AsyncFetcher
+import html_parsers
+import metrics
+from filters import SPEECH_FILTER
+from html_parsers import BACKENDS, parse_page
+from http_cache import DEFAULT_HTTP_CACHE_PATH, HttpCache
+from quote_store import DEFAULT_QUOTE_STORE_PATH, QuoteStore, quote_hash
+from scoring import DEFAULT_MIN_SCORE, print_report, score_quotes
+from shards import (DEFAULT_MAX_SHARD_BYTES, DEFAULT_SEED, DEFAULT_VALID_FRACTION, manifest_path,
+                    print_manifest, write_shards)
 
 # List of all speech URLs from the main page
 SPEECH_URLS = [
@@ -26,37 +39,84 @@ SPEECH_URLS = [
     "https://www.mkgandhi.org/speeches/evelast.php",
 ]
 
-def scrape_speech(url: str) -> Dict[str, str]:
-    """Scrape a single speech page"""
+def parse_speech(url: str, html: bytes, backend: Optional[str] = None) -> Dict[str, str]:
+    """Parse the title, text and links out of a downloaded speech page
+
+    The parser backend defaults to html_parsers.default_backend (lxml when
+    installed); every backend returns the same result.
+    """
+    # Main content is the first table's text, or all paragraph text as a fallback
+    page = parse_page(html, backend)
+    
+    title = page.title if page.title is not None else url.split('/')[-1]
+    
+    return {
+        'url': url,
+        'title': title,
+        'content': page.content,
+        'links': page.links,
+    }
+
+def _cached_speech(url: str, cache: HttpCache) -> Optional[Dict[str, str]]:
+    """Return the cached parse of a page, parsing the cached body if needed"""
+    entry = cache.get(url)
+    if entry is None:
+        return None
+    if entry.parsed is not None:
+        return entry.parsed
+    speech_data = parse_speech(url, entry.body)
+    cache.store(url, entry.body, {'ETag': entry.etag, 'Last-Modified': entry.last_modified}, speech_data)
+    return speech_data
+
+def speech_from_response(url: str, status: int, body: bytes, headers: Dict[str, str],
+                          cache: Optional[HttpCache]) -> Optional[Dict[str, str]]:
+    """Turn a (possibly 304) response into parsed speech data, updating the cache
+
+    Returns None for a 304 the cache can't answer; the caller should fetch
+    the page again without conditional headers.
+    """
+    if status == 304:
+        speech_data = _cached_speech(url, cache) if cache is not None else None
+        if speech_data is not None:
+            cache.touch(url)
+        return speech_data
+    
+    speech_data = parse_speech(url, body)
+    if cache is not None:
+        cache.store(url, body, headers, speech_data)
+    return speech_data
+
+def scrape_speech(url: str, cache: Optional[HttpCache] = None, offline: bool = False) -> Dict[str, str]:
+    """Scrape a single speech page
+
+    With a cache, unchanged pages are revalidated with a conditional GET;
+    offline replays the cache only and never touches the network.
+    """
+    if offline:
+        speech_data = _cached_speech(url, cache) if cache is not None else None
+        if speech_data is None:
+            print(f"Not cached, skipping (offline): {url}")
+        return speech_data
+    
     print(f"Scraping: {url}")
     
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+        def get(headers):
+            response = requests.get(url, headers=headers, timeout=10)
+            metrics.count('http_requests')
+            metrics.count('http_bytes', len(response.content))
+            response.raise_for_status()
+            return speech_from_response(url, response.status_code, response.content,
+                                        response.headers, cache)
         
-        # Find the main content table
-        # The speech content is usually in a table or specific div
-        content_table = soup.find('table')
-        
-        if content_table:
-            # Extract all text from the table
-            text = content_table.get_text(separator=' ', strip=True)
-        else:
-            # Fallback: get all paragraph text
-            paragraphs = soup.find_all('p')
-            text = ' '.join([p.get_text(strip=True) for p in paragraphs])
-        
-        # Get the title
-        title_tag = soup.find('title')
-        title = title_tag.get_text() if title_tag else url.split('/')[-1]
-        
-        return {
-            'url': url,
-            'title': title,
-            'content': text
-        }
+        headers = cache.conditional_headers(url) if cache is not None else {}
+        speech_data = get(headers)
+        if speech_data is None and headers:
+            print(f"  → 304 but the page isn't cached, fetching it again")
+            speech_data = get({})
+        if speech_data is None:
+            raise ValueError("304 Not Modified for an unconditional request")
+        return speech_data
     
     except Exception as e:
         print(f"Error scraping {url}: {e}")
@@ -76,59 +136,85 @@ def extract_quotes_from_speech(speech_data: Dict[str, str]) -> List[str]:
     for sentence in sentences:
         sentence = sentence.strip()
         
-        # Filter criteria
-        if not sentence or len(sentence) < 30 or len(sentence) > 300:
-            continue
-        
-        # Skip navigation and metadata
-        skip_patterns = [
-            r'Back\s*Next',
-            r'Home\s*About Us',
-            r'Mahatma Gandhi',
-            r'mkgandhi\.org',
-            r'Comprehensive website',
-            r'Gandhian Institutions',
-            r'^\s*\d+\.\s*$',
-            r'Menu\s*Submit',
-            r'Famous Speeches',
-        ]
-        
-        if any(re.search(pattern, sentence, re.IGNORECASE) for pattern in skip_patterns):
-            continue
-        
-        # Prioritize philosophical content
-        wisdom_keywords = [
-            'truth', 'love', 'non-violence', 'god', 'freedom', 'duty',
-            'service', 'sacrifice', 'peace', 'justice', 'believe', 'faith',
-            'soul', 'spirit', 'heart', 'conscience', 'moral', 'righteous',
-            'ahimsa', 'satyagraha', 'mankind', 'humanity'
-        ]
-        
-        has_wisdom = any(keyword in sentence.lower() for keyword in wisdom_keywords)
-        
-        # Must have actual words, not just navigation
-        word_count = len(re.findall(r'\b\w+\b', sentence))
-        if word_count < 5:
-            continue
-        
-        if has_wisdom or (30 < len(sentence) < 250):
+        # Skip navigation/metadata and prioritize philosophical content
+        if SPEECH_FILTER.accepts(sentence):
             quotes.append(sentence)
     
     return quotes
 
-def scrape_all_speeches() -> List[str]:
-    """Scrape all speeches and extract quotes"""
+def scrape_all_speeches(cache: Optional[HttpCache] = None, offline: bool = False,
+                        store: Optional[QuoteStore] = None) -> List[str]:
+    """Scrape all speeches and extract quotes
+
+    With a store, each speech's quotes are upserted as soon as it is scraped
+    and quotes the speech no longer yields are pruned.
+    """
     all_quotes = []
+    started = time.time()
     
     for url in SPEECH_URLS:
-        speech_data = scrape_speech(url)
+        speech_data = scrape_speech(url, cache, offline)
         if speech_data:
             quotes = extract_quotes_from_speech(speech_data)
             all_quotes.extend(quotes)
+            if store is not None:
+                store.add_many((quote, url) for quote in quotes)
+                store.prune(url, started)
             print(f"  → Extracted {len(quotes)} quotes")
         
         # Be polite to the server
-        time.sleep(1)
+        if not offline:
+            time.sleep(1)
+    
+    return all_quotes
+
+async def fetch_speech_async(fetcher: AsyncFetcher, url: str,
+                             cache: Optional[HttpCache] = None) -> Tuple[int, Dict[str, str]]:
+    """(status, speech data) for a page, revalidated against the cache
+
+    A 304 the cache can't answer is treated as a miss and the page is
+    fetched again without conditional headers.
+    """
+    headers = cache.conditional_headers(url) if cache is not None else {}
+    result = await fetcher.fetch(url, headers=headers)
+    speech_data = speech_from_response(url, result.status, result.body, result.headers, cache)
+    if speech_data is None and headers:
+        print(f"  → 304 for {url} but it isn't cached, fetching it again")
+        result = await fetcher.fetch(url)
+        speech_data = speech_from_response(url, result.status, result.body, result.headers, cache)
+    if speech_data is None:
+        raise ValueError("304 Not Modified for an unconditional request")
+    return result.status, speech_data
+
+async def scrape_speech_async(fetcher: AsyncFetcher, url: str,
+                              cache: Optional[HttpCache] = None) -> Dict[str, str]:
+    """Async version of scrape_speech using a shared fetcher"""
+    try:
+        status, speech_data = await fetch_speech_async(fetcher, url, cache)
+        print(f"Scraped: {url} ({status})")
+        return speech_data
+    except Exception as e:
+        print(f"Error scraping {url}: {e}")
+        return None
+
+async def scrape_all_speeches_async(urls: List[str] = SPEECH_URLS, per_host: int = 4,
+                                    rate: float = 2.0, retries: int = 3,
+                                    cache: Optional[HttpCache] = None,
+                                    store: Optional[QuoteStore] = None) -> List[str]:
+    """Scrape speeches concurrently; quotes come back in the order of urls"""
+    started = time.time()
+    async with AsyncFetcher(per_host=per_host, rate=rate, burst=per_host, retries=retries) as fetcher:
+        speeches = await asyncio.gather(*(scrape_speech_async(fetcher, url, cache) for url in urls))
+    
+    all_quotes = []
+    for speech_data in speeches:
+        if speech_data:
+            quotes = extract_quotes_from_speech(speech_data)
+            all_quotes.extend(quotes)
+            if store is not None:
+                store.add_many((quote, speech_data['url']) for quote in quotes)
+                store.prune(speech_data['url'], started)
+            print(f"  → Extracted {len(quotes)} quotes from {speech_data['url']}")
     
     return all_quotes
 
@@ -146,26 +232,92 @@ def remove_duplicates(quotes: List[str]) -> List[str]:
     
     return unique
 
-def merge_with_existing_data(new_quotes: List[str], existing_file: str = "gandhi_quotes.txt") -> List[str]:
-    """Merge new quotes with existing PDF-extracted quotes"""
-    all_quotes = list(new_quotes)
-    
-    if os.path.exists(existing_file):
-        print(f"\nMerging with existing quotes from {existing_file}...")
-        with open(existing_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Extract quotes (they're numbered)
-            existing_quotes = re.findall(r'\d+\.\s*(.+?)(?=\n\n|\n\d+\.|\Z)', content, re.DOTALL)
-            all_quotes.extend([q.strip() for q in existing_quotes if q.strip()])
+def merge_with_existing_data(new_quotes: List[str], existing_file: str = "gandhi_quotes.txt",
+                             near_dup_threshold: float = 0.8,
+                             store: Optional[QuoteStore] = None) -> List[str]:
+    """Merge new quotes with existing PDF-extracted quotes
+
+    With a store, new_quotes (already upserted while scraping) are followed
+    by the store's PDF quotes; web quotes from earlier runs are left out.
+    existing_file is only imported once, into an empty store. Without one,
+    the numbered text file is parsed as before.
+
+    After exact duplicates are dropped, quotes whose estimated similarity
+    is at least near_dup_threshold are collapsed too (0 disables this).
+    """
+    if store is not None:
+        has_pdf_quotes = store.count("pdf:") or store.count("legacy:")
+        if not has_pdf_quotes and os.path.exists(existing_file):
+            imported = store.import_numbered_file(existing_file, f"legacy:{existing_file}")
+            print(f"  → Imported {imported} quotes from {existing_file} into {store.path}")
+        all_quotes = list(new_quotes) + store.texts("pdf:") + store.texts("legacy:")
+    else:
+        all_quotes = list(new_quotes)
         
-        print(f"  → Added {len(existing_quotes)} quotes from PDF")
+        if os.path.exists(existing_file):
+            print(f"\nMerging with existing quotes from {existing_file}...")
+            with open(existing_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+                # Extract quotes (they're numbered)
+                existing_quotes = re.findall(r'\d+\.\s*(.+?)(?=\n\n|\n\d+\.|\Z)', content, re.DOTALL)
+                all_quotes.extend([q.strip() for q in existing_quotes if q.strip()])
+            
+            print(f"  → Added {len(existing_quotes)} quotes from PDF")
     
     # Remove duplicates
     unique_quotes = remove_duplicates(all_quotes)
+    
+    if near_dup_threshold:
+        from near_dedup import remove_near_duplicates
+        
+        before = len(unique_quotes)
+        unique_quotes = remove_near_duplicates(unique_quotes, near_dup_threshold)
+        print(f"  → Removed {before - len(unique_quotes)} near-duplicates")
+    
     print(f"  → Total unique quotes: {len(unique_quotes)}")
     
     return unique_quotes
 
+SYSTEM_PROMPTS = [
+    "You are Gandhi speaking in a visual novel love story. Respond with wisdom, compassion, and deep philosophical insight about love, duty, and life.",
+    "You are Mahatma Gandhi in a romantic visual novel. Share your thoughts with gentle wisdom.",
+    "You are Gandhi, the spiritual leader. Offer guidance with compassion and truth.",
+]
+
+USER_PROMPTS = [
+    "What do you believe about love and truth?",
+    "Share your wisdom with me.",
+    "Tell me something meaningful.",
+    "Guide me with your thoughts.",
+    "What is your philosophy?",
+    "Speak to me about life and duty.",
+    "How should I live my life?",
+]
+
+CSV_PROMPTS = [
+    "Gandhi, share your wisdom:",
+    "What would Gandhi say?",
+    "Tell me about truth and love:",
+    "Guide me, Gandhi:",
+    "Your philosophy, Mahatma:",
+]
+
+def make_training_examples(quote: str, rng=random) -> List[Dict]:
+    """Create 2 training examples per quote with variation
+
+    Pass a seeded random.Random as rng for reproducible prompts.
+    """
+    return [
+        {
+            "messages": [
+                {"role": "system", "content": rng.choice(SYSTEM_PROMPTS)},
+                {"role": "user", "content": rng.choice(USER_PROMPTS)},
+                {"role": "assistant", "content": quote}
+            ]
+        }
+        for _ in range(2)
+    ]
+
 def create_training_files(quotes: List[str], prefix: str = "combined"):
     """Create training files in multiple formats"""
     
@@ -174,33 +326,8 @@ def create_training_files(quotes: List[str], prefix: str = "combined"):
     # 1. Create JSONL for OpenAI
     jsonl_path = f"{prefix}_training.jsonl"
     with open(jsonl_path, 'w', encoding='utf-8') as f:
-        system_prompts = [
-            "You are Gandhi speaking in a visual novel love story. Respond with wisdom, compassion, and deep philosophical insight about love, duty, and life.",
-            "You are Mahatma Gandhi in a romantic visual novel. Share your thoughts with gentle wisdom.",
-            "You are Gandhi, the spiritual leader. Offer guidance with compassion and truth.",
-        ]
-        
-        user_prompts = [
-            "What do you believe about love and truth?",
-            "Share your wisdom with me.",
-            "Tell me something meaningful.",
-            "Guide me with your thoughts.",
-            "What is your philosophy?",
-            "Speak to me about life and duty.",
-            "How should I live my life?",
-        ]
-        
-        import random
         for quote in quotes:
-            # Create 2 training examples per quote with variation
-            for _ in range(2):
-                example = {
-                    "messages": [
-                        {"role": "system", "content": random.choice(system_prompts)},
-                        {"role": "user", "content": random.choice(user_prompts)},
-                        {"role": "assistant", "content": quote}
-                    ]
-                }
+            for example in make_training_examples(quote):
                 f.write(json.dumps(example, ensure_ascii=False) + '\n')
     
     print(f"✓ Created: {jsonl_path}")
@@ -211,16 +338,8 @@ def create_training_files(quotes: List[str], prefix: str = "combined"):
         writer = csv.writer(f)
         writer.writerow(['prompt', 'completion'])
         
-        prompts = [
-            "Gandhi, share your wisdom:",
-            "What would Gandhi say?",
-            "Tell me about truth and love:",
-            "Guide me, Gandhi:",
-            "Your philosophy, Mahatma:",
-        ]
-        
         for i, quote in enumerate(quotes):
-            writer.writerow([prompts[i % len(prompts)], quote])
+            writer.writerow([CSV_PROMPTS[i % len(CSV_PROMPTS)], quote])
     
     print(f"✓ Created: {csv_path}")
     
@@ -295,25 +414,132 @@ def analyze_data(quotes: List[str]):
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description="Scrape Gandhi speeches and build training files")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="fetch speeches concurrently over a pooled connection")
+    parser.add_argument("--per-host", type=int, default=4,
+                        help="max concurrent requests per host (async mode)")
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="max requests per second per host (async mode)")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--no-cache", action="store_true",
+                        help="download every page instead of revalidating the local cache")
+    parser.add_argument("--offline", action="store_true",
+                        help="replay pages from the local cache only, no network")
+    parser.add_argument("--cache-path", default=DEFAULT_HTTP_CACHE_PATH)
+    parser.add_argument("--crawl", metavar="INDEX_URL",
+                        help="discover speech pages by crawling from an index page instead of SPEECH_URLS")
+    parser.add_argument("--frontier", default=None,
+                        help="frontier file used to resume a crawl")
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=4, help="crawler workers")
+    parser.add_argument("--parser", choices=['auto'] + sorted(BACKENDS), default='auto',
+                        help="HTML parser backend (auto uses lxml when installed)")
+    parser.add_argument("--store", default=DEFAULT_QUOTE_STORE_PATH,
+                        help="quote store shared with extract.py")
+    parser.add_argument("--no-store", action="store_true",
+                        help="merge through gandhi_quotes.txt instead of the quote store")
+    parser.add_argument("--near-dup-threshold", type=float, default=0.8,
+                        help="MinHash similarity above which quotes count as duplicates (0 disables)")
+    parser.add_argument("--shards", action="store_true",
+                        help="also write seeded train/validation shards and a manifest")
+    parser.add_argument("--valid-fraction", type=float, default=DEFAULT_VALID_FRACTION)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--shard-mb", type=float, default=DEFAULT_MAX_SHARD_BYTES / 1024 / 1024)
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE,
+                        help="drop quotes whose quality score is below this")
+    parser.add_argument("--top-n", type=int, default=None, help="keep at most the N best scoring quotes")
+    parser.add_argument("--no-scoring", action="store_true", help="keep every quote the filters accept")
+    parser.add_argument("--sample-budget", type=int, default=None,
+                        help="keep at most this many quotes, balanced over topic clusters (see sampling.py)")
+    parser.add_argument("--corpus", metavar="PATH", default=None,
+                        help="also write the quotes as a columnar corpus (see corpus.py)")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    
+    html_parsers.default_backend = args.parser
+    
+    if args.offline and args.no_cache:
+        parser.error("--offline needs the cache")
+    if args.offline and args.crawl:
+        parser.error("--crawl cannot run offline")
+    cache = None if args.no_cache else HttpCache(args.cache_path)
+    store = None if args.no_store else QuoteStore(args.store)
+    metrics.start_run("scrape", args)
+    # Counts from an earlier run in this process would be reported again
+    SPEECH_FILTER.reset()
+    
     print("="*60)
     print("GANDHI SPEECHES WEB SCRAPER")
     print("="*60)
     
     # Step 1: Scrape web speeches
     print("\nStep 1: Scraping speeches from mkgandhi.org...")
-    web_quotes = scrape_all_speeches()
+    with metrics.stage("scrape"):
+        if args.crawl:
+            from crawler import DEFAULT_FRONTIER_PATH, crawl_speeches
+            web_quotes = crawl_speeches(
+                args.crawl, args.frontier or DEFAULT_FRONTIER_PATH, cache=cache, workers=args.workers,
+                max_pages=args.max_pages, store=store, rate=args.rate, retries=args.retries)
+        elif args.use_async and not args.offline:
+            web_quotes = asyncio.run(scrape_all_speeches_async(
+                SPEECH_URLS, per_host=args.per_host, rate=args.rate, retries=args.retries,
+                cache=cache, store=store))
+        else:
+            web_quotes = scrape_all_speeches(cache, offline=args.offline, store=store)
     print(f"\n✓ Scraped {len(web_quotes)} quotes from web")
+    rule_counts = SPEECH_FILTER.rule_counts()
+    metrics.count('sentences', sum(rule_counts.values()))
+    metrics.add_counts(rule_counts, 'filter.')
+    metrics.count('quotes_scraped', len(web_quotes))
     
     # Step 2: Merge with existing PDF data
     print("\nStep 2: Merging with PDF data...")
-    all_quotes = merge_with_existing_data(web_quotes)
+    with metrics.stage("merge"):
+        all_quotes = merge_with_existing_data(web_quotes, near_dup_threshold=args.near_dup_threshold,
+                                              store=store)
+    metrics.count('quotes_merged', len(all_quotes))
+    scores = None
+    if not args.no_scoring:
+        with metrics.stage("scoring"):
+            selection = score_quotes(all_quotes, args.min_score, args.top_n)
+        print_report(selection)
+        all_quotes = selection.quotes
+        scores = selection.scores[selection.kept]
+    if args.sample_budget is not None:
+        from sampling import balanced_sample, print_sample_report
+
+        with metrics.stage("sampling"):
+            sample = balanced_sample(all_quotes, args.sample_budget, scores=scores, seed=args.seed)
+        print_sample_report(sample)
+        all_quotes = [all_quotes[i] for i in sample.indices]
+        if scores is not None:
+            scores = scores[sample.indices]
+    metrics.count('quotes_written', len(all_quotes))
     
     # Step 3: Analyze
     analyze_data(all_quotes)
     
     # Step 4: Create training files
     print("\nStep 3: Creating training files...")
-    files = create_training_files(all_quotes, prefix="combined_gandhi")
+    with metrics.stage("write_files"):
+        files = create_training_files(all_quotes, prefix="combined_gandhi")
+    if args.shards:
+        with metrics.stage("shards"):
+            manifest = write_shards(all_quotes, make_training_examples, ".", "combined_gandhi",
+                                    args.valid_fraction, args.seed, int(args.shard_mb * 1024 * 1024))
+        print_manifest(manifest)
+        files += (manifest_path(".", "combined_gandhi"),)
+    if args.corpus:
+        from corpus import build_corpus, prompt_templates
+
+        with metrics.stage("corpus"):
+            sources = {}
+            if store is not None:
+                sources = {hash_: source for _, hash_, source, _ in store.records()}
+            build_corpus(all_quotes, args.corpus, prompt_templates('scrape'),
+                         (sources.get(quote_hash(quote), '') for quote in all_quotes), scores, args.seed)
+        files += (args.corpus,)
     
     print(f"\n{'='*60}")
     print(f"SUCCESS!")
@@ -339,6 +565,8 @@ def main():
     print(f"2. Remove any junk/duplicates manually")
     print(f"3. Use combined_gandhi_training.jsonl for OpenAI fine-tuning")
     print(f"4. Or use combined_gandhi_system_prompt.txt for prompt engineering")
+    
+    metrics.finish()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Single-pass letter and sentence segmentation over the cleaned PDF text
+One regex scan records the candidate letter boundaries of every strategy
+(dates, salutations, letter numbers) at once; the strategy is then picked
+from the counts, in the same order split_into_letters used to try them
+with a full re.split each. Letters and sentences come back as
+(start, end, page) spans into the source text, so nothing is copied
+until a sentence is actually kept, and every quote knows its page.
+
+    python segment.py gandhi-letters.pdf
+"""
+
+import argparse
+import bisect
+import re
+from collections import Counter
+from typing import Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+# Boundary strategies in order of preference. The alternatives can't match
+# at the same offset, so one alternation finds the boundaries of all three.
+# The single-character lookahead in front rules out most spaces cheaply.
+STRATEGIES = ('date', 'salutation', 'numbering')
+BOUNDARY_PATTERN = re.compile(
+    r'\s(?=[\dDdLMN])(?=(?P<date>\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
+    r'|(?P<salutation>(?:My )?[Dd]ear [A-Z])'
+    r'|(?P<numbering>Letter \d+|No\. \d+|\d+\.))'
+)
+
+# Longest stretch after its leading space a boundary match looks at
+# ("My Dear X", "12/31/1947"), with room to spare
+BOUNDARY_LOOKAHEAD = 32
+
+# A strategy is used once it cuts the text into at least this many pieces
+MIN_LETTERS = 10
+# Pieces per document when no strategy applies
+FALLBACK_CHUNKS = 50
+MIN_LETTER_CHARS = 200
+
+# A period after one of these doesn't end the sentence
+ABBREVIATIONS = frozenset("""
+mr mrs messrs dr st sir rev prof hon col gen capt lt sgt vol ch pp viz cf ie eg
+i.e e.g esq jr sr govt dept
+""".split())
+
+# Abbreviations only when a number follows: "No. 5" but not "I said no. No one came"
+NUMBER_ABBREVIATIONS = frozenset({'no', 'nos'})
+
+SENTENCE_END = re.compile(r'\.(?!\d)\s+|[!?]+\s+|\n+')
+
+class Span(NamedTuple):
+    start: int
+    end: int
+    page: int
+
+def join_pages(pages: Sequence[str]) -> Tuple[str, List[int]]:
+    """Join cleaned pages with a space; returns (text, offset where each page starts)"""
+    page_starts = []
+    offset = 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page) + 1
+    return ' '.join(pages), page_starts
+
+def page_of(page_starts: Sequence[int], offset: int) -> int:
+    return max(bisect.bisect_right(page_starts, offset) - 1, 0)
+
+def _strip(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def choose_strategy(counts: Mapping[str, int]) -> Optional[str]:
+    """First strategy with enough boundaries, given the boundary count of each"""
+    for name in STRATEGIES:
+        if counts.get(name, 0) + 1 >= MIN_LETTERS:
+            return name
+    return None
+
+def count_boundaries(pages: Iterable[str]) -> Counter:
+    """Boundaries per strategy in the pages joined as join_pages does, one page at a time"""
+    counts = Counter()
+    carried = None
+    for page in pages:
+        text = page if carried is None else carried + ' ' + page
+        # A match only depends on the text right after its start, so matches
+        # near the end are left for the next window, which carries that text
+        settled = len(text) - BOUNDARY_LOOKAHEAD
+        for match in BOUNDARY_PATTERN.finditer(text):
+            if match.start() >= settled:
+                break
+            counts[match.lastgroup] += 1
+        carried = text[max(settled, 0):]
+    counts.update(match.lastgroup for match in BOUNDARY_PATTERN.finditer(carried or ''))
+    return counts
+
+def find_boundaries(text: str) -> Tuple[Optional[str], List[int]]:
+    """(chosen strategy or None, offsets where letters start) from one scan"""
+    offsets = {name: [] for name in STRATEGIES}
+    for match in BOUNDARY_PATTERN.finditer(text):
+        offsets[match.lastgroup].append(match.start() + 1)
+    strategy = choose_strategy({name: len(found) for name, found in offsets.items()})
+    if strategy is not None:
+        return strategy, offsets[strategy]
+    chunk_size = max(1, len(text) // FALLBACK_CHUNKS)
+    return None, list(range(chunk_size, len(text), chunk_size))
+
+def segment_letters(text: str, page_starts: Sequence[int] = (0,),
+                    min_chars: int = MIN_LETTER_CHARS) -> Tuple[Optional[str], List[Span]]:
+    """Letter spans, stripped and longer than min_chars; returns (strategy, spans)"""
+    strategy, boundaries = find_boundaries(text)
+    spans = []
+    for start, end in zip([0] + boundaries, boundaries + [len(text)]):
+        start, end = _strip(text, start, end)
+        if end - start > min_chars:
+            spans.append(Span(start, end, page_of(page_starts, start)))
+    return strategy, spans
+
+def _is_abbreviation(text: str, start: int, period: int, next_char: str = '') -> bool:
+    """Whether the period at `period` belongs to the word before it
+
+    next_char is the first character after the period and its spaces.
+    """
+    word_start = max(text.rfind(' ', start, period) + 1, start)
+    word = text[word_start:period].lstrip('("\'')
+    # Initials like "R. L. Khipple"; a lowercase "a." ends its sentence
+    if len(word) == 1 and word.isalpha():
+        return word.isupper()
+    word = word.lower()
+    if word in NUMBER_ABBREVIATIONS:
+        return next_char.isdigit()
+    return word in ABBREVIATIONS
+
+def sentence_spans(text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """Stripped (start, end) of each sentence of text[start:end], without its end punctuation
+
+    A period doesn't end a sentence after an abbreviation or an initial
+    ("No." only before a number), or when the next word starts in lowercase.
+    """
+    end = len(text) if end is None else end
+    sentence_start = start
+    for match in SENTENCE_END.finditer(text, start, end):
+        if text[match.start()] == '.':
+            following = match.end()
+            next_char = text[following] if following < end else ''
+            if _is_abbreviation(text, sentence_start, match.start(), next_char):
+                continue
+            if following < end and text[following].islower():
+                continue
+        span = _strip(text, sentence_start, match.start())
+        if span[1] > span[0]:
+            yield span
+        sentence_start = match.end()
+    span = _strip(text, sentence_start, end)
+    if span[1] > span[0]:
+        yield span
+
+def iter_sentences(text: str, letters: Sequence[Span], page_starts: Sequence[int] = (0,)) -> Iterator[Span]:
+    """Sentence spans of every letter, tagged with the page each sentence starts on"""
+    for letter in letters:
+        for start, end in sentence_spans(text, letter.start, letter.end):
+            yield Span(start, end, page_of(page_starts, start))
+
+def main():
+    from extract import clean_text, iter_pdf_pages
+
+    parser = argparse.ArgumentParser(description="Show how the PDF text is segmented")
+    parser.add_argument("pdf_path", nargs="?", default="gandhi-letters.pdf")
+    args = parser.parse_args()
+
+    text, page_starts = join_pages([clean_text(page) for page in iter_pdf_pages(args.pdf_path)])
+    strategy, letters = segment_letters(text, page_starts)
+    print(f"{len(text)} characters, {len(page_starts)} pages")
+    print(f"Letters: {len(letters)} (strategy: {strategy or 'fixed chunks'})")
+    sentences = list(iter_sentences(text, letters, page_starts))
+    print(f"Sentences: {len(sentences)}")
+    per_page = Counter(span.page for span in sentences)
+    print(f"Pages with sentences: {len(per_page)}")
+    for span in sentences[:5]:
+        print(f"  p{span.page + 1}: {text[span.start:span.end][:100]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Sharded training file writer with a train/validation split
+Streams chat examples into size-bounded JSONL shards. Every quote is put
+in train or validation by a seeded, stratified rule, and both of its
+examples go to the same split so validation never sees a training quote.
+Prompts are seeded per quote, so the same quotes and seed always give
+byte-identical shards. A manifest records counts and sha256 per shard.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+from typing import Callable, Dict, Iterable, List
+
+from page_cache import file_hash
+from quote_store import quote_hash
+
+DEFAULT_VALID_FRACTION = 0.1
+DEFAULT_SEED = 0
+DEFAULT_MAX_SHARD_BYTES = 100 * 1024 * 1024  # OpenAI accepts up to 512 MB per file
+
+# Quote length strata so train and validation see the same mix of lengths
+LENGTH_STRATA = [(0, 80, 'short'), (80, 160, 'medium'), (160, None, 'long')]
+
+def length_stratum(quote: str) -> str:
+    for low, high, name in LENGTH_STRATA:
+        if len(quote) >= low and (high is None or len(quote) < high):
+            return name
+    return LENGTH_STRATA[-1][2]
+
+def _unit_hash(*parts: str) -> float:
+    """Deterministic number in [0, 1) from some strings"""
+    digest = hashlib.sha256(':'.join(parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2**64
+
+class StratifiedSplitter:
+    """Streaming systematic sampling within each stratum
+
+    The k-th quote of a stratum goes to validation whenever k * fraction,
+    shifted by a seeded per-stratum offset, crosses an integer, so every
+    stratum gets the requested fraction to within one quote.
+    """
+
+    def __init__(self, valid_fraction: float = DEFAULT_VALID_FRACTION, seed: int = DEFAULT_SEED):
+        if not 0 <= valid_fraction < 1:
+            raise ValueError("valid_fraction must be in [0, 1)")
+        self.valid_fraction = valid_fraction
+        self.seed = seed
+        self.seen: Dict[str, int] = {}
+        self.offsets: Dict[str, float] = {}
+
+    def split(self, stratum: str) -> str:
+        k = self.seen.get(stratum, 0)
+        self.seen[stratum] = k + 1
+        if stratum not in self.offsets:
+            self.offsets[stratum] = _unit_hash(str(self.seed), stratum)
+        offset = self.offsets[stratum]
+        crossed = int((k + 1) * self.valid_fraction + offset) > int(k * self.valid_fraction + offset)
+        return 'valid' if crossed else 'train'
+
+class _Shard:
+    def __init__(self, path: str, split: str):
+        self.path = path
+        self.split = split
+        self.file = open(path, 'wb')
+        self.hasher = hashlib.sha256()
+        self.bytes = 0
+        self.examples = 0
+        self.quotes = 0
+
+    def write(self, data: bytes, examples: int):
+        self.file.write(data)
+        self.hasher.update(data)
+        self.bytes += len(data)
+        self.examples += examples
+        self.quotes += 1
+
+    def close(self) -> Dict:
+        self.file.close()
+        return {
+            'path': os.path.basename(self.path),
+            'split': self.split,
+            'quotes': self.quotes,
+            'examples': self.examples,
+            'bytes': self.bytes,
+            'sha256': self.hasher.hexdigest(),
+        }
+
+def manifest_path(output_dir: str, prefix: str) -> str:
+    return os.path.join(output_dir, f"{prefix}_manifest.json")
+
+def write_shards(quotes: Iterable[str], make_examples: Callable[[str, random.Random], List[Dict]],
+                 output_dir: str = ".", prefix: str = "combined_gandhi",
+                 valid_fraction: float = DEFAULT_VALID_FRACTION, seed: int = DEFAULT_SEED,
+                 max_shard_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+                 stratify: Callable[[str], str] = length_stratum) -> Dict:
+    """Stream quotes into train/valid shards and write the manifest
+
+    make_examples(quote, rng) returns the chat examples for one quote,
+    like make_training_examples in scrape.py and extract.py.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # Shards left over from a bigger previous run would look like part of this one
+    for split in ('train', 'valid'):
+        for stale in glob.glob(os.path.join(output_dir, f"{prefix}_{split}_*.jsonl")):
+            os.remove(stale)
+
+    splitter = StratifiedSplitter(valid_fraction, seed)
+    open_shards: Dict[str, _Shard] = {}
+    shard_numbers = {'train': 0, 'valid': 0}
+    finished = []
+    strata: Dict[str, Dict[str, int]] = {}
+
+    for quote in quotes:
+        stratum = stratify(quote)
+        split = splitter.split(stratum)
+        strata.setdefault(stratum, {'train': 0, 'valid': 0})[split] += 1
+
+        rng = random.Random(f"{seed}:{quote_hash(quote)}")
+        examples = make_examples(quote, rng)
+        data = ''.join(json.dumps(example, ensure_ascii=False) + '\n' for example in examples).encode('utf-8')
+
+        shard = open_shards.get(split)
+        if shard is not None and shard.bytes and shard.bytes + len(data) > max_shard_bytes:
+            finished.append(shard.close())
+            shard = None
+        if shard is None:
+            path = os.path.join(output_dir, f"{prefix}_{split}_{shard_numbers[split]:03d}.jsonl")
+            shard_numbers[split] += 1
+            shard = open_shards[split] = _Shard(path, split)
+        shard.write(data, len(examples))
+
+    finished.extend(shard.close() for shard in open_shards.values())
+    finished.sort(key=lambda entry: entry['path'])
+
+    manifest = {
+        'seed': seed,
+        'valid_fraction': valid_fraction,
+        'max_shard_bytes': max_shard_bytes,
+        'totals': {
+            split: {
+                'shards': sum(1 for s in finished if s['split'] == split),
+                'quotes': sum(s['quotes'] for s in finished if s['split'] == split),
+                'examples': sum(s['examples'] for s in finished if s['split'] == split),
+            }
+            for split in ('train', 'valid')
+        },
+        'strata': strata,
+        'shards': finished,
+    }
+    with open(manifest_path(output_dir, prefix), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+    return manifest
+
+def load_manifest(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def shard_paths(manifest_file: str, split: str) -> List[str]:
+    """Absolute shard paths for one split, in order"""
+    manifest = load_manifest(manifest_file)
+    base = os.path.dirname(os.path.abspath(manifest_file))
+    return [os.path.join(base, s['path']) for s in manifest['shards'] if s['split'] == split]
+
+def verify_manifest(manifest_file: str) -> List[str]:
+    """Problems with the shards a manifest lists; empty if all match"""
+    problems = []
+    base = os.path.dirname(os.path.abspath(manifest_file))
+    for entry in load_manifest(manifest_file)['shards']:
+        path = os.path.join(base, entry['path'])
+        if not os.path.exists(path):
+            problems.append(f"{entry['path']}: missing")
+            continue
+        if file_hash(path) != entry['sha256']:
+            problems.append(f"{entry['path']}: checksum mismatch")
+    return problems
+
+def print_manifest(manifest: Dict):
+    print(f"\nSplit (seed {manifest['seed']}, {manifest['valid_fraction']:.0%} validation):")
+    for split, totals in manifest['totals'].items():
+        print(f"  {split}: {totals['quotes']} quotes, {totals['examples']} examples "
+              f"in {totals['shards']} shard(s)")
+    for stratum, counts in sorted(manifest['strata'].items()):
+        print(f"  {stratum:>8}: {counts['train']} train / {counts['valid']} valid")
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard and split a numbered quotes file into training JSONL")
+    parser.add_argument("quotes_file", nargs="?", default="combined_gandhi_quotes.txt")
+    parser.add_argument("--prefix", default="combined_gandhi")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--valid-fraction", type=float, default=DEFAULT_VALID_FRACTION)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--shard-mb", type=float, default=DEFAULT_MAX_SHARD_BYTES / 1024 / 1024)
+    parser.add_argument("--verify", metavar="MANIFEST", help="check shard checksums against a manifest")
+    args = parser.parse_args()
+
+    if args.verify:
+        problems = verify_manifest(args.verify)
+        for problem in problems:
+            print(f"✗ {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"✓ All shards match {args.verify}")
+        return
+
+    from scrape import make_training_examples
+
+    with open(args.quotes_file, 'r', encoding='utf-8') as f:
+        blocks = f.read().split('\n\n')
+    quotes = [re.sub(r'^\d+\.\s*', '', block.strip()) for block in blocks if block.strip()]
+
+    manifest = write_shards(quotes, make_training_examples, args.output_dir, args.prefix,
+                            args.valid_fraction, args.seed, int(args.shard_mb * 1024 * 1024))
+    print_manifest(manifest)
+    print(f"✓ Created: {manifest_path(args.output_dir, args.prefix)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter sweep for the Gandhi fine-tune
+Expands a JSON grid of models, epochs, learning-rate multipliers and
+dataset variants into jobs, runs them through the orchestrator within a
+concurrency budget, and collects the final train/validation loss from job
+events into one results table. The cheapest job that meets the loss
+target is picked as the winner.
+
+    python sweep.py sweep.json            # real run, resumable
+    python sweep.py sweep.json --dry-run  # offline against fake_openai
+    python sweep.py --example             # print a sample grid
+
+Each grid file gets its own state file under .cache/sweeps/, and jobs in
+it are keyed on their training files' contents, so rerunning after the
+data changed trains again instead of reporting the old models.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import itertools
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from orchestrator import JobSpec, Orchestrator
+from shards import shard_paths
+from tokens import TRAINING_PRICES, count_file
+
+DEFAULT_STATE_DIR = os.path.join(".cache", "sweeps")
+DEFAULT_RESULTS_PATH = "sweep_results.csv"
+
+EXAMPLE_GRID = {
+    "models": ["gpt-4o-mini-2024-07-18", "gpt-3.5-turbo"],
+    "n_epochs": [2, 3, 4],
+    "learning_rate_multipliers": [0.5, 1.0, 2.0],
+    "datasets": {
+        "combined": {"manifest": "combined_gandhi_manifest.json"},
+        "letters": {"training_file": "gandhi_train_000.jsonl",
+                    "validation_file": "gandhi_valid_000.jsonl"},
+    },
+    "max_jobs": 3,
+    "loss_target": 1.3,
+    "metric": "valid_loss",
+}
+
+RESULT_COLUMNS = ['name', 'dataset', 'model', 'n_epochs', 'learning_rate_multiplier', 'status',
+                  'train_loss', 'valid_loss', 'trained_tokens', 'cost', 'fine_tuned_model']
+
+def load_grid(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        grid = json.load(f)
+    missing = [key for key in ('models', 'n_epochs', 'datasets') if not grid.get(key)]
+    if missing:
+        raise ValueError(f"{path} is missing {', '.join(missing)}")
+    return grid
+
+def state_path_for(grid_path: str, state_dir: str = DEFAULT_STATE_DIR) -> str:
+    """State file of one grid, so separate sweeps never share (or resume) each other's jobs"""
+    stem = os.path.splitext(os.path.basename(grid_path))[0]
+    digest = hashlib.sha256(os.path.abspath(grid_path).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(state_dir, f"{stem}-{digest}.json")
+
+def dataset_files(dataset: Dict) -> Tuple[str, Optional[str]]:
+    """(training file, validation file) for a dataset entry of the grid"""
+    if 'manifest' in dataset:
+        train = shard_paths(dataset['manifest'], 'train')
+        valid = shard_paths(dataset['manifest'], 'valid')
+        if len(train) != 1 or len(valid) > 1:
+            raise ValueError(f"{dataset['manifest']} needs exactly one train shard and at most one validation shard")
+        return train[0], valid[0] if valid else None
+    return dataset['training_file'], dataset.get('validation_file')
+
+def _short_model(model: str) -> str:
+    return model.replace('gpt-', '').split('-20')[0]
+
+def expand_grid(grid: Dict, suffix: str = "gandhi-vn") -> List[Tuple[str, JobSpec]]:
+    """(dataset name, JobSpec) for every point of the grid"""
+    datasets = {name: dataset_files(entry) for name, entry in grid['datasets'].items()}
+    multipliers = grid.get('learning_rate_multipliers') or [None]
+    points = []
+    for (dataset, (train, valid)), model, epochs, lr in itertools.product(
+            datasets.items(), grid['models'], grid['n_epochs'], multipliers):
+        name = f"{dataset}-{_short_model(model)}-e{epochs}" + (f"-lr{lr:g}" if lr is not None else "")
+        points.append((dataset, JobSpec(name, train, valid, model, epochs, lr, suffix)))
+    return points
+
+def estimate_costs(points: List[Tuple[str, JobSpec]]) -> Dict[str, Optional[float]]:
+    """Expected training cost per job name from a token count of its file"""
+    billed: Dict[Tuple[str, str], int] = {}
+    costs = {}
+    for _, spec in points:
+        key = (spec.training_file, spec.model)
+        if key not in billed:
+            billed[key] = count_file(spec.training_file, spec.model).billed_tokens
+        price = TRAINING_PRICES.get(spec.model)
+        costs[spec.name] = billed[key] * spec.n_epochs * price / 1_000_000 if price is not None else None
+    return costs
+
+def results_table(points: List[Tuple[str, JobSpec]], records: Dict[str, Optional[Dict]],
+                  estimated: Dict[str, Optional[float]]) -> List[Dict]:
+    rows = []
+    for dataset, spec in points:
+        record = records.get(spec.name) or {}
+        metrics = record.get('metrics') or {}
+        price = TRAINING_PRICES.get(spec.model)
+        # Trained tokens are what OpenAI bills; fall back to the estimate
+        cost = estimated.get(spec.name)
+        if record.get('trained_tokens') and price is not None:
+            cost = record['trained_tokens'] * price / 1_000_000
+        rows.append({
+            'name': spec.name,
+            'dataset': dataset,
+            'model': spec.model,
+            'n_epochs': spec.n_epochs,
+            'learning_rate_multiplier': spec.learning_rate_multiplier,
+            'status': record.get('status', 'not started'),
+            'train_loss': metrics.get('train_loss'),
+            'valid_loss': metrics.get('full_valid_loss', metrics.get('valid_loss')),
+            'trained_tokens': record.get('trained_tokens'),
+            'cost': round(cost, 4) if cost is not None else None,
+            'fine_tuned_model': record.get('fine_tuned_model'),
+        })
+    return rows
+
+def pick_winner(rows: List[Dict], loss_target: float, metric: str = 'valid_loss') -> Optional[Dict]:
+    """Cheapest succeeded job whose loss meets the target; ties go to lower loss"""
+    eligible = [row for row in rows
+                if row['status'] == 'succeeded' and row[metric] is not None and row[metric] <= loss_target]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda row: (row['cost'] if row['cost'] is not None else float('inf'), row[metric]))
+
+def write_results(rows: List[Dict], path: str):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def print_results(rows: List[Dict]):
+    print(f"\n{'='*90}")
+    print(f"{'job':<32} {'status':<10} {'train':>7} {'valid':>7} {'cost':>9}")
+    print(f"{'-'*90}")
+    for row in rows:
+        train = f"{row['train_loss']:.4f}" if row['train_loss'] is not None else '-'
+        valid = f"{row['valid_loss']:.4f}" if row['valid_loss'] is not None else '-'
+        cost = f"${row['cost']:.2f}" if row['cost'] is not None else '-'
+        print(f"{row['name']:<32} {row['status']:<10} {train:>7} {valid:>7} {cost:>9}")
+
+def run_sweep(grid: Dict, client, state_path: str, min_poll: float = 2.0,
+              max_cost: Optional[float] = None) -> Tuple[List[Dict], Optional[Dict]]:
+    """Run every grid point; returns (results rows, winner or None)"""
+    points = expand_grid(grid)
+    estimated = estimate_costs(points)
+    total = sum(cost for cost in estimated.values() if cost is not None)
+    print(f"{len(points)} jobs, estimated training cost ${total:.2f}")
+    if max_cost is not None and total > max_cost:
+        print(f"error: estimate is over the --max-cost budget of ${max_cost:.2f}, shrink the grid")
+        return [], None
+
+    orchestrator = Orchestrator(client, state_path, max_jobs=grid.get('max_jobs', 3), min_poll=min_poll)
+    specs = [spec for _, spec in points]
+    try:
+        records = asyncio.run(orchestrator.run(specs))
+    except KeyboardInterrupt:
+        print(f"\n\nStopped. Jobs keep running; rerun the same command to resume from {state_path}")
+        records = orchestrator.records(specs)
+
+    rows = results_table(points, records, estimated)
+    winner = None
+    if grid.get('loss_target') is not None:
+        winner = pick_winner(rows, grid['loss_target'], grid.get('metric', 'valid_loss'))
+    return rows, winner
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fine-tuning hyperparameter sweep")
+    parser.add_argument("grid", nargs="?", help="JSON grid file (see --example)")
+    parser.add_argument("--example", action="store_true", help="print an example grid and exit")
+    parser.add_argument("--state", default=None,
+                        help=f"job state file (default: one per grid under {DEFAULT_STATE_DIR})")
+    parser.add_argument("--results", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--max-cost", type=float, default=None,
+                        help="refuse to start if the estimated cost is over this many USD")
+    parser.add_argument("--dry-run", action="store_true", help="run against the offline fake API")
+    args = parser.parse_args()
+
+    if args.example or not args.grid:
+        print(json.dumps(EXAMPLE_GRID, indent=2))
+        return
+
+    grid = load_grid(args.grid)
+    state_path = args.state or state_path_for(args.grid)
+    if args.dry_run:
+        from fake_openai import FakeAsyncOpenAI
+
+        client = FakeAsyncOpenAI()
+        state_path = os.path.splitext(state_path)[0] + ".dry_run.json"
+        # Fake jobs only exist inside one process, so never resume them
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        min_poll = 0.01
+    else:
+        from dotenv import load_dotenv
+        from openai import AsyncOpenAI
+
+        load_dotenv()
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        min_poll = 2.0
+
+    rows, winner = run_sweep(grid, client, state_path, min_poll, args.max_cost)
+    if not rows:
+        return
+    print_results(rows)
+    write_results(rows, args.results)
+    print(f"\n✓ Results written to {args.results}")
+
+    if grid.get('loss_target') is None:
+        return
+    metric = grid.get('metric', 'valid_loss')
+    if winner:
+        print(f"\nCheapest job with {metric} <= {grid['loss_target']}: {winner['name']}")
+        print(f"  Model ID: {winner['fine_tuned_model']}")
+    else:
+        print(f"\nNo finished job reached {metric} <= {grid['loss_target']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The pipeline scripts import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def training_file(tmp_path):
+    """Write a small chat JSONL file; call it again with other quotes for a changed file"""
+    def write(quotes=("Truth is God.", "Love is the law of life."), name="train.jsonl"):
+        path = tmp_path / name
+        with open(path, 'w', encoding='utf-8') as f:
+            for quote in quotes:
+                messages = [{"role": "user", "content": "Share your wisdom."},
+                            {"role": "assistant", "content": quote}]
+                f.write(json.dumps({"messages": messages}) + '\n')
+        return str(path)
+    return write
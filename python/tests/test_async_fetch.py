@@ -0,0 +1,225 @@
+import asyncio
+import time
+from collections import Counter
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from async_fetch import AsyncFetcher, TokenBucket
+from http_cache import HttpCache
+from scrape import (extract_quotes_from_speech, fetch_speech_async, parse_speech, scrape_all_speeches_async,
+                    speech_from_response)
+
+SPEECH_PAGE = """<html><head><title>Speech {n}</title></head><body>
+<table><tr><td>
+<p>Truth alone will endure, all the rest will be swept away before the tide of time.
+I believe that non-violence is infinitely superior to violence in speech number {n}.
+Home About Us.
+Service of the poor is the only true service of God and of the country.</p>
+</td></tr></table>
+</body></html>"""
+
+class FixtureSite:
+    """Local pages that fail in scripted ways and record how they were requested"""
+
+    def __init__(self):
+        self.hits = Counter()
+        self.arrivals = []
+        self.active = 0
+        self.max_active = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/flaky', self.flaky)
+        app.router.add_get('/busy', self.busy)
+        app.router.add_get('/down', self.down)
+        app.router.add_get('/missing', self.missing)
+        app.router.add_get('/slow/{n}', self.slow)
+        app.router.add_get('/speech/{n}', self.speech)
+        app.router.add_get('/revalidated', self.revalidated)
+        app.router.add_get('/always-304', self.always_304)
+        return app
+
+    def _hit(self, request) -> int:
+        self.hits[request.path] += 1
+        self.arrivals.append(time.monotonic())
+        return self.hits[request.path]
+
+    async def flaky(self, request):
+        if self._hit(request) <= 2:
+            return web.Response(status=503)
+        return web.Response(text="ok")
+
+    async def busy(self, request):
+        if self._hit(request) == 1:
+            return web.Response(status=429, headers={'Retry-After': '0'})
+        return web.Response(text="ok")
+
+    async def down(self, request):
+        self._hit(request)
+        return web.Response(status=500)
+
+    async def missing(self, request):
+        self._hit(request)
+        return web.Response(status=404)
+
+    async def slow(self, request):
+        self._hit(request)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.05)
+        self.active -= 1
+        return web.Response(text=request.match_info['n'])
+
+    async def speech(self, request):
+        n = int(request.match_info['n'])
+        # The first page answers last, and the second is rate limited once
+        if self._hit(request) == 1 and n == 2:
+            return web.Response(status=429, headers={'Retry-After': '0'})
+        await asyncio.sleep(0.05 if n == 1 else 0)
+        return web.Response(text=SPEECH_PAGE.format(n=n), content_type='text/html')
+
+    async def revalidated(self, request):
+        """304 to any conditional request, whether or not it matches"""
+        self._hit(request)
+        if 'If-None-Match' in request.headers:
+            return web.Response(status=304)
+        return web.Response(text=SPEECH_PAGE.format(n=0), content_type='text/html', headers={'ETag': '"v1"'})
+
+    async def always_304(self, request):
+        self._hit(request)
+        return web.Response(status=304)
+
+def run_with_site(test):
+    """Run test(site, server) against a fresh local server"""
+    async def main():
+        site = FixtureSite()
+        server = TestServer(site.app())
+        await server.start_server()
+        try:
+            return await test(site, server)
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+def url(server, path: str) -> str:
+    return str(server.make_url(path))
+
+def test_retries_5xx_until_success():
+    async def test(site, server):
+        async with AsyncFetcher(rate=100, burst=10, retries=3, backoff=0) as fetcher:
+            result = await fetcher.fetch(url(server, '/flaky'))
+        assert result.status == 200 and result.body == b"ok"
+        assert site.hits['/flaky'] == 3
+        assert fetcher.retry_count == 2
+    run_with_site(test)
+
+def test_retries_429_after_retry_after():
+    async def test(site, server):
+        async with AsyncFetcher(rate=100, burst=10, retries=3, backoff=10) as fetcher:
+            started = time.monotonic()
+            result = await fetcher.fetch(url(server, '/busy'))
+        assert result.status == 200
+        assert site.hits['/busy'] == 2
+        # Retry-After: 0 wins over the 10 s backoff
+        assert time.monotonic() - started < 1
+    run_with_site(test)
+
+def test_gives_up_after_retries():
+    async def test(site, server):
+        async with AsyncFetcher(rate=100, burst=10, retries=2, backoff=0) as fetcher:
+            with pytest.raises(aiohttp.ClientResponseError) as error:
+                await fetcher.fetch(url(server, '/down'))
+        assert error.value.status == 500
+        assert site.hits['/down'] == 3
+    run_with_site(test)
+
+def test_client_errors_are_not_retried():
+    async def test(site, server):
+        async with AsyncFetcher(rate=100, burst=10, retries=3, backoff=0) as fetcher:
+            with pytest.raises(aiohttp.ClientResponseError):
+                await fetcher.fetch(url(server, '/missing'))
+        assert site.hits['/missing'] == 1
+    run_with_site(test)
+
+def test_per_host_concurrency_limit():
+    async def test(site, server):
+        async with AsyncFetcher(per_host=2, rate=1000, burst=100) as fetcher:
+            results = await asyncio.gather(*(fetcher.fetch(url(server, f'/slow/{n}')) for n in range(8)))
+        assert [result.body for result in results] == [str(n).encode() for n in range(8)]
+        assert site.max_active == 2
+    run_with_site(test)
+
+def test_token_bucket_spaces_requests():
+    async def test(site, server):
+        async with AsyncFetcher(per_host=8, rate=20, burst=2) as fetcher:
+            await asyncio.gather(*(fetcher.fetch(url(server, f'/slow/{n}')) for n in range(6)))
+        # Two requests go out in the burst, the other four 1/20 s apart
+        span = site.arrivals[-1] - site.arrivals[0]
+        assert span >= 4 / 20 * 0.9
+    run_with_site(test)
+
+def test_token_bucket_refills_to_capacity():
+    async def test():
+        bucket = TokenBucket(rate=50, capacity=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        assert time.monotonic() - started < 0.02
+        await bucket.acquire()
+        assert time.monotonic() - started >= 1 / 50 * 0.9
+    asyncio.run(test())
+
+def test_scrape_all_speeches_async_parses_pages_in_url_order():
+    async def test(site, server):
+        urls = [url(server, f'/speech/{n}') for n in (1, 2, 3)]
+        quotes = await scrape_all_speeches_async(urls, per_host=3, rate=100, retries=2)
+        return urls, quotes
+    site_urls, quotes = run_with_site(test)
+
+    expected = []
+    for n, page_url in enumerate(site_urls, 1):
+        expected += extract_quotes_from_speech(parse_speech(page_url, SPEECH_PAGE.format(n=n).encode()))
+    assert quotes == expected
+    assert len(quotes) == 9
+    assert "Home About Us" not in quotes
+
+class ForgetfulCache(HttpCache):
+    """A cache that sends validators for a page it no longer holds"""
+
+    def conditional_headers(self, url):
+        return {'If-None-Match': '"v1"'}
+
+def test_304_without_a_cache_entry_refetches_unconditionally(tmp_path):
+    cache = ForgetfulCache(str(tmp_path / "http.sqlite"))
+    async def test(site, server):
+        async with AsyncFetcher(rate=100, burst=10, retries=0) as fetcher:
+            return await fetch_speech_async(fetcher, url(server, '/revalidated'), cache), site
+    (status, speech_data), site = run_with_site(test)
+    assert status == 200
+    assert site.hits['/revalidated'] == 2
+    assert speech_data['title'] == "Speech 0"
+    assert cache.get(speech_data['url']).body.startswith(b"<html>")
+
+def test_304_for_an_unconditional_request_is_an_error(tmp_path):
+    cache = HttpCache(str(tmp_path / "http.sqlite"))
+    async def test(site, server):
+        async with AsyncFetcher(rate=100, burst=10, retries=0) as fetcher:
+            with pytest.raises(ValueError):
+                await fetch_speech_async(fetcher, url(server, '/always-304'), cache)
+        assert site.hits['/always-304'] == 1
+        return url(server, '/always-304')
+    page_url = run_with_site(test)
+    # The empty 304 body is never parsed or cached
+    assert cache.get(page_url) is None
+
+def test_304_is_answered_from_the_cache(tmp_path):
+    cache = HttpCache(str(tmp_path / "http.sqlite"))
+    page_url = "https://example.org/speech.php"
+    html = SPEECH_PAGE.format(n=4).encode()
+    cache.store(page_url, html, {'ETag': '"v1"'})
+    assert speech_from_response(page_url, 304, b"", {}, cache)['title'] == "Speech 4"
+    assert speech_from_response("https://example.org/other.php", 304, b"", {}, cache) is None
+    assert speech_from_response(page_url, 304, b"", {}, None) is None
@@ -0,0 +1,111 @@
+import asyncio
+import json
+from collections import Counter
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer, unused_port
+
+from crawler import MAX_PAGE_ATTEMPTS, Crawler
+
+INDEX_PAGE = """<html><head><title>Speeches</title></head><body>
+<a href="/speeches/a.php">A</a> <a href="/speeches/b.php">B</a> <a href="/speeches/c.php#top">C</a>
+<a href="https://elsewhere.example/speeches/d.php">D</a>
+</body></html>"""
+
+SPEECH_PAGE = """<html><head><title>Speech {name}</title></head><body><table><tr><td>
+<p>Truth is the one thing I believe in with all my heart, says speech {name}.
+Service of the poor is the only true service of God, says speech {name}.</p>
+</td></tr></table></body></html>"""
+
+class Site:
+    def __init__(self, failures: int = 0):
+        # How many more times /speeches/b.php fails
+        self.failures = failures
+        self.hits = Counter()
+        # Fixed so a resumed crawl sees the same index URL
+        self.port = unused_port()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/index.php', self.index)
+        app.router.add_get('/speeches/{name}.php', self.speech)
+        return app
+
+    async def index(self, request):
+        self.hits[request.path] += 1
+        return web.Response(text=INDEX_PAGE, content_type='text/html')
+
+    async def speech(self, request):
+        self.hits[request.path] += 1
+        name = request.match_info['name']
+        if name == 'b' and self.failures:
+            self.failures -= 1
+            return web.Response(status=500)
+        return web.Response(text=SPEECH_PAGE.format(name=name), content_type='text/html')
+
+def crawl(site, frontier_path):
+    async def main():
+        server = TestServer(site.app(), port=site.port)
+        await server.start_server()
+        try:
+            crawler = Crawler(str(server.make_url('/index.php')), frontier_path, workers=2,
+                              rate=1000, retries=0)
+            quotes = await crawler.run()
+            return crawler, quotes
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+def read_frontier(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def test_crawls_every_speech_page(tmp_path):
+    site = Site()
+    crawler, quotes = crawl(site, str(tmp_path / "frontier.json"))
+    assert {url.rsplit('/', 1)[-1] for url in crawler.visited} == {'index.php', 'a.php', 'b.php', 'c.php'}
+    assert len(quotes) == 6
+    assert site.hits['/speeches/b.php'] == 1
+
+def test_failed_page_is_retried_in_the_same_run(tmp_path):
+    site = Site(failures=MAX_PAGE_ATTEMPTS - 1)
+    crawler, quotes = crawl(site, str(tmp_path / "frontier.json"))
+    assert site.hits['/speeches/b.php'] == MAX_PAGE_ATTEMPTS
+    assert len(quotes) == 6
+    assert read_frontier(crawler.frontier_path)['failed'] == {}
+
+def test_page_that_keeps_failing_is_retried_on_resume(tmp_path):
+    frontier_path = str(tmp_path / "frontier.json")
+    site = Site(failures=MAX_PAGE_ATTEMPTS)
+    crawler, quotes = crawl(site, frontier_path)
+    assert len(quotes) == 4
+    failed = read_frontier(frontier_path)['failed']
+    assert [url.rsplit('/', 1)[-1] for url in failed] == ['b.php']
+    assert failed[next(iter(failed))] == MAX_PAGE_ATTEMPTS
+
+    site.hits.clear()
+    crawler, quotes = crawl(site, frontier_path)
+    assert dict(site.hits) == {'/speeches/b.php': 1}
+    assert len(quotes) == 6
+    assert read_frontier(frontier_path)['failed'] == {}
+
+def test_pages_recrawled_after_a_crash_are_recorded_once(tmp_path):
+    frontier_path = str(tmp_path / "frontier.json")
+    site = Site()
+    crawler, _ = crawl(site, frontier_path)
+
+    # As if the run stopped after crawling a.php but before the frontier was saved
+    state = read_frontier(frontier_path)
+    page_a = next(url for url in state['visited'] if url.endswith('/a.php'))
+    state['visited'].remove(page_a)
+    state['pending'].append(page_a)
+    with open(frontier_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+    site.hits.clear()
+    crawler, quotes = crawl(site, frontier_path)
+    assert dict(site.hits) == {'/speeches/a.php': 1}
+    assert len(quotes) == 6
+    with open(crawler.quotes_path, 'r', encoding='utf-8') as f:
+        urls = [json.loads(line)['url'] for line in f]
+    assert len(urls) == len(set(urls)) == 4
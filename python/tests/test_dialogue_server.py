@@ -0,0 +1,90 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from dialogue_server import DEFAULT_ALLOW_ORIGIN, DialogueServer, StubUpstream, TTLCache
+
+MODEL = "ft:gpt-4o-mini-2024-07-18:org:gandhi-vn:abc123"
+
+def payload(text="Tell me about truth.", **extra):
+    return dict({'model': "gpt-4o-mini", 'messages': [{'role': 'user', 'content': text}]}, **extra)
+
+def make_server(ttl=3600.0, delay=0.0, **options):
+    upstream = StubUpstream(delay=delay)
+    return DialogueServer(upstream, MODEL, TTLCache(ttl=ttl), rate=1000, burst=100, **options), upstream
+
+def test_identical_request_is_a_cache_hit():
+    async def test():
+        server, upstream = make_server()
+        first, first_status = await server.complete(payload())
+        # Fields outside the cache key don't make a new request
+        second, second_status = await server.complete(payload(user="player-2", stream=True))
+        other, other_status = await server.complete(payload("Tell me about love."))
+        assert (first_status, second_status, other_status) == ('MISS', 'HIT', 'MISS')
+        assert second.body == first.body
+        assert other.body != first.body
+        assert upstream.calls == 2
+        assert server.stats['hits'] == 1
+    asyncio.run(test())
+
+def test_entries_expire_after_ttl():
+    async def test():
+        server, upstream = make_server(ttl=0.05)
+        _, status = await server.complete(payload())
+        assert status == 'MISS'
+        _, status = await server.complete(payload())
+        assert status == 'HIT'
+        await asyncio.sleep(0.1)
+        _, status = await server.complete(payload())
+        assert status == 'MISS'
+        assert upstream.calls == 2
+    asyncio.run(test())
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    async def test():
+        server, upstream = make_server(delay=0.05)
+        replies = await asyncio.gather(*(server.complete(payload()) for _ in range(5)))
+        statuses = sorted(status for _, status in replies)
+        assert statuses == ['COALESCED'] * 4 + ['MISS']
+        assert len({response.body for response, _ in replies}) == 1
+        assert upstream.calls == 1
+        assert server.in_flight == {}
+    asyncio.run(test())
+
+def test_upstream_is_asked_for_the_fine_tuned_model():
+    async def test():
+        server, _ = make_server()
+        response, _ = await server.complete(payload())
+        assert b'"model": "' + MODEL.encode() + b'"' in response.body
+    asyncio.run(test())
+
+def request_cors(server, method, origin):
+    async def test():
+        client = TestClient(TestServer(server.app()))
+        await client.start_server()
+        try:
+            response = await client.request(method, "/v1/chat/completions",
+                                            json=payload() if method == 'POST' else None,
+                                            headers={'Origin': origin})
+            await response.read()
+            return response.status, response.headers
+        finally:
+            await client.close()
+    return asyncio.run(test())
+
+def test_cors_allows_only_the_configured_origin():
+    server, _ = make_server()
+    status, headers = request_cors(server, 'POST', DEFAULT_ALLOW_ORIGIN)
+    assert status == 200
+    assert headers['Access-Control-Allow-Origin'] == DEFAULT_ALLOW_ORIGIN
+
+    status, headers = request_cors(server, 'OPTIONS', "https://evil.example")
+    assert status == 204
+    assert 'Access-Control-Allow-Origin' not in headers
+
+def test_cors_origin_is_configurable():
+    server, _ = make_server(allow_origins=["https://gandhi.example"])
+    _, headers = request_cors(server, 'OPTIONS', "https://gandhi.example")
+    assert headers['Access-Control-Allow-Origin'] == "https://gandhi.example"
+    _, headers = request_cors(server, 'OPTIONS', DEFAULT_ALLOW_ORIGIN)
+    assert 'Access-Control-Allow-Origin' not in headers
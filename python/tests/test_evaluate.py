@@ -0,0 +1,39 @@
+import asyncio
+
+from evaluate import OpenAIBackend, ReplyCache, load_eval_cases, run_cases, summarize
+from fake_openai import FakeAsyncOpenAI
+from tokens import Tokenizer
+
+MODEL = "ft:gpt-4o-mini-2024-07-18:personal:gandhi-vn:ftjob-fake1"
+
+def evaluate(client, cases, cache, **settings):
+    backend = OpenAIBackend(client=client, **settings)
+    return asyncio.run(run_cases(backend, MODEL, cases, cache))
+
+def test_harness_scores_fake_replies(tmp_path, training_file):
+    cases = load_eval_cases(training_file())
+    client = FakeAsyncOpenAI()
+    replies = evaluate(client, cases, None, max_tokens=3)
+    assert [reply.text for reply in replies] == ["Truth is God,"] * 2
+    summary = summarize(cases, replies, Tokenizer())
+    assert summary['cases'] == 2 and summary['failed'] == 0
+    assert summary['tokens_per_response'] == 3
+    assert [call['max_tokens'] for call in client.chat.completions.calls] == [3, 3]
+
+def test_reply_cache_is_keyed_by_backend_settings(tmp_path, training_file):
+    cases = load_eval_cases(training_file())
+    cache = ReplyCache(str(tmp_path / "eval.sqlite"))
+    client = FakeAsyncOpenAI()
+    calls = client.chat.completions.calls
+
+    first = evaluate(client, cases, cache, temperature=0.7)
+    assert not any(reply.cached for reply in first) and len(calls) == 2
+    again = evaluate(client, cases, cache, temperature=0.7)
+    assert all(reply.cached for reply in again) and len(calls) == 2
+
+    for settings in ({'temperature': 0.0}, {'max_tokens': 5}, {'base_url': "http://localhost:8080/v1"}):
+        replies = evaluate(client, cases, cache, **settings)
+        assert not any(reply.cached for reply in replies)
+    assert len(calls) == 8
+    assert evaluate(client, cases, cache, temperature=0.0)[0].text.endswith("temperature 0.0.")
+    cache.close()
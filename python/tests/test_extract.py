@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import extract
+from bench import write_pdf
+from extract import IN_FLIGHT_PER_WORKER, RANGES_PER_WORKER, iter_pdf_pages
+
+PAGES = 16
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = str(tmp_path / "letters.pdf")
+    write_pdf([[f"Page {n} of the letters.", "Truth is God."] for n in range(PAGES)], path)
+    return path
+
+class CountingPool(ThreadPoolExecutor):
+    """Thread pool standing in for the process pool, counting submitted ranges"""
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        CountingPool.submitted += 1
+        return super().submit(*args, **kwargs)
+
+def test_parallel_pages_match_serial(pdf_path):
+    serial = list(iter_pdf_pages(pdf_path))
+    assert len(serial) == PAGES
+    assert list(iter_pdf_pages(pdf_path, workers=2)) == serial
+
+def test_only_a_window_of_ranges_is_in_flight(pdf_path, monkeypatch):
+    monkeypatch.setattr(extract, 'ProcessPoolExecutor', CountingPool)
+    CountingPool.submitted = 0
+    workers = 2
+    pages = iter_pdf_pages(pdf_path, workers=workers)
+
+    first = next(pages)
+    assert "Page 0" in first
+    window = workers * IN_FLIGHT_PER_WORKER
+    assert workers * RANGES_PER_WORKER > window + 1
+    # The window, plus one range submitted when the first was taken
+    assert CountingPool.submitted == window + 1
+    assert len(list(pages)) == PAGES - 1
+    assert CountingPool.submitted == workers * RANGES_PER_WORKER
+
+def test_streaming_without_cache_parses_the_pdf_once(pdf_path, tmp_path, monkeypatch):
+    opened = []
+    reader = extract.PyPDF2.PdfReader
+    monkeypatch.setattr(extract.PyPDF2, 'PdfReader', lambda file: opened.append(file) or reader(file))
+    count = extract.run_streaming_pipeline(pdf_path, str(tmp_path / "out"), min_score=None)
+    assert len(opened) == 1
+
+    cache = extract.PageCache(str(tmp_path / "pages.db"))
+    assert extract.run_streaming_pipeline(pdf_path, str(tmp_path / "cached"), cache=cache, min_score=None) == count
+    with open(tmp_path / "out" / "gandhi_training.jsonl", 'rb') as a, \
+            open(tmp_path / "cached" / "gandhi_training.jsonl", 'rb') as b:
+        assert a.read() == b.read()
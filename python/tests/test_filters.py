@@ -0,0 +1,30 @@
+import json
+import sys
+
+import extract
+from bench import letter_lines, write_pdf
+from filters import SPEECH_FILTER
+
+def test_reset_clears_hit_counts():
+    SPEECH_FILTER.reset()
+    SPEECH_FILTER.accepts("Truth and non-violence are the law of our being and of our freedom.")
+    SPEECH_FILTER.accepts("Home")
+    assert SPEECH_FILTER.rule_counts() == {'accepted': 1, 'too_short': 1}
+    SPEECH_FILTER.reset()
+    assert SPEECH_FILTER.rule_counts() == {}
+
+def run_extract(monkeypatch, pdf_path, report_path):
+    monkeypatch.setattr(sys, 'argv', ["extract.py", pdf_path, "--no-store", "--no-scoring",
+                                      "--metrics", report_path])
+    extract.main()
+    with open(report_path, 'r', encoding='utf-8') as f:
+        return json.load(f)['counters']
+
+def test_repeated_runs_report_their_own_filter_counts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_pdf(letter_lines(1)[:20], "letters.pdf")
+    first = run_extract(monkeypatch, "letters.pdf", "first.json")
+    second = run_extract(monkeypatch, "letters.pdf", "second.json")
+    assert first['sentences'] > 0
+    assert second['sentences'] == first['sentences']
+    assert second['filter.accepted'] == first['filter.accepted']
@@ -0,0 +1,42 @@
+import tracemalloc
+
+import pytest
+
+from metrics import Metrics
+
+MB = 2**20
+
+@pytest.fixture
+def traced(tmp_path):
+    run = Metrics("test", str(tmp_path / "metrics.json"), trace_memory=True)
+    yield run
+    tracemalloc.stop()
+
+def test_inner_stage_keeps_outer_peak(traced):
+    with traced.stage("outer"):
+        block = bytearray(40 * MB)
+        del block
+        with traced.stage("inner"):
+            pass
+    assert traced.stages['outer']['traced_peak_mb'] >= 40
+    assert traced.stages['outer/inner']['traced_peak_mb'] < 40
+
+def test_outer_peak_includes_inner_allocations(traced):
+    with traced.stage("outer"):
+        with traced.stage("inner"):
+            block = bytearray(20 * MB)
+            del block
+        with traced.stage("empty"):
+            pass
+    assert traced.stages['outer/inner']['traced_peak_mb'] >= 20
+    assert traced.stages['outer/empty']['traced_peak_mb'] < 20
+    assert traced.stages['outer']['traced_peak_mb'] >= 20
+
+def test_stages_record_time_and_calls(tmp_path):
+    run = Metrics("test", str(tmp_path / "metrics.json"))
+    for _ in range(2):
+        with run.stage("step"):
+            run.count("items", 3)
+    assert run.stages['step']['calls'] == 2
+    assert 'traced_peak_mb' not in run.stages['step']
+    assert run.counters['items'] == 6
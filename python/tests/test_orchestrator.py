@@ -0,0 +1,109 @@
+import asyncio
+
+from fake_openai import FakeAsyncOpenAI
+from orchestrator import JobSpec, Orchestrator, load_state
+
+MODEL = "gpt-4o-mini-2024-07-18"
+
+def run(client, state_path, specs):
+    orchestrator = Orchestrator(client, state_path, min_poll=0, max_poll=0)
+    return asyncio.run(orchestrator.run(specs))
+
+def test_completes_and_reruns_without_new_job(tmp_path, training_file):
+    client = FakeAsyncOpenAI()
+    state = str(tmp_path / "state.json")
+    spec = JobSpec("main", training_file(), model=MODEL)
+
+    first = run(client, state, [spec])['main']
+    assert first['status'] == 'succeeded'
+    assert first['fine_tuned_model'].startswith(f"ft:{MODEL}")
+
+    again = run(client, state, [spec])['main']
+    assert again['job_id'] == first['job_id']
+    assert len(client.fine_tuning.jobs.jobs) == 1
+
+def test_changed_training_file_starts_new_job(tmp_path, training_file):
+    client = FakeAsyncOpenAI()
+    state = str(tmp_path / "state.json")
+    path = training_file()
+    first = run(client, state, [JobSpec("main", path, model=MODEL)])['main']
+
+    training_file(["Truth is God.", "An eye for an eye makes the whole world blind."])
+    second = run(client, state, [JobSpec("main", path, model=MODEL)])['main']
+    assert second['status'] == 'succeeded'
+    assert second['job_id'] != first['job_id']
+    assert second['fine_tuned_model'] != first['fine_tuned_model']
+    assert len(client.files.files) == 2
+
+def test_changed_hyperparameters_start_new_job(tmp_path, training_file):
+    client = FakeAsyncOpenAI()
+    state = str(tmp_path / "state.json")
+    path = training_file()
+    first = run(client, state, [JobSpec("main", path, model=MODEL, n_epochs=2)])['main']
+    second = run(client, state, [JobSpec("main", path, model=MODEL, n_epochs=3)])['main']
+    assert second['job_id'] != first['job_id']
+    # Same file content, so it is not uploaded again
+    assert len(client.files.files) == 1
+
+def test_resumes_running_job(tmp_path, training_file):
+    client = FakeAsyncOpenAI()
+    state = str(tmp_path / "state.json")
+    spec = JobSpec("main", training_file(), model=MODEL)
+
+    # First process creates the job and is stopped before it finishes
+    interrupted = Orchestrator(client, state, min_poll=0, max_poll=0)
+    created = asyncio.run(interrupted.start_job(spec))
+    assert created['status'] not in ('succeeded', 'failed')
+
+    resumed = run(client, state, [spec])['main']
+    assert resumed['job_id'] == created['job_id']
+    assert resumed['status'] == 'succeeded'
+    assert len(client.fine_tuning.jobs.jobs) == 1
+
+def test_failed_job_is_retried(tmp_path, training_file):
+    client = FakeAsyncOpenAI(fail_models=[MODEL])
+    state = str(tmp_path / "state.json")
+    spec = JobSpec("main", training_file(), model=MODEL)
+
+    failed = run(client, state, [spec])['main']
+    assert failed['status'] == 'failed'
+    assert failed['fine_tuned_model'] is None
+
+    client.fail_models.clear()
+    retried = run(client, state, [spec])['main']
+    assert retried['status'] == 'succeeded'
+    assert retried['job_id'] != failed['job_id']
+    archived = load_state(state)['archived']
+    assert [record['job_id'] for record in archived] == [failed['job_id']]
+
+def test_records_by_name(tmp_path, training_file):
+    client = FakeAsyncOpenAI()
+    state = str(tmp_path / "state.json")
+    specs = [JobSpec("a", training_file(), model=MODEL),
+             JobSpec("b", training_file(["Be the change."], name="b.jsonl"), model=MODEL)]
+    results = run(client, state, specs)
+    orchestrator = Orchestrator(client, state)
+    assert orchestrator.records(specs) == results
+
+def test_one_failed_upload_does_not_stop_the_others(tmp_path, training_file, monkeypatch):
+    client = FakeAsyncOpenAI()
+    state = str(tmp_path / "state.json")
+    bad = training_file(["Be the change."], name="bad.jsonl")
+    specs = [JobSpec("good", training_file(), model=MODEL), JobSpec("bad", bad, model=MODEL)]
+    create = client.files.create
+
+    async def reject_bad(file, purpose):
+        if file.name == bad:
+            raise RuntimeError("upload rejected")
+        return await create(file=file, purpose=purpose)
+
+    monkeypatch.setattr(client.files, 'create', reject_bad)
+    results = run(client, state, specs)
+    assert results['good']['status'] == 'succeeded'
+    assert results['bad']['status'] == 'error'
+    assert results['bad']['error'] == "RuntimeError: upload rejected"
+    assert Orchestrator(client, state).records(specs) == results
+
+    # The next run starts the errored spec again
+    monkeypatch.setattr(client.files, 'create', create)
+    assert run(client, state, specs)['bad']['status'] == 'succeeded'
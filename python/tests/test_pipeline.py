@@ -0,0 +1,39 @@
+import pytest
+
+from bench import letter_lines, write_pdf
+from pipeline import Selection, Source, run, select_quotes
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_pdf(letter_lines(1)[:20], "letters.pdf")
+    return tmp_path
+
+def build(pdf_path, **options):
+    run(pdf_path, [], "training.jsonl", "state.json", offline=True, validate=False, **options)
+    with open("training.jsonl", 'r', encoding='utf-8') as f:
+        return f.readlines()
+
+def test_pdf_quotes_come_back_after_a_run_without_the_pdf(workdir):
+    first = build("letters.pdf")
+    assert len(first) > 0
+    assert build(None) == []
+    assert build("letters.pdf") == first
+
+def test_rerun_with_unchanged_inputs_keeps_the_output(workdir):
+    first = build("letters.pdf")
+    assert build("letters.pdf") == first
+
+def test_select_quotes_drops_near_duplicates_and_low_scorers():
+    original = "Truth never damages a cause that is just, and a just cause needs no lies to defend it."
+    near_copy = original.replace("lies", "lie")
+    sources = [Source("a", "x", [original]), Source("b", "y", [near_copy, "ok"])]
+    assert select_quotes(sources, Selection(scoring=False)) == [[original], ["ok"]]
+    assert select_quotes(sources, Selection(near_dup_threshold=0, scoring=False)) == [[original], [near_copy, "ok"]]
+    assert select_quotes(sources, Selection(min_score=1.0)) == [[original], []]
+
+def test_selection_options_invalidate_the_state(workdir):
+    first = build("letters.pdf", selection=Selection(scoring=False))
+    fewer = build("letters.pdf", selection=Selection(top_n=3))
+    assert len(fewer) < len(first)
+    assert build("letters.pdf", selection=Selection(scoring=False)) == first
@@ -0,0 +1,39 @@
+import time
+
+from quote_store import QuoteStore, pdf_source
+from scrape import merge_with_existing_data
+
+def make_store(tmp_path):
+    return QuoteStore(str(tmp_path / "quotes.sqlite"))
+
+def test_prune_drops_quotes_a_source_no_longer_yields(tmp_path):
+    store = make_store(tmp_path)
+    store.add_many([("Old page one quote.", pdf_source("letters.pdf", 0)),
+                    ("Kept quote.", pdf_source("letters.pdf", 1)),
+                    ("Other pdf quote.", pdf_source("letters2.pdf", 0))])
+
+    started = time.time()
+    store.add_many([("Kept quote.", pdf_source("letters.pdf", 1))])
+    assert store.prune(pdf_source("letters.pdf"), started) == 1
+    assert store.texts() == ["Kept quote.", "Other pdf quote."]
+
+def test_prune_matches_whole_source_names(tmp_path):
+    store = make_store(tmp_path)
+    store.add_many([("Speech one.", "https://example.org/speech1"),
+                    ("Speech ten.", "https://example.org/speech10")])
+    started = time.time()
+    assert store.prune("https://example.org/speech1", started) == 1
+    assert store.texts() == ["Speech ten."]
+
+def test_merge_reads_this_runs_web_quotes_then_pdf_quotes(tmp_path):
+    store = make_store(tmp_path)
+    store.add_many([("Stale web quote from an earlier run.", "https://example.org/old"),
+                    ("A quote from the letters.", pdf_source("letters.pdf", 0))])
+    store.add_many([("A quote from today's speech.", "https://example.org/new")])
+
+    merged = merge_with_existing_data(["A quote from today's speech."], str(tmp_path / "missing.txt"),
+                                      near_dup_threshold=0, store=store)
+    assert merged == ["A quote from today's speech.", "A quote from the letters."]
+    # Nothing is re-tagged or re-added by the merge
+    assert store.count("web") == 0
+    assert store.count() == 3
@@ -0,0 +1,46 @@
+import pytest
+
+import retrieval
+from quote_store import QuoteStore
+from retrieval import load_or_build
+
+QUOTES = ["Truth is God.", "Love is the law of life.", "Prayer is the key of the morning."]
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "index"), str(tmp_path / "quotes.sqlite"), str(tmp_path / "quotes.txt")
+
+def fill_store(store_path, quotes):
+    store = QuoteStore(store_path)
+    store.add_many((quote, "test") for quote in quotes)
+    store.close()
+
+def test_current_index_is_opened_without_reading_quotes(paths, monkeypatch):
+    index_dir, store_path, quotes_file = paths
+    fill_store(store_path, QUOTES)
+    assert load_or_build(index_dir, store_path, quotes_file).search("love")[0].text == QUOTES[1]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("quotes were read for a current index")
+    monkeypatch.setattr(retrieval, 'load_quotes', fail)
+    monkeypatch.setattr(QuoteStore, 'texts', fail)
+    assert load_or_build(index_dir, store_path, quotes_file).meta['quotes'] == 3
+
+def test_new_store_quote_rebuilds(paths):
+    index_dir, store_path, quotes_file = paths
+    fill_store(store_path, QUOTES)
+    load_or_build(index_dir, store_path, quotes_file)
+    fill_store(store_path, ["Service without humility is selfishness."])
+    index = load_or_build(index_dir, store_path, quotes_file)
+    assert index.meta['quotes'] == 4
+    assert index.search("humility")[0].text == "Service without humility is selfishness."
+
+def test_changed_quotes_file_rebuilds(paths):
+    index_dir, store_path, quotes_file = paths
+    with open(quotes_file, 'w', encoding='utf-8') as f:
+        f.write("1. Truth is God.\n\n2. Love is the law of life.\n\n")
+    assert load_or_build(index_dir, store_path, quotes_file).meta['quotes'] == 2
+
+    with open(quotes_file, 'a', encoding='utf-8') as f:
+        f.write("3. Prayer is the key of the morning.\n\n")
+    assert load_or_build(index_dir, store_path, quotes_file).meta['quotes'] == 3
@@ -0,0 +1,33 @@
+import scrape
+from http_cache import HttpCache
+
+PAGE = b"<html><head><title>Speech</title></head><body><p>Truth is God.</p></body></html>"
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+def test_uncached_304_is_fetched_again_without_validators(tmp_path, monkeypatch):
+    cache = HttpCache(str(tmp_path / "http.sqlite"))
+    url = "https://example.org/speech.php"
+    cache.store(url, PAGE, {'ETag': '"v1"'})
+    sent = []
+
+    def get(request_url, headers, timeout):
+        sent.append(dict(headers))
+        # The entry disappears before the 304 arrives
+        cache.conn.execute("DELETE FROM responses")
+        if headers:
+            return FakeResponse(304)
+        return FakeResponse(200, PAGE, {'ETag': '"v2"'})
+    monkeypatch.setattr(scrape.requests, 'get', get)
+
+    speech_data = scrape.scrape_speech(url, cache)
+    assert sent == [{'If-None-Match': '"v1"'}, {}]
+    assert speech_data['title'] == "Speech"
+    assert cache.get(url).etag == '"v2"'
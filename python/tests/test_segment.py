@@ -0,0 +1,45 @@
+from collections import Counter
+
+import pytest
+
+from bench import letter_lines
+from extract import clean_text, iter_letters, iter_quote_spans, iter_quotes, letter_strategy
+from segment import BOUNDARY_PATTERN, count_boundaries, join_pages, segment_letters, sentence_spans
+
+def sentences(text):
+    return [text[start:end] for start, end in sentence_spans(text)]
+
+def test_no_is_an_abbreviation_only_before_a_number():
+    assert sentences("I said no. No one came to the meeting.") == [
+        "I said no", "No one came to the meeting."]
+    assert sentences("See letter No. 5 about the march. Nos. 6 and 7 followed.") == [
+        "See letter No. 5 about the march", "Nos. 6 and 7 followed."]
+
+def test_initials_are_uppercase_letters_only():
+    assert sentences("R. L. Khipple compiled the letters. Then they were printed.") == [
+        "R. L. Khipple compiled the letters", "Then they were printed."]
+    assert sentences("The answer is in part a. Then we go on.") == [
+        "The answer is in part a", "Then we go on."]
+
+@pytest.fixture(scope="module")
+def pages():
+    return [clean_text(' '.join(lines)) for lines in letter_lines(1)]
+
+def test_count_boundaries_matches_a_scan_of_the_joined_text(pages):
+    text, _ = join_pages(pages)
+    expected = Counter(match.lastgroup for match in BOUNDARY_PATTERN.finditer(text))
+    assert count_boundaries(pages) == expected
+    # Matches near a page edge are counted once, with the next page in view
+    assert count_boundaries(["Sent on", "12/3/1931 with love."]) == Counter(date=1)
+    assert count_boundaries(["x" * 100 + " 12/3/1931", "Dear Friend, I write."]) == Counter(date=1, salutation=1)
+
+@pytest.mark.parametrize("max_letter_chars", [5000, 600])
+def test_streamed_quotes_match_the_batch_path(pages, max_letter_chars):
+    text, page_starts = join_pages(pages)
+    strategy, letters = segment_letters(text, page_starts)
+    batch = [text[span.start:span.end] for span in iter_quote_spans(text, letters, page_starts)]
+
+    assert letter_strategy(pages) == strategy
+    streamed = [quote for _, quote in iter_quotes(iter_letters(pages, strategy, max_letter_chars))]
+    assert len(batch) > 100
+    assert streamed == batch
@@ -0,0 +1,22 @@
+import sys
+
+import pytest
+
+import shards
+from scrape import make_training_examples
+
+def verify(monkeypatch, manifest):
+    monkeypatch.setattr(sys, 'argv', ["shards.py", "--verify", manifest])
+    shards.main()
+
+def test_verify_exits_nonzero_on_a_changed_shard(tmp_path, monkeypatch):
+    quotes = [f"Truth is God, and this is letter number {n}." for n in range(20)]
+    manifest = shards.write_shards(quotes, make_training_examples, str(tmp_path))
+    manifest_file = shards.manifest_path(str(tmp_path), "combined_gandhi")
+    verify(monkeypatch, manifest_file)
+
+    with open(tmp_path / manifest['shards'][0]['path'], 'a', encoding='utf-8') as f:
+        f.write('\n')
+    with pytest.raises(SystemExit) as exit_info:
+        verify(monkeypatch, manifest_file)
+    assert exit_info.value.code == 1
@@ -0,0 +1,68 @@
+from fake_openai import FakeAsyncOpenAI
+from sweep import expand_grid, run_sweep, state_path_for
+
+MODEL = "gpt-4o-mini-2024-07-18"
+
+def make_grid(train, valid, **extra):
+    return dict({
+        "models": [MODEL],
+        "n_epochs": [2, 4],
+        "datasets": {"letters": {"training_file": train, "validation_file": valid}},
+        "max_jobs": 2,
+    }, **extra)
+
+def sweep(grid, client, state):
+    return run_sweep(grid, client, state, min_poll=0)
+
+def test_expand_grid_names_every_point(training_file):
+    grid = make_grid(training_file(), None, learning_rate_multipliers=[0.5, 2])
+    names = [spec.name for _, spec in expand_grid(grid)]
+    assert names == ["letters-4o-mini-e2-lr0.5", "letters-4o-mini-e2-lr2",
+                     "letters-4o-mini-e4-lr0.5", "letters-4o-mini-e4-lr2"]
+
+def test_sweep_collects_losses_and_picks_cheapest_winner(tmp_path, training_file):
+    grid = make_grid(training_file(), training_file(name="valid.jsonl"), loss_target=10)
+    rows, winner = sweep(grid, FakeAsyncOpenAI(), str(tmp_path / "state.json"))
+    assert [row['status'] for row in rows] == ['succeeded', 'succeeded']
+    assert all(row['train_loss'] is not None and row['valid_loss'] is not None for row in rows)
+    assert all(row['fine_tuned_model'] for row in rows)
+    # Two epochs bill half the tokens of four
+    assert winner['name'] == "letters-4o-mini-e2"
+
+def test_failed_jobs_are_reported_and_never_win(tmp_path, training_file):
+    grid = make_grid(training_file(), None, loss_target=10)
+    rows, winner = sweep(grid, FakeAsyncOpenAI(fail_models=[MODEL]), str(tmp_path / "state.json"))
+    assert [row['status'] for row in rows] == ['failed', 'failed']
+    assert winner is None
+
+def test_rerun_reuses_jobs_until_the_data_changes(tmp_path, training_file):
+    client = FakeAsyncOpenAI()
+    state = str(tmp_path / "state.json")
+    train = training_file()
+    grid = make_grid(train, None)
+
+    first, _ = sweep(grid, client, state)
+    again, _ = sweep(grid, client, state)
+    assert [row['fine_tuned_model'] for row in again] == [row['fine_tuned_model'] for row in first]
+    assert len(client.fine_tuning.jobs.jobs) == 2
+
+    training_file(["Truth is God.", "The weak can never forgive."])
+    changed, _ = sweep(grid, client, state)
+    assert [row['status'] for row in changed] == ['succeeded', 'succeeded']
+    assert not {row['fine_tuned_model'] for row in changed} & {row['fine_tuned_model'] for row in first}
+    assert len(client.fine_tuning.jobs.jobs) == 4
+
+def test_max_cost_refuses_to_start(tmp_path, training_file):
+    client = FakeAsyncOpenAI()
+    rows, winner = run_sweep(make_grid(training_file(), None), client, str(tmp_path / "state.json"),
+                             max_cost=0)
+    assert (rows, winner) == ([], None)
+    assert client.fine_tuning.jobs.jobs == {}
+
+def test_each_grid_gets_its_own_state_file(tmp_path):
+    small = state_path_for(str(tmp_path / "small.json"))
+    large = state_path_for(str(tmp_path / "large.json"))
+    other_small = state_path_for(str(tmp_path / "other" / "small.json"))
+    assert len({small, large, other_small}) == 3
+    assert state_path_for(str(tmp_path / "small.json")) == small
+    assert "small-" in small
@@ -0,0 +1,16 @@
+import json
+
+from validate import check_example, collect_errors
+
+def test_unhashable_role_is_an_error_not_a_crash():
+    data = {"messages": [{"role": ["x"], "content": "a"}, {"role": "assistant", "content": "b"}]}
+    assert check_example(data) == ["Message 0: invalid role ['x']"]
+
+def test_bad_role_is_reported_per_line_across_workers(training_file):
+    path = training_file(["Truth is God."] * 8)
+    with open(path, 'a', encoding='utf-8') as f:
+        messages = [{"role": {"name": "user"}, "content": "a"}, {"role": "assistant", "content": "b"}]
+        f.write(json.dumps({"messages": messages}) + '\n')
+    valid_count, errors = collect_errors(path, workers=2)
+    assert valid_count == 8
+    assert errors == [(9, "Message 0: invalid role {'name': 'user'}")]
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Token counting and cost estimation for fine-tuning files
+Counts the tokens of every example before finetune.py uploads anything,
+reports totals, a length histogram, billed training tokens and cost, and
+flags examples over the model's context limit. Oversized examples can be
+trimmed, split or dropped offline with --fix.
+
+Uses tiktoken when it is installed and its encoding can be loaded, and a
+~4 characters per token estimate otherwise.
+"""
+
+import argparse
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_MODEL = "gpt-4o-mini-2024-07-18"
+DEFAULT_EPOCHS = 3
+
+# Max tokens per training example
+CONTEXT_LIMITS = {
+    "gpt-4o-mini-2024-07-18": 65536,
+    "gpt-4o-2024-08-06": 65536,
+    "gpt-3.5-turbo": 16385,
+}
+MAX_TOKENS_PER_EXAMPLE = CONTEXT_LIMITS[DEFAULT_MODEL]
+
+# USD per 1M training tokens
+TRAINING_PRICES = {
+    "gpt-4o-mini-2024-07-18": 3.00,
+    "gpt-4o-2024-08-06": 25.00,
+    "gpt-3.5-turbo": 8.00,
+}
+
+# Extra tokens OpenAI's chat format adds per message and per reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+HISTOGRAM_EDGES = [0, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536]
+
+BATCH_SIZE = 1000
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about 4 characters per token for English"""
+    return max(1, (len(text) + 3) // 4)
+
+def _encoding_name(model: str) -> str:
+    return "o200k_base" if model.startswith("gpt-4o") else "cl100k_base"
+
+@lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    """tiktoken encoding, or None; warns once when it can't be loaded"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # The encoding file is downloaded on first use
+        print(f"tiktoken encoding unavailable ({e.__class__.__name__}), estimating tokens")
+        return None
+
+class Tokenizer:
+    """Counts message tokens with tiktoken, or estimates them without it"""
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        self.model = model
+        self.encoding = _load_encoding(_encoding_name(model))
+        self.name = self.encoding.name if self.encoding is not None else "estimate"
+        # System and user prompts repeat across thousands of examples
+        self.count_cached = lru_cache(maxsize=8192)(self.count)
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return estimate_tokens(text)
+        return len(self.encoding.encode_ordinary(text))
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """Count many unique texts at once; tiktoken encodes them on a thread pool"""
+        if self.encoding is None:
+            return [estimate_tokens(text) for text in texts]
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to at most max_tokens, preferring a sentence end"""
+        if self.encoding is None:
+            cut = text[:max_tokens * 4]
+        else:
+            cut = self.encoding.decode(self.encoding.encode_ordinary(text)[:max_tokens])
+        sentence_end = max(cut.rfind('. '), cut.rfind('! '), cut.rfind('? '))
+        return cut[:sentence_end + 1] if sentence_end > len(cut) // 2 else cut
+
+    def count_examples(self, examples: List[Dict]) -> List[int]:
+        """Token count of each chat example in a batch"""
+        totals = []
+        unique = {}
+        pending = []
+        for example in examples:
+            messages = example.get('messages', [])
+            total = TOKENS_PER_REPLY
+            for msg in messages:
+                content = msg.get('content') or ''
+                total += TOKENS_PER_MESSAGE + self.count_cached(msg.get('role', ''))
+                if msg.get('role') == 'assistant':
+                    # Replies are nearly all distinct, so batch them instead of caching
+                    pending.append((len(totals), content))
+                    unique.setdefault(content, None)
+                else:
+                    total += self.count_cached(content)
+            totals.append(total)
+
+        texts = list(unique)
+        for text, count in zip(texts, self.count_batch(texts)):
+            unique[text] = count
+        for index, content in pending:
+            totals[index] += unique[content]
+        return totals
+
+class TokenReport(NamedTuple):
+    examples: int
+    total_tokens: int
+    max_tokens: int
+    counts: List[int]
+    oversized: List[Tuple[int, int]]  # (line number, tokens)
+    histogram: List[Tuple[str, int]]
+    billed_tokens: int  # per epoch, oversized examples are truncated at the limit
+    epochs: int
+    cost: Optional[float]
+    tokenizer: str
+
+def iter_examples(file_path: str) -> Iterator[Tuple[int, Dict]]:
+    """(line number, example) for every parseable line"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_num, json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def iter_batches(items: Iterator, size: int = BATCH_SIZE) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def histogram(counts: List[int], edges: List[int] = HISTOGRAM_EDGES) -> List[Tuple[str, int]]:
+    buckets = [0] * len(edges)
+    for count in counts:
+        for i in range(len(edges) - 1, -1, -1):
+            if count >= edges[i]:
+                buckets[i] += 1
+                break
+    labels = [f"{lo}-{hi - 1}" for lo, hi in zip(edges, edges[1:])] + [f"{edges[-1]}+"]
+    return [(label, n) for label, n in zip(labels, buckets) if n]
+
+def count_file(file_path: str, model: str = DEFAULT_MODEL, epochs: int = DEFAULT_EPOCHS,
+               tokenizer: Optional[Tokenizer] = None) -> TokenReport:
+    """Count tokens for every example in a JSONL file"""
+    tokenizer = tokenizer or Tokenizer(model)
+    limit = CONTEXT_LIMITS.get(model, MAX_TOKENS_PER_EXAMPLE)
+
+    counts = []
+    oversized = []
+    for batch in iter_batches(iter_examples(file_path)):
+        batch_counts = tokenizer.count_examples([example for _, example in batch])
+        for (line_num, _), count in zip(batch, batch_counts):
+            if count > limit:
+                oversized.append((line_num, count))
+        counts.extend(batch_counts)
+
+    billed = sum(min(count, limit) for count in counts)
+    price = TRAINING_PRICES.get(model)
+    return TokenReport(
+        examples=len(counts),
+        total_tokens=sum(counts),
+        max_tokens=max(counts, default=0),
+        counts=counts,
+        oversized=oversized,
+        histogram=histogram(counts),
+        billed_tokens=billed,
+        epochs=epochs,
+        cost=billed * epochs * price / 1_000_000 if price is not None else None,
+        tokenizer=tokenizer.name,
+    )
+
+def print_report(report: TokenReport, model: str = DEFAULT_MODEL):
+    print(f"\n{'='*50}")
+    print(f"TOKEN REPORT ({model}, {report.tokenizer})")
+    print(f"{'='*50}")
+    print(f"Examples: {report.examples}")
+    print(f"Total tokens: {report.total_tokens:,}")
+    if report.examples:
+        print(f"Mean / max per example: {report.total_tokens / report.examples:.0f} / {report.max_tokens}")
+    print(f"Training tokens: {report.billed_tokens:,} x {report.epochs} epochs "
+          f"= {report.billed_tokens * report.epochs:,}")
+    if report.cost is not None:
+        print(f"Estimated cost: ${report.cost:.2f}")
+    else:
+        print(f"Estimated cost: unknown (no price for {model})")
+
+    print(f"\nTokens per example:")
+    widest = max((n for _, n in report.histogram), default=1)
+    for label, n in report.histogram:
+        print(f"  {label:>12} {n:7d} {'#' * max(1, n * 40 // widest)}")
+
+    if report.oversized:
+        limit = CONTEXT_LIMITS.get(model, MAX_TOKENS_PER_EXAMPLE)
+        print(f"\n✗ {len(report.oversized)} examples over the {limit} token limit:")
+        for line_num, count in report.oversized[:10]:
+            print(f"  - Line {line_num}: {count} tokens")
+
+def _split_turns(messages: List[Dict]) -> Tuple[List[Dict], List[List[Dict]]]:
+    """System messages, then each exchange ending in an assistant reply"""
+    system = [m for m in messages if m.get('role') == 'system']
+    turns, current = [], []
+    for msg in messages:
+        if msg.get('role') == 'system':
+            continue
+        current.append(msg)
+        if msg.get('role') == 'assistant':
+            turns.append(current)
+            current = []
+    return system, turns
+
+def _trim(system: List[Dict], turns: List[List[Dict]], tokenizer: Tokenizer,
+          limit: int) -> Optional[List[Dict]]:
+    """Drop the oldest exchanges, then shorten the last reply, until it fits"""
+    while turns:
+        messages = system + [m for turn in turns for m in turn]
+        total = tokenizer.count_examples([{'messages': messages}])[0]
+        if total <= limit:
+            return messages
+        if len(turns) > 1:
+            turns = turns[1:]
+            continue
+        reply = messages[-1]
+        budget = tokenizer.count(reply['content']) - (total - limit)
+        if budget <= 0:
+            return None
+        messages[-1] = {**reply, 'content': tokenizer.truncate(reply['content'], budget)}
+        return messages
+    return None
+
+def fix_example(example: Dict, tokenizer: Tokenizer, limit: int, mode: str) -> List[Dict]:
+    """Bring an oversized example under the limit; may return zero or several"""
+    if mode == 'drop':
+        return []
+
+    system, turns = _split_turns(example['messages'])
+    if mode == 'trim':
+        messages = _trim(system, turns, tokenizer, limit)
+        return [{**example, 'messages': messages}] if messages else []
+
+    # split: greedily pack consecutive exchanges, each with the system prompt
+    fixed = []
+    group: List[List[Dict]] = []
+    for turn in turns:
+        candidate = system + [m for t in group + [turn] for m in t]
+        if group and tokenizer.count_examples([{'messages': candidate}])[0] > limit:
+            fixed.append(group)
+            group = []
+        group.append(turn)
+    if group:
+        fixed.append(group)
+
+    results = []
+    for group in fixed:
+        messages = _trim(system, group, tokenizer, limit)
+        if messages:
+            results.append({**example, 'messages': messages})
+    return results
+
+def fix_file(file_path: str, output_path: str, model: str = DEFAULT_MODEL,
+             mode: str = 'trim') -> Tuple[int, int]:
+    """Write a copy of a JSONL file with oversized examples fixed
+
+    Returns (examples fixed, examples written).
+    """
+    tokenizer = Tokenizer(model)
+    limit = CONTEXT_LIMITS.get(model, MAX_TOKENS_PER_EXAMPLE)
+    fixed = written = 0
+
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for batch in iter_batches(iter_examples(file_path)):
+            examples = [example for _, example in batch]
+            for example, count in zip(examples, tokenizer.count_examples(examples)):
+                results = [example]
+                if count > limit:
+                    results = fix_example(example, tokenizer, limit, mode)
+                    fixed += 1
+                for result in results:
+                    out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    written += 1
+    return fixed, written
+
+def main():
+    parser = argparse.ArgumentParser(description="Count tokens and estimate fine-tuning cost")
+    parser.add_argument("file_path", nargs="?", default="combined_gandhi_training.jsonl")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"one of {sorted(TRAINING_PRICES)}")
+    parser.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS)
+    parser.add_argument("--fix", choices=['trim', 'split', 'drop'],
+                        help="write a copy with oversized examples trimmed, split or dropped")
+    parser.add_argument("--output", help="where --fix writes (default: <file>.fixed.jsonl)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file_path):
+        print(f"error: File '{args.file_path}' not found!")
+        return
+
+    if args.fix:
+        output_path = args.output or os.path.splitext(args.file_path)[0] + ".fixed.jsonl"
+        fixed, written = fix_file(args.file_path, output_path, args.model, args.fix)
+        print(f"✓ {args.fix}: {fixed} oversized examples, {written} examples written to {output_path}")
+        args.file_path = output_path
+
+    print_report(count_file(args.file_path, args.model, args.epochs), args.model)
+
+if __name__ == "__main__":
+    main()
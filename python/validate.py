@@ -1,54 +1,178 @@
+import argparse
 import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import metrics
+from tokens import MAX_TOKENS_PER_EXAMPLE, TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, estimate_tokens
+
+try:
+    import orjson
+    _loads = orjson.loads
+    DECODE_ERRORS = (orjson.JSONDecodeError, UnicodeDecodeError)
+except ImportError:
+    _loads = json.loads
+    DECODE_ERRORS = (json.JSONDecodeError, UnicodeDecodeError)
+
+VALID_ROLES = {'system', 'user', 'assistant'}
+
+def check_example(data, max_tokens: int = MAX_TOKENS_PER_EXAMPLE) -> List[str]:
+    """Return every schema problem with one training example"""
+    if not isinstance(data, dict) or 'messages' not in data:
+        return ["Missing 'messages' key"]
+
+    messages = data['messages']
+    if not isinstance(messages, list):
+        return ["'messages' must be a list"]
+
+    # Must have at least 2 messages (user + assistant)
+    if len(messages) < 2:
+        return ["Need at least 2 messages"]
 
-def validate_jsonl(file_path):
-    """Validate JSONL file for OpenAI fine-tuning"""
-    print(f"Validating {file_path}...")
-    
     errors = []
+    tokens = TOKENS_PER_REPLY
+    has_assistant = False
+    for index, msg in enumerate(messages):
+        if not isinstance(msg, dict) or 'role' not in msg or 'content' not in msg:
+            errors.append(f"Message {index}: invalid message structure")
+            continue
+
+        role = msg['role']
+        content = msg['content']
+        if not isinstance(role, str) or role not in VALID_ROLES:
+            errors.append(f"Message {index}: invalid role {role!r}")
+        if not isinstance(content, str) or not content.strip():
+            errors.append(f"Message {index}: empty or non-string content")
+        else:
+            tokens += TOKENS_PER_MESSAGE + estimate_tokens(content)
+        if role == 'assistant':
+            has_assistant = True
+
+    if not has_assistant:
+        errors.append("No assistant message")
+    elif not isinstance(messages[-1], dict) or messages[-1].get('role') != 'assistant':
+        errors.append("Last message must be from the assistant")
+    if tokens > max_tokens:
+        errors.append(f"About {tokens} tokens, over the {max_tokens} token limit")
+    return errors
+
+def _validate_range(task: Tuple[str, int, int, int]) -> Tuple[int, int, List[Tuple[int, str]]]:
+    """Validate the lines in bytes [start, stop) of a file
+
+    Returns (line_count, valid_count, [(line_number_in_range, error)]).
+    """
+    file_path, start, stop, max_tokens = task
+    line_count = 0
     valid_count = 0
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
+    errors = []
+
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        position = start
+        while position < stop:
+            end = mm.find(b'\n', position, stop)
+            if end == -1:
+                end = stop
+            line = mm[position:end]
+            position = end + 1
+            line_count += 1
+
             try:
-                data = json.loads(line)
-                
-                # Check required structure
-                if 'messages' not in data:
-                    errors.append(f"Line {line_num}: Missing 'messages' key")
-                    continue
-                
-                messages = data['messages']
-                
-                # Must have at least 2 messages (user + assistant)
-                if len(messages) < 2:
-                    errors.append(f"Line {line_num}: Need at least 2 messages")
-                    continue
-                
-                # Check message structure
-                for msg in messages:
-                    if 'role' not in msg or 'content' not in msg:
-                        errors.append(f"Line {line_num}: Invalid message structure")
-                        break
-                
+                data = _loads(line)
+            except DECODE_ERRORS as e:
+                errors.append((line_count, f"JSON error - {e}"))
+                continue
+
+            problems = check_example(data, max_tokens)
+            if problems:
+                errors.extend((line_count, problem) for problem in problems)
+            else:
                 valid_count += 1
-                
-            except json.JSONDecodeError as e:
-                errors.append(f"Line {line_num}: JSON error - {e}")
-    
+
+    return line_count, valid_count, errors
+
+def _split_ranges(file_path: str, shards: int) -> List[Tuple[int, int]]:
+    """Split a file into about `shards` byte ranges that end on line boundaries"""
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return []
+    boundaries = [0]
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, shards):
+            newline = mm.find(b'\n', max(boundaries[-1], size * i // shards))
+            if newline == -1 or newline + 1 >= size:
+                break
+            boundaries.append(newline + 1)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+def collect_errors(file_path: str, workers: int = 1,
+                   max_tokens: int = MAX_TOKENS_PER_EXAMPLE) -> Tuple[int, List[Tuple[int, str]]]:
+    """Validate a JSONL file, sharding line ranges across processes
+
+    Returns (valid_count, [(line_number, error)]) with 1-based line numbers.
+    """
+    ranges = _split_ranges(file_path, max(1, workers) * 4 if workers > 1 else 1)
+    tasks = [(file_path, start, stop, max_tokens) for start, stop in ranges]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_validate_range, tasks))
+    else:
+        results = [_validate_range(task) for task in tasks]
+
+    valid_count = 0
+    errors = []
+    lines_before = 0
+    for line_count, shard_valid, shard_errors in results:
+        valid_count += shard_valid
+        errors.extend((lines_before + line, error) for line, error in shard_errors)
+        lines_before += line_count
+    return valid_count, errors
+
+def validate_jsonl(file_path, workers: int = 1, max_tokens: int = MAX_TOKENS_PER_EXAMPLE,
+                   errors_out: str = None):
+    """Validate JSONL file for OpenAI fine-tuning"""
+    print(f"Validating {file_path}...")
+
+    with metrics.stage("validate"):
+        valid_count, errors = collect_errors(file_path, workers, max_tokens)
+    metrics.count('examples_valid', valid_count)
+    metrics.count('examples_invalid', len({line for line, _ in errors}))
+    metrics.count('errors', len(errors))
+    metrics.count('bytes_validated', os.path.getsize(file_path))
+
     print(f"\n{'='*50}")
     print(f"VALIDATION RESULTS")
     print(f"{'='*50}")
     print(f"✓ Valid examples: {valid_count}")
     print(f"✗ Errors: {len(errors)}")
-    
+
+    if errors_out and errors:
+        with open(errors_out, 'w', encoding='utf-8') as f:
+            for line_num, error in errors:
+                f.write(f"Line {line_num}: {error}\n")
+        print(f"All errors written to {errors_out}")
+
     if errors:
         print(f"\nFirst 10 errors:")
-        for error in errors[:10]:
-            print(f"  - {error}")
+        for line_num, error in errors[:10]:
+            print(f"  - Line {line_num}: {error}")
         return False
     else:
         print(f"\n✅ File is valid and ready for upload!")
         return True
 
 if __name__ == "__main__":
-    validate_jsonl("combined_gandhi_training.jsonl")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Validate a JSONL file for OpenAI fine-tuning")
+    parser.add_argument("file_path", nargs="?", default="combined_gandhi_training.jsonl")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes to shard line ranges across")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS_PER_EXAMPLE)
+    parser.add_argument("--errors-out", help="write every error to this file")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_run("validate", args)
+    validate_jsonl(args.file_path, args.workers, args.max_tokens, args.errors_out)
+    metrics.finish()
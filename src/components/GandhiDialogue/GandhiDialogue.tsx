@@ -18,8 +18,13 @@ interface GandhiDialogueProps {
   onSuccess: () => void;
 }
 
+// Set to the local python/dialogue_server.py (e.g. http://127.0.0.1:8787/v1) to use its
+// shared response cache; the server holds the real API key
+const DIALOGUE_SERVER_URL = import.meta.env.VITE_DIALOGUE_SERVER_URL;
+
 const openai = new OpenAI({
-  apiKey: import.meta.env.VITE_OPENAI_API_KEY,
+  apiKey: DIALOGUE_SERVER_URL ? "local" : import.meta.env.VITE_OPENAI_API_KEY,
+  baseURL: DIALOGUE_SERVER_URL || undefined,
   dangerouslyAllowBrowser: true
 });
 